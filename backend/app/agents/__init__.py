@@ -1,11 +1,18 @@
 """LangGraph agents for estimation workflow."""
 
 from .analyze_requirement_agent import analyze_requirement_node
-from .retrieve_similar_epic_agent import retrieve_similar_epic_node
+from .retrieve_similar_epic_agent import prefetch_similar_epics_node, retrieve_similar_epic_node
 from .generate_custom_epic_agent import generate_custom_epic_node
+from .estimate_from_history_agent import estimate_from_history_node
+from .check_task_hours_agent import check_task_hours_node
+from .diff_requirements_agent import diff_requirements_node
 
 __all__ = [
     "analyze_requirement_node",
+    "prefetch_similar_epics_node",
     "retrieve_similar_epic_node",
     "generate_custom_epic_node",
+    "estimate_from_history_node",
+    "check_task_hours_node",
+    "diff_requirements_node",
 ]
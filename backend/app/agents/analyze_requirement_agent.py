@@ -1,12 +1,208 @@
+import contextvars
+import json
 import logging
-from typing import Dict, Any
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
 
 from ..models.schemas import AnalyzedRequirement, Platform
 from ..services.openai_service import get_openai_service
+from ..services.mysql_knowledge_base import get_knowledge_base
+from ..services.mandatory_epics_service import get_mandatory_epics_service
+from ..services.pipeline_profiles import get_pipeline_profile
+from ..core.config import settings
 from ..core.constants import ANALYZE_REQUIREMENT_PROMPT
+from .retrieve_similar_epic_agent import category_query_text
 
 logger = logging.getLogger(__name__)
 
+_json_decoder = json.JSONDecoder()
+
+# Platform names and synonyms (LLM output and requirement text) mapped to Platform
+PLATFORM_KEYWORDS = {
+    "flutter": Platform.FLUTTER,
+    "mobile app": Platform.FLUTTER,
+    "mobile application": Platform.FLUTTER,
+    "mobile": Platform.FLUTTER,
+    "android": Platform.FLUTTER,
+    "ios": Platform.FLUTTER,
+    "web based app": Platform.WEB_APP,
+    "webapp": Platform.WEB_APP,
+    "web": Platform.WEB_APP,
+    "web application": Platform.WEB_APP,
+    "api": Platform.API,
+    "backend": Platform.API,
+    "web service": Platform.API,
+    "webservice": Platform.API,
+    "cms": Platform.CMS,
+    "admin": Platform.CMS,
+    "admin panel": Platform.CMS,
+    "admin dashboard": Platform.CMS,
+    "management console": Platform.CMS,
+    "admin portal": Platform.CMS,
+    "web-based dashboard": Platform.CMS,
+    "web dashboard": Platform.CMS
+}
+
+# Lexical analysis (no LLM): requirement sentences become features and categories
+LEXICAL_MAX_FEATURES = 40
+LEXICAL_CATEGORY_WORDS = 5
+_LEXICAL_LEADING_WORDS = {
+    "the", "a", "an", "app", "application", "platform", "system", "should", "must", "will",
+    "shall", "can", "be", "able", "to", "allow", "allows", "users", "user", "we", "need",
+    "needs", "want", "it", "also", "and", "provide", "provides", "support", "supports", "include", "includes",
+}
+_LEXICAL_TRAILING_WORDS = {"a", "an", "the", "and", "or", "for", "of", "with", "in", "on", "to", "via", "by"}
+
+
+def parse_streamed_epic_categories(text: str) -> Dict[str, List[str]]:
+    """
+    Extract the epic_categories entries already complete in a partial JSON response.
+    
+    Example: '{"epic_categories": {"Chat": ["chat"], "Feed": ["fe' -> {"Chat": ["chat"]}
+    
+    Args:
+        text: Response text received so far
+        
+    Returns:
+        Category name -> features for every fully received entry
+    """
+    start = text.find('"epic_categories"')
+    if start < 0:
+        return {}
+    pos = text.find("{", start)
+    if pos < 0:
+        return {}
+    pos += 1
+    
+    categories = {}
+    while True:
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "}":
+            break
+        try:
+            key, pos = _json_decoder.raw_decode(text, pos)
+            while pos < len(text) and text[pos] in " \t\r\n":
+                pos += 1
+            if pos >= len(text) or text[pos] != ":":
+                break
+            pos += 1
+            while pos < len(text) and text[pos] in " \t\r\n":
+                pos += 1
+            value, pos = _json_decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break  # Entry not complete yet
+        if isinstance(key, str) and isinstance(value, list):
+            categories[key] = [str(v) for v in value]
+    
+    return categories
+
+
+def correct_platforms(platforms: List[Platform], requirement_text: str) -> List[Platform]:
+    """
+    Apply the platform post-processing rules to detected platforms.
+    
+    A "Web App" detected for a mobile project with an admin dashboard (and no
+    user-facing web app) is really the CMS; API is added for any frontend.
+    """
+    platforms = list(platforms)
+    requirement_lower = requirement_text.lower()
+    has_mobile_keywords = any(keyword in requirement_lower for keyword in [
+        "mobile app", "android", "ios", "mobile application", "mobile device"
+    ])
+    has_web_user_keywords = any(keyword in requirement_lower for keyword in [
+        "web application for users", "web app for users", "browser-based app", 
+        "users access via browser", "web-based application for customers",
+        "responsive web application", "responsive web app", "web application enabling users",
+        "web app enabling users", "across devices", "mobile and web", "mobile apps as well as",
+        "in addition to mobile", "along with a web"
+    ])
+    has_admin_keywords = any(keyword in requirement_lower for keyword in [
+        "admin dashboard", "web-based dashboard", "admin panel", "management console",
+        "admin portal", "web dashboard for admin", "admins will have access to a web"
+    ])
+    
+    # Correction logic
+    if Platform.WEB_APP in platforms:
+        # If mobile app is mentioned and Web App is detected, check if it's actually admin dashboard
+        if has_mobile_keywords and not has_web_user_keywords:
+            if has_admin_keywords:
+                logger.warning(f" CORRECTION: Detected 'Web App' but requirement mentions mobile + admin dashboard.")
+                logger.warning(f"   Replacing 'Web App' with 'CMS' (admin dashboard != user web app)")
+                platforms.remove(Platform.WEB_APP)
+                if Platform.CMS not in platforms:
+                    platforms.append(Platform.CMS)
+    
+    # Ensure API is always included if any frontend platform exists
+    if platforms and Platform.API not in platforms:
+        platforms.append(Platform.API)
+        logger.info("Auto-added API platform (required for frontend platforms)")
+    
+    return platforms
+
+
+def lexical_category_name(feature: str) -> str:
+    """Short epic category name for a requirement sentence (filler words at either end dropped)."""
+    words = re.findall(r"[A-Za-z0-9][A-Za-z0-9&'/+-]*", feature)
+    while len(words) > 1 and words[0].lower() in _LEXICAL_LEADING_WORDS:
+        words.pop(0)
+    words = words[:LEXICAL_CATEGORY_WORDS]
+    while len(words) > 1 and words[-1].lower() in _LEXICAL_TRAILING_WORDS:
+        words.pop()
+    return " ".join(w if w.isupper() else w.capitalize() for w in words)
+
+
+def analyze_requirement_lexically(raw_requirements) -> AnalyzedRequirement:
+    """
+    Analyze requirements without an LLM call.
+    
+    Platforms are detected by keyword (with the same corrections as the LLM
+    analysis), every requirement sentence or bullet becomes a feature, and each
+    feature its own epic category, so retrieval matches KB epics per sentence.
+    Used by the instant mode, where a ballpark figure matters more than structure.
+    
+    Args:
+        raw_requirements: ProjectRequirement
+        
+    Returns:
+        AnalyzedRequirement (domain "general", no user types)
+    """
+    requirement_text = f"{raw_requirements.description}\n{raw_requirements.additional_context or ''}"
+    requirement_lower = requirement_text.lower()
+    
+    platforms = []
+    for keyword, platform in PLATFORM_KEYWORDS.items():
+        # A bare "web" is too ambiguous in free text (web dashboard, web service)
+        if keyword != "web" and platform not in platforms and re.search(rf"\b{re.escape(keyword)}\b", requirement_lower):
+            platforms.append(platform)
+    platforms = correct_platforms(platforms, requirement_text) or [Platform.FLUTTER, Platform.API]
+    
+    features = []
+    for sentence in re.split(r"[\n.;!?]+", requirement_text):
+        feature = sentence.strip(" \t-*•:,0123456789)")
+        if len(feature.split()) >= 3 and feature not in features:
+            features.append(feature)
+    features = features[:LEXICAL_MAX_FEATURES]
+    
+    epic_categories: Dict[str, List[str]] = {}
+    for feature in features:
+        epic_categories.setdefault(lexical_category_name(feature), []).append(feature)
+    
+    logger.info(
+        f"✓ Lexical analysis: {len(features)} features, {len(epic_categories)} categories, "
+        f"platforms {[p.value for p in platforms]}"
+    )
+    return AnalyzedRequirement(
+        project_name=raw_requirements.project_name,
+        domain="general",
+        features=features,
+        tech_stack=[],
+        platforms=platforms,
+        initial_epics=list(epic_categories),
+        epic_categories=epic_categories
+    )
+
 
 def analyze_requirement_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -14,10 +210,37 @@ def analyze_requirement_node(state: Dict[str, Any]) -> Dict[str, Any]:
     
     Extracts features, tech stack, platforms, epics, user types,
     and special requirements from raw project description.
+    Profiles with lexical analysis skip the LLM call (analyze_requirement_lexically).
     """
     logger.info("=== Analyze Requirement Agent ===")
     
     raw_requirements = state["raw_requirements"]
+    profile = get_pipeline_profile(raw_requirements.mode)
+    
+    if profile["analysis"] == "lexical":
+        try:
+            analyzed = analyze_requirement_lexically(raw_requirements)
+            
+            # One batched request embeds every category query for retrieval
+            mandatory_epic_names = set(get_mandatory_epics_service().get_mandatory_epic_names())
+            query_texts = [
+                category_query_text(epic_name, related_features)
+                for epic_name, related_features in analyzed.epic_categories.items()
+                if epic_name not in mandatory_epic_names
+            ]
+            category_embeddings = dict(zip(query_texts, get_knowledge_base().embed_queries(query_texts)))
+            
+            return {
+                "analyzed_requirement": analyzed,
+                "category_embeddings": category_embeddings,
+                "current_step": "analyze_requirement_complete"
+            }
+        except Exception as e:
+            logger.error(f"Error in lexical requirement analysis: {e}")
+            return {
+                "validation_errors": [f"Failed to analyze requirements: {str(e)}"],
+                "current_step": "error"
+            }
     
     # Build requirement text for analysis
     requirement_text = f"""
@@ -28,14 +251,43 @@ Additional Context: {raw_requirements.additional_context or 'None'}
     
     prompt = ANALYZE_REQUIREMENT_PROMPT.format(requirement=requirement_text)
     
+    # Streamed analysis: each epic category's retrieval query is embedded as soon as
+    # the category is complete in the response, overlapping the rest of the generation
+    executor = ThreadPoolExecutor(max_workers=settings.streamed_retrieval_workers) if settings.streamed_analysis_enabled else None
+    embedding_futures = {}
+    parsed_length = 0
+    
+    def on_progress(text: str) -> None:
+        nonlocal parsed_length
+        # A category entry can only have completed if a "]" arrived since the last parse
+        # (text restarts from the beginning when a fallback model takes over)
+        new_text = text[parsed_length:] if len(text) > parsed_length else text
+        parsed_length = len(text)
+        if "]" not in new_text:
+            return
+        for epic_name, related_features in parse_streamed_epic_categories(text).items():
+            query_text = category_query_text(epic_name, related_features)
+            if query_text in embedding_futures or epic_name in mandatory_epic_names:
+                continue
+            logger.info(f"  ↳ Streamed category '{epic_name}', embedding its retrieval query")
+            embedding_futures[query_text] = executor.submit(
+                contextvars.copy_context().run, get_knowledge_base().embed_query, query_text
+            )
+    
+    deadline = state.get("deadline")
+    
     try:
         # Get OpenAI service
         openai_service = get_openai_service()
+        mandatory_epic_names = set(get_mandatory_epics_service().get_mandatory_epic_names()) if executor else set()
         
         # Generate analysis
         logger.info("Calling OpenAI to analyze requirements...")
         analysis_json = openai_service.generate_json_completion(
             prompt=prompt,
+            role=profile["node_roles"]["analysis"],
+            on_progress=on_progress if executor else None,
+            timeout=deadline.node_budget("analyze_requirement") if deadline else None,
             system_message="""You are an experienced software architect. Analyze requirements thoroughly and extract structured information.
 
  CRITICAL: Platform Selection Rules (READ CAREFULLY):
@@ -56,31 +308,6 @@ Return only valid JSON."""
         
         # Convert platforms to Platform enum with flexible matching
         platforms = []
-        platform_mapping = {
-            "flutter": Platform.FLUTTER,
-            "mobile app": Platform.FLUTTER,
-            "mobile application": Platform.FLUTTER,
-            "mobile": Platform.FLUTTER,
-            "android": Platform.FLUTTER,
-            "ios": Platform.FLUTTER,
-            "web based app": Platform.WEB_APP,
-            "webapp": Platform.WEB_APP,
-            "web": Platform.WEB_APP,
-            "web application": Platform.WEB_APP,
-            "api": Platform.API,
-            "backend": Platform.API,
-            "web service": Platform.API,
-            "webservice": Platform.API,
-            "cms": Platform.CMS,
-            "admin": Platform.CMS,
-            "admin panel": Platform.CMS,
-            "admin dashboard": Platform.CMS,
-            "management console": Platform.CMS,
-            "admin portal": Platform.CMS,
-            "web-based dashboard": Platform.CMS,
-            "web dashboard": Platform.CMS
-        }
-        
         for platform_str in analysis_json.get("platforms", []):
             # Try exact match first
             try:
@@ -89,45 +316,15 @@ Return only valid JSON."""
             except ValueError:
                 # Try flexible matching
                 platform_lower = platform_str.lower().strip()
-                if platform_lower in platform_mapping:
-                    platforms.append(platform_mapping[platform_lower])
-                    logger.info(f"Mapped '{platform_str}' to {platform_mapping[platform_lower].value}")
+                if platform_lower in PLATFORM_KEYWORDS:
+                    platforms.append(PLATFORM_KEYWORDS[platform_lower])
+                    logger.info(f"Mapped '{platform_str}' to {PLATFORM_KEYWORDS[platform_lower].value}")
                 else:
                     logger.warning(f"Unknown platform: {platform_str}, skipping")
         
         # POST-PROCESSING: 
         # If Web App is detected but requirement mentions mobile/android/ios, likely meant Flutter
-        requirement_lower = requirement_text.lower()
-        has_mobile_keywords = any(keyword in requirement_lower for keyword in [
-            "mobile app", "android", "ios", "mobile application", "mobile device"
-        ])
-        has_web_user_keywords = any(keyword in requirement_lower for keyword in [
-            "web application for users", "web app for users", "browser-based app", 
-            "users access via browser", "web-based application for customers",
-            "responsive web application", "responsive web app", "web application enabling users",
-            "web app enabling users", "across devices", "mobile and web", "mobile apps as well as",
-            "in addition to mobile", "along with a web"
-        ])
-        has_admin_keywords = any(keyword in requirement_lower for keyword in [
-            "admin dashboard", "web-based dashboard", "admin panel", "management console",
-            "admin portal", "web dashboard for admin", "admins will have access to a web"
-        ])
-        
-        # Correction logic
-        if Platform.WEB_APP in platforms:
-            # If mobile app is mentioned and Web App is detected, check if it's actually admin dashboard
-            if has_mobile_keywords and not has_web_user_keywords:
-                if has_admin_keywords:
-                    logger.warning(f" CORRECTION: Detected 'Web App' but requirement mentions mobile + admin dashboard.")
-                    logger.warning(f"   Replacing 'Web App' with 'CMS' (admin dashboard != user web app)")
-                    platforms.remove(Platform.WEB_APP)
-                    if Platform.CMS not in platforms:
-                        platforms.append(Platform.CMS)
-        
-        # Ensure API is always included if any frontend platform exists
-        if platforms and Platform.API not in platforms:
-            platforms.append(Platform.API)
-            logger.info("Auto-added API platform (required for frontend platforms)")
+        platforms = correct_platforms(platforms, requirement_text)
         
         # Create AnalyzedRequirement object
         analyzed = AnalyzedRequirement(
@@ -147,8 +344,19 @@ Return only valid JSON."""
         epic_cat_info = f", {len(analyzed.epic_categories)} epic categories" if analyzed.epic_categories else ""
         logger.info(f"✓ Extracted {len(analyzed.features)} features, {len(analyzed.platforms)} platforms, {len(analyzed.initial_epics)} initial epics{epic_cat_info}{user_types_info}")
         
+        # Collect embeddings fired during streaming (failed ones are re-embedded by retrieval)
+        category_embeddings = {}
+        for query_text, future in embedding_futures.items():
+            try:
+                category_embeddings[query_text] = future.result()
+            except Exception as e:
+                logger.warning(f"Streamed category embedding failed for '{query_text[:60]}': {e}")
+        if embedding_futures:
+            logger.info(f"✓ Embedded {len(category_embeddings)} category queries during analysis")
+        
         return {
             "analyzed_requirement": analyzed,
+            "category_embeddings": category_embeddings,
             "current_step": "analyze_requirement_complete"
         }
         
@@ -158,3 +366,7 @@ Return only valid JSON."""
             "validation_errors": [f"Failed to analyze requirements: {str(e)}"],
             "current_step": "error"
         }
+    
+    finally:
+        if executor:
+            executor.shutdown(wait=True)
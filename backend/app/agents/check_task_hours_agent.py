@@ -0,0 +1,91 @@
+"""Check Task Hours Agent - Compares generated task hours with their nearest historical tasks."""
+
+import logging
+from typing import Dict, Any, List
+
+import numpy as np
+
+from ..core.config import settings
+from ..services.hour_statistics import PLATFORM_ORDER, get_hour_statistics, normalize_task_name
+from ..services.mysql_knowledge_base import get_knowledge_base
+
+logger = logging.getLogger(__name__)
+
+
+def check_task_hours_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Sanity-check generated task hours against historical precedent.
+    
+    All generated task descriptions (normalized like the indexed KB task
+    names) are embedded in one request and matched to
+    their nearest KB tasks with a single matrix product. Hours deviating from
+    the neighbors' median by more than settings.task_hours_check_max_ratio
+    (either way) are set to that median, so outliers are fixed in one pass
+    instead of a regeneration retry. Mandatory and retrieved tasks carry
+    historical hours already and are not checked.
+    """
+    logger.info("=== Check Task Hours ===")
+    
+    generated_epics = state.get("generated_epics") or []
+    tasks = [
+        (epic, task)
+        for epic in generated_epics if not epic.is_mandatory
+        for task in epic.tasks if task.is_custom
+    ]
+    
+    deadline = state.get("deadline")
+    if not settings.task_hours_check_enabled or not tasks:
+        return {"hour_adjustments": []}
+    if deadline and deadline.remaining() < settings.deadline_finalize_seconds:
+        logger.warning("Skipping task hour check: deadline nearly reached")
+        return {"hour_adjustments": []}
+    
+    try:
+        statistics = get_hour_statistics()
+        embeddings = np.array(
+            get_knowledge_base().embed_queries([normalize_task_name(task.description) for _, task in tasks]), dtype=np.float32
+        )
+        medians, counts = statistics.nearest_task_hours(
+            embeddings,
+            neighbors=settings.task_hours_check_neighbors,
+            min_similarity=settings.task_hours_check_min_similarity
+        )
+    except Exception as e:
+        logger.warning(f"Task hour check unavailable, keeping generated hours: {e}")
+        return {"hour_adjustments": []}
+    
+    max_ratio = settings.task_hours_check_max_ratio
+    adjustments: List[Dict[str, Any]] = []
+    for row, (epic, task) in enumerate(tasks):
+        for column, platform in enumerate(PLATFORM_ORDER):
+            hours = task.efforts.get(platform)
+            median = medians[row, column]
+            if hours is None or counts[row, column] < settings.task_hours_check_min_neighbors or not median > 0:
+                continue
+            if hours > median * max_ratio or hours < median / max_ratio:
+                adjusted = max(1, round(float(median)))
+                adjustments.append({
+                    "epic": epic.name,
+                    "task": task.description,
+                    "platform": platform.value,
+                    "original_hours": hours,
+                    "adjusted_hours": adjusted,
+                    "neighbor_median": round(float(median), 1),
+                    "neighbors": int(counts[row, column]),
+                })
+                task.efforts[platform] = adjusted
+                logger.info(
+                    f"  ~ {epic.name} / {task.description} [{platform.value}]: "
+                    f"{hours}h -> {adjusted}h (median of {counts[row, column]} similar KB tasks)"
+                )
+    
+    checked = int((counts >= settings.task_hours_check_min_neighbors).any(axis=1).sum())
+    logger.info(
+        f"✓ Checked {checked} of {len(tasks)} generated tasks against historical neighbors, "
+        f"{len(adjustments)} platform hours adjusted"
+    )
+    
+    return {
+        "generated_epics": generated_epics,
+        "hour_adjustments": adjustments
+    }
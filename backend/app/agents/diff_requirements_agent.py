@@ -0,0 +1,169 @@
+"""Diff Requirements Agent - Compares a re-analyzed brief with a previous estimation to re-estimate only what changed."""
+
+import logging
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+
+from ..models.schemas import Epic
+from ..services.hour_statistics import normalize_task_name
+from ..services.mysql_knowledge_base import get_knowledge_base
+from .retrieve_similar_epic_agent import category_query_text
+
+logger = logging.getLogger(__name__)
+
+
+def diff_categories(
+    previous: Dict[str, List[str]],
+    current: Dict[str, List[str]]
+) -> Tuple[Dict[str, str], List[str], List[str]]:
+    """
+    Match epic categories of two analyses.
+
+    Categories match by normalized name, or otherwise by an identical
+    feature set (the analysis may rename a category between runs). A
+    matched category is unchanged when its features are the same.
+
+    Returns:
+        (current name -> previous name of each unchanged category,
+        current categories to re-estimate (added or changed),
+        previous categories with no unchanged match (changed or removed))
+    """
+    def features_key(features: List[str]) -> frozenset:
+        return frozenset(normalize_task_name(f) for f in features)
+
+    by_name = {normalize_task_name(name): name for name in previous}
+    by_features = {features_key(features): name for name, features in previous.items()}
+
+    unchanged: Dict[str, str] = {}
+    to_estimate: List[str] = []
+    for name, features in current.items():
+        match = by_name.get(normalize_task_name(name)) or by_features.get(features_key(features))
+        if match and match not in unchanged.values() and features_key(previous[match]) == features_key(features):
+            unchanged[name] = match
+        else:
+            to_estimate.append(name)
+
+    dropped = [name for name in previous if name not in unchanged.values()]
+    return unchanged, to_estimate, dropped
+
+
+def assign_epics_to_categories(
+    epics: List[Epic],
+    categories: Dict[str, List[str]],
+    category_embeddings: Dict[str, List[float]]
+) -> List[str]:
+    """
+    Assign each epic to its category.
+
+    An epic named like a category (ignoring a " - UserType" suffix) belongs to
+    it; any other epic goes to the category whose retrieval query is nearest
+    to the epic name. Those epic names and category queries not embedded yet
+    are embedded in one request.
+
+    Returns:
+        Category name of each epic
+    """
+    names = list(categories)
+    by_name = {normalize_task_name(name): name for name in names}
+    assignment = [by_name.get(normalize_task_name(epic.name.split(" - ")[0])) for epic in epics]
+    unmatched = [i for i, category in enumerate(assignment) if category is None]
+    if not unmatched:
+        return assignment
+
+    queries = [category_query_text(name, categories[name]) for name in names]
+    missing = [q for q in dict.fromkeys(queries) if q not in category_embeddings]
+
+    embedded = get_knowledge_base().embed_queries([epics[i].name for i in unmatched] + missing)
+    query_vectors = {**category_embeddings, **dict(zip(missing, embedded[len(unmatched):]))}
+
+    epic_matrix = np.array(embedded[:len(unmatched)], dtype=np.float32)
+    category_matrix = np.array([query_vectors[q] for q in queries], dtype=np.float32)
+    epic_matrix /= np.linalg.norm(epic_matrix, axis=1, keepdims=True)
+    category_matrix /= np.linalg.norm(category_matrix, axis=1, keepdims=True)
+    for i, nearest in zip(unmatched, np.argmax(epic_matrix @ category_matrix.T, axis=1)):
+        assignment[i] = names[nearest]
+    return assignment
+
+
+def diff_requirements_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Restrict an incremental re-estimation to the categories that changed.
+
+    The freshly analyzed brief is diffed against the previous estimation's
+    analysis (see diff_categories). Previous non-mandatory epics are assigned
+    to their nearest previous category; those of unchanged categories are
+    carried over verbatim, the rest are dropped. Retrieval and generation
+    then only see the added or changed categories. A change of target
+    platforms affects every epic, so it re-estimates all categories.
+    """
+    logger.info("=== Diff Requirements Agent ===")
+
+    analyzed_req = state["analyzed_requirement"]
+    previous = state["previous_run"]
+    previous_req = previous["analyzed_requirement"]
+
+    previous_categories = previous_req.epic_categories or {}
+    current_categories = analyzed_req.epic_categories or {}
+
+    if set(analyzed_req.platforms) != set(previous_req.platforms) or not previous_categories or not current_categories:
+        logger.info("Target platforms or categories not comparable: re-estimating every category")
+        return {
+            "full_analyzed_requirement": analyzed_req,
+            "carried_epics": [],
+            "requirement_diff": {
+                "previous_estimation_id": previous["id"],
+                "re_estimated": list(current_categories),
+                "carried_over": [],
+                "removed": list(previous_categories),
+            },
+            "current_step": "diff_requirements_complete"
+        }
+
+    unchanged, to_estimate, dropped = diff_categories(previous_categories, current_categories)
+
+    previous_epics = [e for e in previous["estimation"].epics if not e.is_mandatory]
+    carried: List[Epic] = []
+    if previous_epics and unchanged:
+        try:
+            assignment = assign_epics_to_categories(
+                previous_epics, previous_categories, previous.get("category_embeddings") or {}
+            )
+        except Exception as e:
+            logger.warning(f"Could not assign previous epics to categories, re-estimating all: {e}")
+            assignment = [None] * len(previous_epics)
+            to_estimate, unchanged = list(current_categories), {}
+        kept = set(unchanged.values())
+        carried = [epic for epic, category in zip(previous_epics, assignment) if category in kept]
+
+    features = list(dict.fromkeys(f for name in to_estimate for f in current_categories[name]))
+    logger.info(
+        f"✓ {len(unchanged)} categories unchanged ({len(carried)} epics carried over), "
+        f"{len(to_estimate)} to re-estimate, {len(dropped)} changed or removed"
+    )
+    for name in to_estimate:
+        logger.info(f"  ~ Re-estimating '{name}': {', '.join(current_categories[name])}")
+
+    mandatory = [e for e in previous["estimation"].epics if e.is_mandatory]
+    result = {
+        "full_analyzed_requirement": analyzed_req,
+        "carried_epics": carried,
+        "requirement_diff": {
+            "previous_estimation_id": previous["id"],
+            "re_estimated": to_estimate,
+            "carried_over": list(unchanged),
+            "removed": [name for name in dropped if name not in to_estimate],
+        },
+        "current_step": "diff_requirements_complete"
+    }
+    if not to_estimate:
+        # Nothing to retrieve or generate: the previous mandatory epics complete the estimation
+        result["generated_epics"] = mandatory
+        return result
+
+    result["analyzed_requirement"] = analyzed_req.model_copy(update={
+        "epic_categories": {name: current_categories[name] for name in to_estimate},
+        "features": features,
+        "initial_epics": to_estimate
+    })
+    return result
@@ -0,0 +1,103 @@
+"""Estimate From History Agent - Estimates uncovered epic categories from historical hours, without an LLM."""
+
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from ..models.schemas import Epic, Task, Platform
+from ..services.hour_statistics import get_hour_statistics
+from .retrieve_similar_epic_agent import category_query_text
+
+logger = logging.getLogger(__name__)
+
+HISTORY_SOURCE = "Historical Median"
+
+
+def calibrated_epic_hours(
+    statistics,
+    category: str,
+    embedding: Optional[List[float]]
+) -> Tuple[Dict[Platform, float], str]:
+    """
+    Median historical total hours per platform for an epic category.
+    
+    Uses the most specific distribution available: KB epics with the same
+    name, then the epic cluster nearest to the category's query embedding,
+    then all KB epics. Platforms missing from a narrower distribution fall
+    back to the overall one.
+    
+    Returns:
+        (median hours per platform, description of the source distribution)
+    """
+    overall = statistics.overall_epic_hours()
+    stats, source = statistics.epic_hours(category), "KB epics with this name"
+    if not stats and embedding is not None:
+        stats, source = statistics.cluster_hours(embedding), "the nearest cluster of similar KB epics"
+    if not stats:
+        stats, source = overall, "all KB epics"
+    
+    medians = {platform: values["median"] for platform, values in overall.items()}
+    medians.update({platform: values["median"] for platform, values in stats.items()})
+    return medians, source
+
+
+def estimate_from_history_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Complete a quick estimate without generating custom epics.
+    
+    Mandatory and retrieved KB epics already carry historical (platform-adapted)
+    hours. Each epic category the KB had no match for becomes an epic with one
+    task per related feature, splitting the calibrated median epic hours
+    (see calibrated_epic_hours) for each target platform across its tasks.
+    """
+    logger.info("=== Estimate From History Agent ===")
+    
+    analyzed_req = state["analyzed_requirement"]
+    retrieved_epics = state.get("retrieved_epics") or []
+    uncovered = state.get("uncovered_categories") or {}
+    
+    category_embeddings = state.get("category_embeddings") or {}
+    
+    history_epics: List[Epic] = []
+    if uncovered:
+        try:
+            statistics = get_hour_statistics()
+        except Exception as e:
+            logger.error(f"Historical hour statistics unavailable, uncovered categories left out: {e}")
+            statistics = None
+        
+        for category, features in (uncovered.items() if statistics else []):
+            medians, source = calibrated_epic_hours(
+                statistics, category, category_embeddings.get(category_query_text(category, features))
+            )
+            platforms = [p for p in analyzed_req.platforms if p in medians]
+            if not platforms:
+                continue
+            
+            task_descriptions = features or [category]
+            tasks = [
+                Task(
+                    description=description,
+                    efforts={p: max(1, round(medians[p] / len(task_descriptions))) for p in platforms},
+                    source=HISTORY_SOURCE,
+                    is_custom=True
+                )
+                for description in task_descriptions
+            ]
+            history_epics.append(Epic(
+                name=category,
+                description=f"Estimated from the median hours of {source}",
+                tasks=tasks,
+                is_mandatory=False,
+                source_template=HISTORY_SOURCE
+            ))
+            logger.info(f"  + {category}: {len(tasks)} tasks from the median of {source}")
+    
+    logger.info(
+        f"✓ Quick estimate: {len(retrieved_epics)} mandatory/retrieved epics, "
+        f"{len(history_epics)} estimated from history"
+    )
+    
+    return {
+        "generated_epics": retrieved_epics + history_epics,
+        "current_step": "estimate_from_history_complete"
+    }
@@ -1,18 +1,46 @@
 """Generate Custom Epic Agent - Creates project-specific epics with tasks and effort estimates."""
 
-import json
+import contextvars
 import logging
-from typing import Dict, Any, List
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+from openai import APITimeoutError
 
 from ..models.schemas import EstimationState, Epic, Task, Platform
+from ..services.hour_model import get_hour_model, predict_epic_hours
+from ..services.hour_statistics import get_hour_statistics
+from ..services.mysql_knowledge_base import get_knowledge_base
 from ..services.openai_service import get_openai_service
-from ..core.constants import GENERATE_CUSTOM_EPIC_PROMPT
-from ..utils.epic_utils import is_similar_epic_name
+from ..services.pipeline_profiles import get_pipeline_profile
+from ..services.prompt_budget import PromptBudget
+from ..core.config import settings
+from ..core.constants import (
+    CUSTOM_EPIC_TARGET_TEMPLATE,
+    GENERATE_CUSTOM_EPIC_PROMPT,
+    GENERATE_CUSTOM_EPIC_SYSTEM_MESSAGE,
+    GENERATE_SHARD_TEMPLATE,
+    INCREMENTAL_CATEGORIES_TEMPLATE,
+    MODIFY_RETRIEVED_EPICS_PROMPT,
+    MODIFY_RETRIEVED_EPICS_SYSTEM_MESSAGE,
+    MODIFY_EPICS_OUTPUT_FORMAT,
+    PROJECT_CONTEXT_TEMPLATE,
+    PROMPT_SECTION_SHARES,
+    RETRIEVED_EPICS_SECTION_TEMPLATE,
+    TASK_STRUCTURE_ONLY_TEMPLATE,
+)
+from ..utils.epic_utils import format_epic_summary, is_similar_epic_name
 
 logger = logging.getLogger(__name__)
 
 
-def validate_estimation_quality(all_epics: List[Epic], analyzed_req, features_count: int) -> List[str]:
+def validate_estimation_quality(
+    all_epics: List[Epic],
+    analyzed_req,
+    features_count: int,
+    custom_epic_target: Optional[Tuple[int, int]] = None
+) -> List[str]:
     """
     Validate the quality of the estimation and return warnings if issues detected.
     
@@ -20,11 +48,13 @@ def validate_estimation_quality(all_epics: List[Epic], analyzed_req, features_co
         all_epics: List of all epics (mandatory + retrieved + generated)
         analyzed_req: The analyzed requirement
         features_count: Number of features in requirements
+        custom_epic_target: Expected (min, max) number of generated custom epics (default 15-25)
         
     Returns:
         List of warning messages (empty if all good)
     """
     warnings = []
+    min_custom_epics, max_custom_epics = custom_epic_target or (15, 25)
     
     # Calculate total hours
     total_hours = 0
@@ -38,7 +68,7 @@ def validate_estimation_quality(all_epics: List[Epic], analyzed_req, features_co
     total_epic_count = len(all_epics)
     
     # 1. Check epic count vs features
-    expected_min_epics = max(15, features_count // 2)  # At least 15, or half of features
+    expected_min_epics = max(min_custom_epics, features_count // 2)  # At least the target, or half of features
     expected_max_epics = features_count * 2  # Up to 2x features
     
     if total_epic_count < expected_min_epics:
@@ -48,10 +78,10 @@ def validate_estimation_quality(all_epics: List[Epic], analyzed_req, features_co
         )
     
     # 2. Check if enough custom epics were generated
-    if generated_count < 15:
+    if generated_count < min_custom_epics:
         warnings.append(
             f" Low custom epic generation: Only {generated_count} custom epics. "
-            f"Consider generating 15-25 for comprehensive coverage."
+            f"Consider generating {min_custom_epics}-{max_custom_epics} for comprehensive coverage."
         )
     
     # 3. Check platform coverage
@@ -78,17 +108,470 @@ def validate_estimation_quality(all_epics: List[Epic], analyzed_req, features_co
     return warnings
 
 
+def _build_tasks(
+    tasks_data: List[Dict[str, Any]],
+    analyzed_req,
+    epic_name: str,
+    source: str,
+    is_custom: bool
+) -> List[Task]:
+    """
+    Convert LLM task dicts to Task objects, keeping only the project's target platforms.
+    
+    Tasks generated without hours (a "platforms" list instead of "efforts",
+    see TASK_STRUCTURE_ONLY_TEMPLATE) get 0 hours until the hour model fills them in.
+    """
+    tasks = []
+    for task_data in tasks_data:
+        task_description = task_data.get("description", "")
+        efforts_data = task_data.get("efforts") or {name: 0 for name in task_data.get("platforms", [])}
+        
+        # Convert platform strings to Platform enum
+        efforts = {}
+        for platform_name, hours in efforts_data.items():
+            try:
+                platform = Platform(platform_name)
+                # Validate platform is in project requirements
+                if platform in analyzed_req.platforms:
+                    efforts[platform] = int(hours)
+                else:
+                    logger.warning(f"    Platform {platform_name} not in requirements for epic {epic_name}, skipping")
+            except ValueError:
+                logger.warning(f"    Unknown platform: {platform_name} in epic {epic_name}")
+                continue
+        
+        if efforts:  # Only add task if it has valid efforts
+            tasks.append(Task(
+                description=task_description,
+                efforts=efforts,
+                source=source,
+                is_custom=is_custom
+            ))
+    return tasks
+
+
+def fill_model_hours(model, epics: List[Epic]) -> None:
+    """
+    Set the hours of epics generated without hours (in place).
+    
+    Uses the trained hour model; if it fails, every task falls back to the
+    median hours of all KB tasks per platform. If those are unavailable too,
+    the tasks keep the hours they were generated with.
+    """
+    try:
+        count = predict_epic_hours(model, epics)
+        logger.info(f"✓ Predicted hours for {count} generated tasks with the hour model")
+        return
+    except Exception as e:
+        logger.warning(f"Hour model prediction failed, using the median KB task hours: {e}")
+    
+    try:
+        overall = get_hour_statistics().overall_task_hours()
+    except Exception as e:
+        logger.warning(f"Median KB task hours unavailable, keeping the generated hours: {e}")
+        return
+    for epic in epics:
+        for task in epic.tasks:
+            for platform in task.efforts:
+                if platform in overall:
+                    task.efforts[platform] = max(1, round(overall[platform]["median"]))
+
+
+def load_epic_summaries(epics: List[Epic], platforms: List[Platform]) -> List[str]:
+    """
+    Get compact prompt summaries for retrieved epics.
+    
+    Uses the summaries precomputed at KB ingestion for the target platforms,
+    rendering only epics without one (or all of them if the store is unavailable).
+    """
+    keys = [(e.source_template, e.kb_epic_id) for e in epics if e.kb_epic_id is not None]
+    try:
+        stored = get_knowledge_base().get_epic_summaries(keys, platforms)
+    except Exception as e:
+        logger.warning(f"Precomputed epic summaries unavailable, rendering locally: {e}")
+        stored = {}
+    
+    logger.info(f"Using {len(stored)} precomputed summaries for {len(epics)} retrieved epics")
+    return [stored.get((e.source_template, e.kb_epic_id)) or format_epic_summary(e) for e in epics]
+
+
+def format_epic_with_ids(epic: Epic, epic_index: int) -> str:
+    """Render one retrieved epic as its [E#] block with [T#] task lines."""
+    lines = [f"[E{epic_index}] {epic.name}"]
+    for task_index, task in enumerate(epic.tasks, start=1):
+        platforms_str = ", ".join([f"{p.value}: {h}h" for p, h in task.efforts.items()])
+        lines.append(f"  [T{task_index}] {task.description} → {platforms_str}")
+    return "\n".join(lines)
+
+
+def format_epics_with_ids(epics: List[Epic]) -> str:
+    """
+    Render retrieved epics with [E#]/[T#] identifiers for the delta modify call.
+    
+    Identifiers are positional, so the same list must be passed to apply_epic_patches.
+    """
+    blocks = [format_epic_with_ids(epic, epic_index) for epic_index, epic in enumerate(epics, start=1)]
+    return "\n\n".join(["# RETRIEVED EPICS TO ADAPT"] + blocks)
+
+
+def build_project_context(
+    analyzed_req,
+    kept: Dict[str, List[str]],
+    covered_epic_names: List[str],
+    include_retrieved: bool
+) -> str:
+    """
+    Render PROJECT CONTEXT from the sections one call's PromptBudget kept.
+    
+    Args:
+        analyzed_req: The analyzed requirement
+        kept: Kept "mandatory_epics", "retrieved_epics" and "features" items
+        covered_epic_names: Epic names the call must not duplicate
+        include_retrieved: Whether to list the retrieved epic summaries (the
+            modify call gets the retrieved epics as its [E#]/[T#] listing instead)
+    """
+    features_str = ", ".join(kept["features"])
+    if len(kept["features"]) < len(analyzed_req.features):
+        features_str += f", ... and {len(analyzed_req.features) - len(kept['features'])} more"
+    
+    # Handle user_types - can be either enum or string
+    user_types_str = ", ".join(
+        [u.value if hasattr(u, 'value') else str(u) for u in (analyzed_req.user_types or [])]
+    )
+    
+    retrieved_epics_section = RETRIEVED_EPICS_SECTION_TEMPLATE.format(
+        retrieved_epics_summary="\n\n".join(kept["retrieved_epics"]),
+        retrieved_count=len(kept["retrieved_epics"])
+    ) if include_retrieved else ""
+    
+    return PROJECT_CONTEXT_TEMPLATE.format(
+        domain=analyzed_req.domain,
+        platforms=", ".join([p.value for p in analyzed_req.platforms]),
+        user_types=user_types_str,
+        features=features_str,
+        mandatory_epics_summary="\n\n".join(kept["mandatory_epics"]),
+        retrieved_epics_section=retrieved_epics_section,
+        existing_epic_names=", ".join(covered_epic_names)
+    )
+
+
+def apply_epic_patches(
+    epics: List[Epic],
+    patches: List[Dict[str, Any]],
+    analyzed_req
+) -> List[Epic]:
+    """
+    Apply the modify call's delta patch to copies of the retrieved epics.
+    
+    Epic names and task descriptions always come from the retrieved epics, so
+    the model cannot reword them. Epics without a patch are kept unchanged.
+    
+    Args:
+        epics: Retrieved similar epics, in the order used by format_epics_with_ids
+        patches: "epic_patches" entries from the modify call
+        analyzed_req: The analyzed requirement (target platforms)
+        
+    Returns:
+        Patched epic copies (epics left with no tasks are dropped)
+    """
+    target_platforms = set(analyzed_req.platforms)
+    patched = [epic.model_copy(deep=True) for epic in epics]
+    
+    def to_platform(platform_name: str, context: str):
+        try:
+            platform = Platform(platform_name)
+        except ValueError:
+            logger.warning(f"    Unknown platform: {platform_name} in {context}")
+            return None
+        if platform not in target_platforms:
+            logger.warning(f"    Platform {platform_name} not in requirements for {context}, skipping")
+            return None
+        return platform
+    
+    def to_index(item_id: str, prefix: str, count: int):
+        """0-based index of an [E#]/[T#] id, None unless 1 <= # <= count."""
+        try:
+            number = int(item_id.removeprefix(prefix))
+        except ValueError:
+            return None
+        return number - 1 if 1 <= number <= count else None
+    
+    for patch in patches:
+        epic_id = str(patch.get("epic_id", "")).strip().upper()
+        epic_index = to_index(epic_id, "E", len(patched))
+        if epic_index is None:
+            logger.warning(f"  - Ignored patch for unknown epic id '{epic_id}'")
+            continue
+        epic = patched[epic_index]
+        
+        removed = {p for p in (to_platform(name, epic.name) for name in patch.get("remove_platforms", [])) if p}
+        for task in epic.tasks:
+            task.efforts = {p: h for p, h in task.efforts.items() if p not in removed}
+        
+        for task_id, efforts in (patch.get("hours") or {}).items():
+            task_index = to_index(str(task_id).strip().upper(), "T", len(epic.tasks))
+            if task_index is None:
+                logger.warning(f"  - Ignored hours for unknown task '{task_id}' in {epic.name}")
+                continue
+            task = epic.tasks[task_index]
+            for platform_name, hours in efforts.items():
+                platform = to_platform(platform_name, epic.name)
+                if not platform:
+                    continue
+                try:
+                    task.efforts[platform] = max(1, round(float(hours)))
+                except (TypeError, ValueError, OverflowError):
+                    logger.warning(f"    Ignored invalid hours {hours!r} for {platform_name} in {epic.name} [{task_id}]")
+        
+        new_tasks = _build_tasks(
+            patch.get("add_tasks", []), analyzed_req, epic.name,
+            source=epic.source_template or "Modified", is_custom=True
+        )
+        epic.tasks.extend(new_tasks)
+        
+        logger.info(
+            f"  ✓ Patched {epic_id} {epic.name}: {len(patch.get('hours') or {})} hour changes, "
+            f"{len(removed)} platforms removed, {len(new_tasks)} tasks added"
+        )
+    
+    result = []
+    for epic in patched:
+        epic.tasks = [task for task in epic.tasks if task.efforts]
+        if epic.tasks:
+            result.append(epic)
+        else:
+            logger.warning(f"  - Skipped modified epic: {epic.name} (no valid tasks)")
+    return result
+
+
+def merge_generated_epics(
+    all_epics: List[Epic],
+    existing_epic_names: List[str],
+    modified_epics: List[Epic],
+    custom_epics_data: List[Dict[str, Any]],
+    analyzed_req
+) -> None:
+    """
+    Merge the modify and generate call outputs into all_epics (in place).
+    
+    Modified retrieved epics are added first; new custom epics are then
+    deduplicated against existing_epic_names, since the two calls run
+    independently and the generate call may re-emit a retrieved epic.
+    """
+    # Add MODIFIED epics (retrieved similar epics, already patched locally)
+    for modified_epic in modified_epics:
+        all_epics.append(modified_epic)
+        existing_epic_names.append(modified_epic.name)
+        logger.info(f"  ✓ Modified: {modified_epic.name} ({len(modified_epic.tasks)} tasks)")
+    
+    # Process CUSTOM epics (new ones)
+    existing_keys = {name.strip().lower() for name in existing_epic_names}
+    for epic_data in custom_epics_data:
+        epic_name = epic_data.get("name", "")
+        
+        # Check for EXACT duplicates only (not semantic similarity), ignoring case/whitespace
+        if epic_name.strip().lower() in existing_keys:
+            logger.info(f"  - Skipped: {epic_name} (exact match)")
+            continue
+        
+        tasks = _build_tasks(
+            epic_data.get("tasks", []), analyzed_req, epic_name,
+            source="AI Generated", is_custom=True
+        )
+        
+        # Create Epic object
+        if tasks:  # Only add epic if it has tasks
+            custom_epic = Epic(
+                name=epic_name,
+                description=epic_data.get("description", ""),
+                tasks=tasks,
+                is_mandatory=False,
+                source_template="AI Generated"
+            )
+            all_epics.append(custom_epic)
+            existing_epic_names.append(epic_name)
+            existing_keys.add(epic_name.strip().lower())
+            logger.info(f"  + Added: {epic_name} ({len(tasks)} tasks)")
+        else:
+            logger.warning(f"  - Skipped: {epic_name} (no valid tasks)")
+
+
+def partition_categories(
+    epic_categories: Dict[str, List[str]],
+    shard_count: int
+) -> List[Dict[str, List[str]]]:
+    """
+    Split epic categories into shards with balanced feature counts.
+    
+    Categories are assigned largest-first to the currently lightest shard, with
+    ties broken by name, so the same categories always give the same shards.
+    
+    Args:
+        epic_categories: Category name -> related features
+        shard_count: Number of shards to create
+        
+    Returns:
+        Non-empty shards, each a category -> features mapping
+    """
+    shards: List[Dict[str, List[str]]] = [{} for _ in range(max(1, shard_count))]
+    loads = [0] * len(shards)
+    
+    ordered = sorted(epic_categories.items(), key=lambda item: (-len(item[1]), item[0]))
+    for category, features in ordered:
+        lightest = min(range(len(shards)), key=lambda i: (loads[i], i))
+        shards[lightest][category] = features
+        loads[lightest] += max(1, len(features))
+    
+    return [shard for shard in shards if shard]
+
+
+def split_user_type_suffix(name: str, user_types: List[str]) -> Tuple[str, Optional[List[str]]]:
+    """
+    Split an epic name into its base name and user-type suffix.
+    
+    Examples (user types Buyer, Seller):
+    
+    - "Messaging - buyers/Seller" -> ("Messaging", ["Buyer", "Seller"])
+    - "Dashboard - Admin" -> ("Dashboard", ["Admin"])
+    - "Payment Gateway" -> ("Payment Gateway", None)
+    
+    Args:
+        name: Epic name
+        user_types: Project user types (canonical spelling)
+        
+    Returns:
+        (base name, canonical user types) or (name, None) if there is no user-type suffix
+    """
+    if " - " not in name:
+        return name.strip(), None
+    
+    base, suffix = name.rsplit(" - ", 1)
+    canonical = {u.lower(): u for u in user_types}
+    canonical.setdefault("admin", "Admin")
+    
+    types = []
+    for token in suffix.split("/"):
+        key = token.strip().lower()
+        match = canonical.get(key) or canonical.get(key.rstrip("s"))
+        if not match:
+            return name.strip(), None
+        if match not in types:
+            types.append(match)
+    
+    return base.strip(), types
+
+
+def merge_shard_epics(
+    shard_results: List[List[Dict[str, Any]]],
+    user_types: List[str]
+) -> List[Dict[str, Any]]:
+    """
+    Deterministically merge custom epics generated by parallel category shards.
+    
+    Shards are merged in shard order. User-type suffixes are normalized to the
+    project's user types; epics sharing a base name are kept per user type, and
+    an epic whose user types overlap an earlier one is folded into it (the
+    earlier epic's suffix is widened). Other cross-shard duplicates are detected
+    with is_similar_epic_name and the later one is dropped.
+    
+    Args:
+        shard_results: "custom_epics" lists, one per shard
+        user_types: Project user types
+        
+    Returns:
+        Merged custom epic dicts
+    """
+    merged: List[Dict[str, Any]] = []
+    parsed: List[Tuple[str, Optional[List[str]], int]] = []  # (base, user types, shard index)
+    
+    for shard_index, epics_data in enumerate(shard_results):
+        for epic_data in epics_data:
+            base, types = split_user_type_suffix(epic_data.get("name", ""), user_types)
+            if not base:
+                continue
+            name = f"{base} - {'/'.join(types)}" if types else base
+            
+            duplicate_of = None
+            for i, (kept_base, kept_types, kept_shard) in enumerate(parsed):
+                if kept_shard == shard_index:
+                    continue  # Within a shard the model already saw its own epics
+                if kept_base.lower() == base.lower() and types and kept_types:
+                    if set(types) & set(kept_types):
+                        duplicate_of = i
+                        break
+                    continue  # Same feature for a different user type
+                if is_similar_epic_name(merged[i]["name"], name):
+                    duplicate_of = i
+                    break
+            
+            if duplicate_of is None:
+                merged.append({**epic_data, "name": name})
+                parsed.append((base, types, shard_index))
+                continue
+            
+            kept_base, kept_types, kept_shard = parsed[duplicate_of]
+            if types and kept_types and kept_base.lower() == base.lower():
+                widened = kept_types + [t for t in types if t not in kept_types]
+                if widened != kept_types:
+                    merged[duplicate_of]["name"] = f"{kept_base} - {'/'.join(widened)}"
+                    parsed[duplicate_of] = (kept_base, widened, kept_shard)
+            logger.info(f"  - Merged shard duplicate: {name} -> {merged[duplicate_of]['name']}")
+    
+    return merged
+
+
+def _run_concurrently(calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """
+    Run independent LLM calls in parallel threads.
+    
+    Each call runs in a copy of the caller's context so telemetry stays tagged
+    with the current job and node. Failures are returned as exception values
+    instead of raised, so one failed call doesn't discard the other's result.
+    """
+    if not calls:
+        return {}
+    
+    results: Dict[str, Any] = {}
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, fn)
+            for name, fn in calls.items()
+        }
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"Custom epic '{name}' call failed: {e}")
+                results[name] = e
+    return results
+
+
 def generate_custom_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Generate project-specific epics with complete task breakdowns and effort estimates.
     
-    This enhanced agent combines epic generation, task decomposition, and effort estimation
-    into a single intelligent process that learns from retrieved epics.
+    Runs two independent LLM calls concurrently, each with its own prompt and
+    token budget: one returns a compact patch (changed hours, added tasks,
+    removed platforms) that is applied locally to the retrieved similar epics,
+    the other generates new custom epics for uncovered features. Their outputs are
+    merged and deduplicated against the already covered epic names.
+    
+    For projects with at least settings.generation_fanout_min_features features,
+    generation is fanned out over balanced epic-category shards generated in
+    parallel, and the shard outputs are merged by merge_shard_epics.
+    
+    The request's pipeline profile (mode) sets the models, the custom epic
+    target, the output token budget, and whether fan-out and the modify call run.
     """
     logger.info("=== Generate Custom Epic Agent (Enhanced) ===")
     
     analyzed_req = state["analyzed_requirement"]
     retrieved_epics = state.get("retrieved_epics", [])
+    profile = get_pipeline_profile(state["raw_requirements"].mode)
+    
+    # A re-run after failed validation is a repair pass (routed to the repair model)
+    is_repair = state.get("current_step") == "validation_failed"
+    retry_count = state.get("retry_count", 0) + (1 if is_repair else 0)
     
     if not analyzed_req:
         logger.error("No analyzed requirement found")
@@ -97,6 +580,21 @@ def generate_custom_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
             "current_step": "error"
         }
     
+    # Deadline degradations: too little time left for any generation call -> mandatory
+    # + retrieved epics only; tight -> every call uses the fast (analysis) model
+    deadline = state.get("deadline")
+    degradations = []
+    if deadline and deadline.remaining() < settings.deadline_min_generation_seconds:
+        return {
+            "generated_epics": retrieved_epics,
+            "degradations": [deadline.degrade("retrieved_only")],
+            "current_step": "generate_custom_epics_complete",
+            "retry_count": retry_count
+        }
+    use_fast_model = bool(deadline and deadline.remaining() < settings.deadline_fast_model_seconds)
+    if use_fast_model:
+        degradations.append(deadline.degrade("fast_model"))
+    
     try:
         # Separate mandatory and retrieved epics for modification
         mandatory_epics = [e for e in retrieved_epics if e.is_mandatory]
@@ -116,365 +614,226 @@ def generate_custom_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
             existing_epic_names.append(mandatory_epic.name)
             logger.info(f"  ✓ Kept mandatory unchanged: {mandatory_epic.name} ({len(mandatory_epic.tasks)} tasks)")
         
-        # Format epics for prompt
-        def format_epics_for_prompt(epics: List[Epic], limit: int = 20) -> str:
-            lines = []
-            for epic in epics[:limit]:
-                lines.append(f"\n**{epic.name}** ({len(epic.tasks)} tasks):")
-                for task in epic.tasks[:5]:  # Show first 3 tasks as examples
-                    platforms_str = ", ".join([f"{p.value}: {h}h" for p, h in task.efforts.items()])
-                    lines.append(f"  - {task.description} → {platforms_str}")
-                if len(epic.tasks) > 3:
-                    lines.append(f"  - ... and {len(epic.tasks) - 3} more tasks")
-            return "\n".join(lines)
-        
-        # Build prompt
-        mandatory_summary = format_epics_for_prompt(mandatory_epics, limit=8)
-        retrieved_summary = format_epics_for_prompt(similar_epics, limit=30)  # Send ALL retrieved epics
-        platforms_str = ", ".join([p.value for p in analyzed_req.platforms])
-        features_str = ", ".join(analyzed_req.features)
-        
-        # Handle user_types - can be either enum or string
-        try:
-            user_types_str = ", ".join([u.value if hasattr(u, 'value') else str(u) for u in analyzed_req.user_types])
-        except:
-            user_types_str = ", ".join([str(u) for u in analyzed_req.user_types])
-        
-        # Build prompt for MODIFYING retrieved epics and GENERATING new ones
-        prompt = f"""You are an expert software estimator. Your task has TWO PARTS:
-
-# PART 1: MODIFY RETRIEVED EPICS (Similar Epics Only)
-
-The following epics were retrieved from knowledge base based on similarity. They need to be ADAPTED to match the current project requirements.
-
-## Project Requirements:
-- **Domain**: {analyzed_req.domain}
-- **Target Platforms**: {platforms_str}
-- **User Types**: {user_types_str}
-- **Key Features**: {features_str}
-
-## Mandatory Epics (For Reference - DO NOT MODIFY):
-{mandatory_summary}
-
-These mandatory epics are already included unchanged. Learn from their structure but don't modify them.
-
-## Retrieved Similar Epics (MODIFY THESE):
-{retrieved_summary}
-
-**YOUR TASK FOR PART 1:**
-1. Review each RETRIEVED epic (not mandatory) and its tasks
-2. **PRESERVE task descriptions exactly as they are** - DO NOT rewrite or rephrase them
-3. **DO NOT remove any existing tasks** - Keep all tasks from retrieved epic
-4. **ONLY ADD new tasks** if project requirements specifically need them
-5. **CRITICAL: Adapt platforms to match target platforms: {platforms_str}**
-   - If retrieved epic has "Web App" but target is ["Flutter", "API"] → Replace "Web App" with "Flutter"
-   - If retrieved epic has "Flutter" but target is ["Web App", "API", "CMS"] → Replace "Flutter" with "Web App"
-   - Remove any platforms not in target list
-6. Adjust effort hours based on project domain and requirements (if needed)
-7. **Keep epic names EXACTLY as they are** - DO NOT rename epics
-8. Keep epic descriptions as they are (minor adjustments only if needed)
-9. Preserve source_template field
-10. Set is_mandatory to false (these are retrieved, not mandatory)
-
-**CRITICAL RULES:**
-- ✓ Keep task descriptions verbatim: "View analytics dashboard" stays "View analytics dashboard"
-- ✗ Don't rewrite: "View analytics dashboard" → "Create a dashboard view for analytics metrics" (WRONG!)
-- ✓ Keep all existing tasks, don't remove any
-- ✓ Only ADD tasks if project explicitly needs features not covered by existing tasks
-- ✓ Keep epic names unchanged: "Analytics Dashboard - Venue" stays "Analytics Dashboard - Venue"
-
-**Platform Adaptation Rules:**
-- Examples may have different platforms than your target
-- Learn task patterns and hours, but OUTPUT only target platforms: {platforms_str}
-- If example shows "Flutter: 12h" and target has "Web App" → Use "Web App: 12h"
-- Never include platforms outside: {platforms_str}
-
-# PART 2: GENERATE NEW CUSTOM EPICS
-
-{GENERATE_CUSTOM_EPIC_PROMPT.format(
-            domain=analyzed_req.domain,
-            project_type=analyzed_req.domain,
-            platforms=platforms_str,
-            user_types=user_types_str,
-            features=features_str,
-            mandatory_epics_summary="(Already provided above - these will be modified)",
-            retrieved_epics_summary="(Already provided above - these will be modified)",
-            existing_epic_names="All retrieved epics will be modified, so you can focus on NEW epics for uncovered features"
-        )}
-
----
-
-# OUTPUT FORMAT:
-
-Return JSON with TWO sections:
-
-```json
-{{
-  "modified_epics": [
-    {{
-      "name": "Original Retrieved Epic Name",  // KEEP EXACTLY AS IS
-      "description": "Updated description for project context",
-      "is_mandatory": false,
-      "source_template": "original source",
-      "tasks": [
-        {{
-          "description": "Original task description",  // KEEP EXACTLY AS IS - Don't rewrite!
-          "efforts": {{
-            "Platform1": 12,  // Adapt platform names only
-            "Platform2": 16
-          }}
-        }},
-        {{
-          "description": "Another original task",  // KEEP EXACTLY AS IS
-          "efforts": {{
-            "Platform1": 8,
-            "Platform2": 12
-          }}
-        }},
-        {{
-          "description": "New task if needed",  // ONLY if project requires additional feature
-          "efforts": {{
-            "Platform1": 10,
-            "Platform2": 14
-          }}
-        }}
-      ]
-    }}
-  ],
-  "custom_epics": [
-    {{
-      "name": "New Epic Name - UserType",
-      "description": "Brief description",
-      "tasks": [
-        {{
-          "description": "Task description",
-          "efforts": {{
-            "Platform1": 12,
-            "Platform2": 16
-          }}
-        }}
-      ]
-    }}
-  ]
-}}
-```
-
-**CRITICAL VALIDATION:**
-- ALL epics (modified and custom) must ONLY use platforms from: {platforms_str}
-- No platforms outside target list allowed
-- modified_epics should include ALL {len(similar_epics)} retrieved similar epics (adapted, NOT mandatory)
-- **CRITICAL: Task descriptions in modified_epics must be EXACTLY as in original** (no rewriting)
-- **CRITICAL: Epic names in modified_epics must be EXACTLY as in original** (no renaming)
-- **CRITICAL: All original tasks must be present** (don't remove tasks)
-- custom_epics should be 15-25 NEW epics for uncovered features
-"""
+        # Incremental re-estimation: epics carried over from the previous estimation count as covered
+        carried_epics = state.get("carried_epics") or []
+        existing_epic_names.extend(epic.name for epic in carried_epics)
         
-        # Generate custom epics with tasks and efforts
         openai_service = get_openai_service()
-        logger.info("Calling OpenAI to generate custom epics with tasks and efforts...")
+        node_roles = profile["node_roles"]
+        generate_role = "analysis" if use_fast_model else node_roles["repair" if is_repair else "generate"]
+        modify_role = "analysis" if use_fast_model else node_roles["repair" if is_repair else "modify"]
         
-        system_message = f"""You are an expert software estimator specializing in {analyzed_req.domain} applications.
-
-Your task has TWO PARTS:
-1. MODIFY retrieved similar epics (NOT mandatory ones) to match project requirements
-   - **CRITICAL: Keep task descriptions EXACTLY as they are**
-   - **CRITICAL: Keep epic names EXACTLY as they are**
-   - **ONLY adapt platforms and hours**
-   - **ONLY ADD new tasks if project needs additional features**
-   - **DO NOT remove existing tasks**
-2. GENERATE new custom epics for uncovered features
-
- CRITICAL INSTRUCTION - PLATFORM ADAPTATION:
-
-TARGET PLATFORMS: {platforms_str}
-
-The examples (mandatory/retrieved epics) are REFERENCE PATTERNS showing:
- What tasks to create (epic structure, task descriptions)
- How many hours tasks typically take (effort ranges)
-
- But examples may have DIFFERENT platforms than your target!
- DO NOT copy platforms from examples!
-
-YOUR JOB:
-1. Learn TASK PATTERNS from examples (what tasks exist in what epic, how they're described)
-2. Learn EFFORT RANGES from examples (typical hours for similar work)
-3. **TRANSLATE to your target platforms: {platforms_str}**
-4. If example shows "Web App: 12h" but your target is Flutter → Output "Flutter: 12h"
-5. If example shows platforms not in target → Skip those platforms
-6. **ONLY include platforms from: {platforms_str}**
-
-Think of examples as TEMPLATES to adapt, not blueprints to copy exactly.
-
- CRITICAL INSTRUCTION - EPIC NAMING WITH USER TYPES:
+        # Fit each call's variable PROJECT CONTEXT sections into its own prompt token budget,
+        # counted with the tokenizer of the model the call is routed to. The call's static
+        # instructions are always sent in full; retrieved epics are ranked by similarity
+        # so the least similar are trimmed first.
+        ranked_similar = sorted(similar_epics, key=lambda e: e.similarity or 0.0, reverse=True)
+        mandatory_items = [format_epic_summary(e) for e in mandatory_epics]
+        # Retrieved epic names count as covered: they are adapted by the modify call
+        covered_epic_names = existing_epic_names + [e.name for e in similar_epics]
+        
+        generate_kept, _ = PromptBudget(
+            reserved_output_tokens=profile["generate_max_tokens"],
+            model=openai_service.router.models_for(generate_role)[0]
+        ).fit(
+            instructions="\n".join([GENERATE_CUSTOM_EPIC_SYSTEM_MESSAGE, GENERATE_CUSTOM_EPIC_PROMPT]),
+            sections={
+                "mandatory_epics": mandatory_items,
+                "retrieved_epics": load_epic_summaries(ranked_similar, analyzed_req.platforms),
+                "features": list(analyzed_req.features),
+            },
+            shares=PROMPT_SECTION_SHARES
+        )
+        
+        # The modify call adapts only the retrieved epics whose [E#] blocks fit its budget;
+        # the trimmed ones are kept unchanged
+        modify_epics = similar_epics
+        unmodified_epics: List[Epic] = []
+        modify_prompt = None
+        if similar_epics and profile["modify_retrieved"]:
+            modify_kept, _ = PromptBudget(
+                reserved_output_tokens=settings.modify_max_tokens,
+                model=openai_service.router.models_for(modify_role)[0]
+            ).fit(
+                instructions="\n".join([
+                    MODIFY_RETRIEVED_EPICS_SYSTEM_MESSAGE, MODIFY_RETRIEVED_EPICS_PROMPT, MODIFY_EPICS_OUTPUT_FORMAT
+                ]),
+                sections={
+                    "mandatory_epics": mandatory_items,
+                    "retrieved_epics": [
+                        format_epic_with_ids(epic, epic_index)
+                        for epic_index, epic in enumerate(ranked_similar, start=1)
+                    ],
+                    "features": list(analyzed_req.features),
+                },
+                shares=PROMPT_SECTION_SHARES
+            )
+            modify_epics = ranked_similar[:len(modify_kept["retrieved_epics"])]
+            unmodified_epics = ranked_similar[len(modify_epics):]
+            if unmodified_epics:
+                logger.info(f"  - {len(unmodified_epics)} least similar retrieved epics kept unchanged (prompt budget)")
+            if modify_epics:
+                # Static instructions come first so they form a cacheable prefix;
+                # per-project data (PROJECT CONTEXT) is appended last
+                modify_prompt = f"""{MODIFY_RETRIEVED_EPICS_PROMPT}
 
-USER TYPES IN PROJECT: {user_types_str}
+---
 
-**Epic Naming Rules:**
-1. **Generic epics** (used by all users) → Use plain name
-   Examples: "Authentication", "Database Design", "Notification", "Payment Integration"
+{MODIFY_EPICS_OUTPUT_FORMAT}
 
-2. **User-specific epics** (specific to one user type) → Add "- UserType" suffix
-   Examples: "Profile Management - Customer", "Dashboard - Admin", "Order Management - Seller"
+---
 
-3. **Multiple user types** → Use "/" separator
-   Examples: "Messaging - Buyer/Seller", "Reviews - Customer/Vendor"
+{build_project_context(analyzed_req, modify_kept, covered_epic_names, include_retrieved=False)}
 
-**Decision Logic:**
-- If ALL user types use the feature → Generic name (e.g., "Authentication")
-- If SPECIFIC user types use the feature → Add user type (e.g., "Dashboard - Admin")
-- If feature differs per user type → Create separate epic per type
+---
 
-**WHY:** Shows feature ownership, groups by user journey, improves retrieval accuracy.
+{format_epics_with_ids(modify_epics)}
+"""
+        project_context = build_project_context(
+            analyzed_req, generate_kept, covered_epic_names, include_retrieved=True
+        )
+        
+        generate_prompt = f"""{GENERATE_CUSTOM_EPIC_PROMPT}
 
- COVERAGE REQUIREMENT:
-Generate **15-25 custom epics** to ensure comprehensive coverage of all features.
+---
 
-Analyze the features list carefully: {features_str}
+{project_context}
+"""
+        custom_epic_target = profile["custom_epic_target"]
+        if custom_epic_target:
+            # Kept after PROJECT CONTEXT so the cacheable prefix is shared across modes
+            generate_prompt += f"""
+---
 
-**CRITICAL: Map every major feature to epics:**
-- Break down complex feature areas into multiple focused epics
-- Each payment method → Separate epic (if multiple payment methods exist)
-- Each AI/ML capability → Separate epic (Prediction, Recommendation, Detection, Analysis)
-- Each integration → Separate epic (Google Classroom, Canvas, Turnitin, etc.)
-- Each major user flow → Separate epic (Onboarding, Profile, Dashboard, Settings)
-- Platform-specific features → Separate epics (Offline Sync, Localization, Location Services)
-- Admin features → Multiple epics (Dashboard, User Mgmt, Billing, Analytics, Compliance)
-- Content management → Separate epics (CMS Pages, Email Templates, File Uploads)
+{CUSTOM_EPIC_TARGET_TEMPLATE.format(min_epics=custom_epic_target[0], max_epics=custom_epic_target[1])}
+"""
+        
+        if state.get("requirement_diff"):
+            changed_categories = "\n".join(
+                f"- **{name}**: {', '.join(features)}" for name, features in (analyzed_req.epic_categories or {}).items()
+            )
+            generate_prompt += f"""
+---
 
-**Epic Count Guidelines:**
-- 10-20 features in requirements → Generate 15-20 epics
-- 20-40 features in requirements → Generate 20-30 epics
-- 40+ features in requirements → Generate 30-40 epics
+{INCREMENTAL_CATEGORIES_TEMPLATE.format(categories=changed_categories)}
+"""
+        
+        # With a trained hour model the LLM only produces the task structure
+        hour_model = get_hour_model()
+        if hour_model:
+            generate_prompt += f"""
+---
 
-Key responsibilities:
-- Generate **15-25 domain-specific epics** for {analyzed_req.domain}
-- **Use "Epic Name - UserType" format when epic is user-specific**
-- Ensure ALL features from requirements are covered (study features list exhaustively)
-- Adapt example patterns to target platforms: {platforms_str}
-- Base effort estimates on similar tasks (but adjust platform names)
-- Avoid duplicating: {', '.join(existing_epic_names[:10])}
-- Each epic should have 3-8 high-level tasks (not granular sub-tasks)
+{TASK_STRUCTURE_ONLY_TEMPLATE}
+"""
+        
+        timeout = deadline.node_budget("generate_custom_epics") if deadline else None
+        
+        # Large projects fan out generation over balanced category shards
+        shards = []
+        categories = analyzed_req.epic_categories or {}
+        if (
+            profile["generation_fanout"]
+            and settings.generation_fanout_min_features
+            and len(analyzed_req.features) >= settings.generation_fanout_min_features
+            and len(categories) > 1
+        ):
+            shard_count = min(
+                settings.generation_fanout_max_shards,
+                math.ceil(len(categories) / settings.generation_fanout_shard_size)
+            )
+            shards = partition_categories(categories, shard_count)
+        
+        calls = {}
+        if len(shards) > 1:
+            logger.info(f"Fan-out generation: {len(categories)} categories in {len(shards)} shards")
+            for shard_index, shard in enumerate(shards, start=1):
+                shard_block = GENERATE_SHARD_TEMPLATE.format(
+                    shard_index=shard_index,
+                    shard_count=len(shards),
+                    shard_categories="\n".join(
+                        f"- **{name}**: {', '.join(features)}" for name, features in shard.items()
+                    ),
+                    other_categories=", ".join(name for name in categories if name not in shard)
+                )
+                # Shared static prefix and PROJECT CONTEXT, shard-specific block last
+                shard_prompt = f"""{generate_prompt}
+---
 
-Return valid JSON only."""
+{shard_block}
+"""
+                calls[f"generate_{shard_index}"] = lambda prompt=shard_prompt: openai_service.generate_json_completion(
+                    prompt=prompt,
+                    system_message=GENERATE_CUSTOM_EPIC_SYSTEM_MESSAGE,
+                    max_tokens=settings.generate_shard_max_tokens,
+                    role=generate_role,
+                    timeout=timeout
+                )
+        else:
+            calls["generate"] = lambda: openai_service.generate_json_completion(
+                prompt=generate_prompt,
+                system_message=GENERATE_CUSTOM_EPIC_SYSTEM_MESSAGE,
+                max_tokens=profile["generate_max_tokens"],
+                role=generate_role,
+                timeout=timeout
+            )
+        if modify_prompt:
+            calls["modify"] = lambda: openai_service.generate_json_completion(
+                prompt=modify_prompt,
+                system_message=MODIFY_RETRIEVED_EPICS_SYSTEM_MESSAGE,
+                max_tokens=settings.modify_max_tokens,
+                role=modify_role,
+                timeout=timeout
+            )
         
-        response = openai_service.generate_json_completion(
-            prompt=prompt,
-            system_message=system_message
-        )
+        # Modify and generate calls are independent: run them concurrently
+        logger.info(f"Calling OpenAI concurrently ({', '.join(calls)}) for custom epics with tasks and efforts...")
+        results = _run_concurrently(calls)
         
-        # Parse response
-        if isinstance(response, str):
-            response = json.loads(response)
+        modify_result = results.pop("modify", {"epic_patches": []})
+        generate_results = results
         
-        # Process MODIFIED epics (retrieved similar epics only, NOT mandatory)
-        modified_epics_data = response.get("modified_epics", [])
-        logger.info(f"Received {len(modified_epics_data)} modified retrieved epics (expected {len(similar_epics)})")
+        if isinstance(modify_result, Exception) and all(isinstance(r, Exception) for r in generate_results.values()):
+            raise next(iter(generate_results.values()))
         
-        for epic_data in modified_epics_data:
-            epic_name = epic_data.get("name", "")
-            
-            # Create Task objects from tasks data
-            tasks = []
-            for task_data in epic_data.get("tasks", []):
-                task_description = task_data.get("description", "")
-                efforts_data = task_data.get("efforts", {})
-                
-                # Convert platform strings to Platform enum
-                efforts = {}
-                for platform_name, hours in efforts_data.items():
-                    try:
-                        platform = Platform(platform_name)
-                        # Validate platform is in project requirements
-                        if platform in analyzed_req.platforms:
-                            efforts[platform] = int(hours)
-                        else:
-                            logger.warning(f"    Platform {platform_name} not in requirements for modified epic {epic_name}, skipping")
-                    except ValueError:
-                        logger.warning(f"    Unknown platform: {platform_name} in modified epic {epic_name}")
-                        continue
-                
-                if efforts:  # Only add task if it has valid efforts
-                    task = Task(
-                        description=task_description,
-                        efforts=efforts,
-                        source=epic_data.get("source_template", "Modified"),
-                        is_custom=False
-                    )
-                    tasks.append(task)
-            
-            # Create Epic object with preserved metadata
-            if tasks:  # Only add epic if it has tasks
-                modified_epic = Epic(
-                    name=epic_name,
-                    description=epic_data.get("description", ""),
-                    tasks=tasks,
-                    is_mandatory=epic_data.get("is_mandatory", False),
-                    source_template=epic_data.get("source_template", "Modified")
-                )
-                all_epics.append(modified_epic)
-                existing_epic_names.append(epic_name)
-                logger.info(f"  ✓ Modified: {epic_name} ({len(tasks)} tasks, mandatory={modified_epic.is_mandatory})")
+        call_warnings = []
+        if isinstance(modify_result, Exception):
+            # An empty patch keeps the retrieved epics as-is (already platform-filtered during retrieval)
+            call_warnings.append(f"Warning: Retrieved epic modification failed, using retrieved epics unchanged: {modify_result}")
+            epic_patches = []
+        else:
+            epic_patches = modify_result.get("epic_patches", [])
+        
+        shard_results = []
+        for name, generate_result in generate_results.items():
+            if isinstance(generate_result, Exception):
+                call_warnings.append(f"Warning: Custom epic generation failed ({name}): {generate_result}")
+                shard_results.append([])
             else:
-                logger.warning(f"  - Skipped modified epic: {epic_name} (no valid tasks)")
+                shard_results.append(generate_result.get("custom_epics", []))
+        
+        if deadline and all(isinstance(r, APITimeoutError) for r in generate_results.values()):
+            degradations.append(deadline.degrade("retrieved_only"))
         
-        logger.info(f"✓ Added {len(mandatory_epics)} mandatory epics (unchanged) and {len(modified_epics_data)} retrieved epics (modified)")
+        if len(shard_results) > 1:
+            custom_epics_data = merge_shard_epics(shard_results, analyzed_req.user_types or [])
+        else:
+            custom_epics_data = shard_results[0]
         
-        # Process CUSTOM epics (new ones)
-        custom_epics_data = response.get("custom_epics", [])
+        logger.info(f"Received patches for {len(epic_patches)} of {len(modify_epics)} retrieved epics sent for modification")
+        modified_epics = apply_epic_patches(modify_epics, epic_patches, analyzed_req)
+        modified_epics += [epic.model_copy(deep=True) for epic in unmodified_epics]
         logger.info(f"Received {len(custom_epics_data)} new custom epics")
         
-        # Convert to Epic objects
-        for epic_data in custom_epics_data:
-            epic_name = epic_data.get("name", "")
-            
-            # Check for EXACT duplicates only (not semantic similarity)
-            if epic_name in existing_epic_names:
-                logger.info(f"  - Skipped: {epic_name} (exact match)")
-                continue
-            
-            # Create Task objects from tasks data
-            tasks = []
-            for task_data in epic_data.get("tasks", []):
-                task_description = task_data.get("description", "")
-                efforts_data = task_data.get("efforts", {})
-                
-                # Convert platform strings to Platform enum
-                efforts = {}
-                for platform_name, hours in efforts_data.items():
-                    try:
-                        platform = Platform(platform_name)
-                        # Validate platform is in project requirements
-                        if platform in analyzed_req.platforms:
-                            efforts[platform] = int(hours)
-                        else:
-                            logger.warning(f"    Platform {platform_name} not in requirements, skipping")
-                    except ValueError:
-                        logger.warning(f"    Unknown platform: {platform_name}")
-                        continue
-                
-                if efforts:  # Only add task if it has valid efforts
-                    task = Task(
-                        description=task_description,
-                        efforts=efforts,
-                        source="AI Generated",
-                        is_custom=True
-                    )
-                    tasks.append(task)
-            
-            # Create Epic object
-            if tasks:  # Only add epic if it has tasks
-                custom_epic = Epic(
-                    name=epic_name,
-                    description=epic_data.get("description", ""),
-                    tasks=tasks,
-                    is_mandatory=False,
-                    source_template="AI Generated"
-                )
-                all_epics.append(custom_epic)
-                existing_epic_names.append(epic_name)
-                logger.info(f"  + Added: {epic_name} ({len(tasks)} tasks)")
-            else:
-                logger.warning(f"  - Skipped: {epic_name} (no valid tasks)")
+        merge_generated_epics(
+            all_epics=all_epics,
+            existing_epic_names=existing_epic_names,
+            modified_epics=modified_epics,
+            custom_epics_data=custom_epics_data,
+            analyzed_req=analyzed_req
+        )
+        if hour_model:
+            fill_model_hours(hour_model, [e for e in all_epics if e.source_template == "AI Generated"])
         
         # Count mandatory (unchanged)
         mandatory_count = len([e for e in all_epics if e.is_mandatory])
@@ -489,10 +848,11 @@ Return valid JSON only."""
         logger.info(f"  - New custom epics (generated): {new_generated_count}")
         
         # Validate estimation quality
-        validation_warnings = validate_estimation_quality(
+        validation_warnings = call_warnings + validate_estimation_quality(
             all_epics=all_epics,
             analyzed_req=analyzed_req,
-            features_count=len(analyzed_req.features)
+            features_count=len(analyzed_req.features),
+            custom_epic_target=custom_epic_target
         )
         
         if validation_warnings:
@@ -505,14 +865,20 @@ Return valid JSON only."""
         return {
             "generated_epics": all_epics,
             "validation_errors": validation_warnings if validation_warnings else None,
-            "current_step": "generate_custom_epics_complete"
+            "degradations": degradations,
+            "current_step": "generate_custom_epics_complete",
+            "retry_count": retry_count
         }
         
     except Exception as e:
         logger.error(f"Error in generate_custom_epic_node: {e}", exc_info=True)
         # If epic generation fails, continue with retrieved epics
+        if deadline and isinstance(e, APITimeoutError):
+            degradations.append(deadline.degrade("retrieved_only"))
         return {
             "generated_epics": retrieved_epics,
+            "degradations": degradations,
             "validation_errors": [f"Warning: Custom epic generation failed: {str(e)}"],
-            "current_step": "generate_custom_epics_complete"
+            "current_step": "generate_custom_epics_complete",
+            "retry_count": retry_count
         }
@@ -2,19 +2,69 @@ import logging
 from typing import Dict, Any, List
 
 from ..models.schemas import  Epic
+from ..core.config import settings
 from ..services.mysql_knowledge_base import get_knowledge_base
 from ..services.mandatory_epics_service import get_mandatory_epics_service
+from ..services.pipeline_profiles import get_pipeline_profile
+from ..services.platform_adapter import get_platform_adapter
 from ..utils.epic_utils import is_similar_epic_name
 
 logger = logging.getLogger(__name__)
 
 
+def category_query_text(epic_name: str, related_features: List[str]) -> str:
+    """Build the focused retrieval query for one epic category."""
+    return f"Epic: {epic_name}. Features: {', '.join(related_features)}"
+
+
+def prefetch_similar_epics_node(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Speculatively prefetch KB candidates from the raw requirement.
+    
+    Runs in parallel with requirement analysis: loads the KB similarity index,
+    embeds the raw description and fetches the top candidate epics with their
+    tasks, so the retrieval node only has to embed and rank its category queries.
+    A failure here is not fatal, retrieval then loads everything itself.
+    """
+    logger.info("=== Prefetch Similar Epics (speculative) ===")
+    
+    if not settings.speculative_retrieval_enabled:
+        return {"prefetched_epics": None}
+    
+    raw_requirements = state["raw_requirements"]
+    
+    try:
+        kb = get_knowledge_base()
+        index = kb.load_epic_index()
+        
+        query_text = f"{raw_requirements.project_name}. {raw_requirements.description}"[:8000]
+        candidates = kb.retrieve_similar_epics(
+            query_text=query_text,
+            n_results=settings.speculative_prefetch_top_k,
+            similarity_threshold=0.0,
+            index=index
+        )
+        
+        logger.info(f"✓ Prefetched {len(candidates)} candidate epics from the raw requirement")
+        return {
+            "prefetched_epics": {
+                "index": index,
+                "candidates": {(e.source_template, e.kb_epic_id): e for e in candidates},
+            }
+        }
+    
+    except Exception as e:
+        logger.warning(f"Speculative prefetch failed, retrieval will load the KB itself: {e}")
+        return {"prefetched_epics": None}
+
+
 def retrieve_similar_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Find similar epics from historical data using vector search.
     
     Retrieves all mandatory epics plus relevant epics from MySQL
-    based on similarity to the current project requirements.
+    based on similarity to the current project requirements. The KB index
+    and candidate epics prefetched during analysis are reused when available.
     """
     logger.info("=== Retrieve Similar Epic Agent ===")
     
@@ -32,6 +82,11 @@ def retrieve_similar_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
         kb = get_knowledge_base()
         mandatory_service = get_mandatory_epics_service()
         
+        # Reuse the speculative prefetch; otherwise load the index once for all queries
+        prefetched = state.get("prefetched_epics") or {}
+        index = prefetched.get("index") or kb.load_epic_index()
+        candidates = prefetched.get("candidates") or {}
+        
         retrieved_epics: List[Epic] = []
         mandatory_epic_names = set()
         
@@ -40,6 +95,8 @@ def retrieve_similar_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
         mandatory_epics = mandatory_service.get_mandatory_epics()
         
         for epic in mandatory_epics:
+            # Copy: the service caches these, and platform filtering below mutates tasks
+            epic = epic.model_copy(deep=True)
             retrieved_epics.append(epic)
             mandatory_epic_names.add(epic.name)
             logger.info(f"  ✓ Loaded mandatory epic: {epic.name} ({len(epic.tasks)} tasks, source: {epic.source_template})")
@@ -49,13 +106,45 @@ def retrieve_similar_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
         # Step 2: Retrieve epics separately for each epic category
         
         epic_categories = analyzed_req.epic_categories or {}
+        degradations = []
+        profile = get_pipeline_profile(state["raw_requirements"].mode)
+        
+        # Categories already embedded during analysis are searched first when the list is capped
+        embedded = state.get("category_embeddings") or {}
+        def capped(categories: Dict[str, List[str]], limit: int) -> Dict[str, List[str]]:
+            ordered = sorted(categories.items(), key=lambda item: category_query_text(*item) not in embedded)
+            return dict(ordered[:limit])
+        
+        if profile["max_retrieval_categories"] and len(epic_categories) > profile["max_retrieval_categories"]:
+            logger.info(
+                f"'{profile['mode']}' mode: searching {profile['max_retrieval_categories']} "
+                f"of {len(epic_categories)} categories"
+            )
+            epic_categories = capped(epic_categories, profile["max_retrieval_categories"])
+        
+        # Short on time: search fewer categories
+        deadline = state.get("deadline")
+        if (
+            deadline
+            and deadline.remaining() < settings.deadline_fast_model_seconds
+            and len(epic_categories) > settings.deadline_reduced_retrieval_categories
+        ):
+            epic_categories = capped(epic_categories, settings.deadline_reduced_retrieval_categories)
+            degradations.append(deadline.degrade("reduced_retrieval"))
         
         # Track all epic names we've added (for semantic deduplication)
         added_epic_names = list(mandatory_epic_names)
+        # Categories with no KB epic above the threshold (estimated from history without generation)
+        uncovered_categories: Dict[str, List[str]] = {}
         
         if epic_categories:
             logger.info(f"Retrieving epics separately for {len(epic_categories)} categories...")
             
+            # Category queries already embedded while the analysis was streaming
+            category_embeddings = state.get("category_embeddings") or {}
+            if category_embeddings:
+                logger.info(f"  {len(category_embeddings)} category queries embedded during analysis")
+            
             for epic_name, related_features in epic_categories.items():
                 # Skip retrieval if this category name EXACTLY matches a mandatory epic
                 # (Mandatory epics are already included from config)
@@ -64,15 +153,20 @@ def retrieve_similar_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
                     continue
                 
                 # Build focused query for this specific epic category
-                query_text = f"Epic: {epic_name}. Features: {', '.join(related_features)}"
+                query_text = category_query_text(epic_name, related_features)
                 logger.info(f"  Querying category '{epic_name}': {query_text}")
                 
                 # Retrieve epics for this specific category
                 category_epics = kb.retrieve_similar_epics(
                     query_text=query_text,
-                    n_results=1,  # Get top 3 for each category
-                    similarity_threshold=0.7 #0-disimilar , 1-similar 
+                    n_results=profile["retrieval_results_per_category"],
+                    similarity_threshold=profile["retrieval_threshold"],  # 0-dissimilar, 1-similar
+                    index=index,
+                    cache=candidates,
+                    query_embedding=category_embeddings.get(query_text)
                 )
+                if not category_epics:
+                    uncovered_categories[epic_name] = related_features
                 
                 # Filter out duplicates
                 for epic in category_epics:
@@ -105,7 +199,9 @@ def retrieve_similar_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
             
             similar_epics = kb.retrieve_similar_epics(
                 query_text=query_text,
-                n_results=25
+                n_results=25,
+                index=index,
+                cache=candidates
             )
             
             # Filter out duplicates
@@ -127,15 +223,21 @@ def retrieve_similar_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
         logger.info(f"✓ Retrieved {len(retrieved_epics)} total epics:")
         logger.info(f"  - {len(mandatory_epic_names)} mandatory")
         logger.info(f"  - {len(retrieved_epics) - len(mandatory_epic_names)} similar (after deduplication)")
+        if candidates:
+            reused = sum(1 for e in retrieved_epics if (e.source_template, e.kb_epic_id) in candidates)
+            logger.info(f"  - {reused} served from the speculative prefetch")
 
-        # Filter tasks and efforts by target platforms
+        # Adapt tasks and efforts to target platforms
         target_platforms = state["analyzed_requirement"].platforms
         # Create a set of platform enums for comparison
         target_platform_set = set(target_platforms)
-        logger.info(f" Filtering epics for target platforms: {[p.value for p in target_platforms]}")
+        logger.info(f" Adapting epics to target platforms: {[p.value for p in target_platforms]}")
         
+        # Mandatory epics keep their fixed hours: only drop non-target platforms
         filtered_epics = []
         for epic in retrieved_epics:
+            if not epic.is_mandatory:
+                continue
             filtered_tasks = []
             for task in epic.tasks:
                 # Keep only efforts for target platforms
@@ -159,10 +261,17 @@ def retrieve_similar_epic_node(state: Dict[str, Any]) -> Dict[str, Any]:
             else:
                 logger.info(f"  ✗ {epic.name}: Excluded (no tasks for target platforms)")
         
+        # Retrieved epics are translated deterministically (e.g. Web App -> Flutter hours)
+        # so the LLM receives them already expressed in the target platforms
+        similar_epics = [epic for epic in retrieved_epics if not epic.is_mandatory]
+        filtered_epics.extend(get_platform_adapter().adapt_epics(similar_epics, target_platforms))
+        
         logger.info(f"✓ Final result: {len(filtered_epics)} epics with platform-filtered tasks")
         
         return {
             "retrieved_epics": filtered_epics,
+            "uncovered_categories": uncovered_categories,
+            "degradations": degradations,
             "current_step": "retrieve_similar_epics_complete"
         }
         
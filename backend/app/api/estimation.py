@@ -1,22 +1,120 @@
 """Estimation API routes."""
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import Dict, Any
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, Optional
 import logging
 
-from ..models.schemas import ProjectRequirement, ProjectEstimation
-from ..workflow import run_estimation_workflow
+from ..core.config import settings
+from ..models.schemas import EstimationMode, ProjectRequirement, ProjectEstimation
+from ..workflow import UnknownEstimationError, run_estimation_workflow
+from ..services.admission import MODE_PRIORITY, AdmissionRejected, get_admission_controller
+from ..services.estimation_store import get_estimation_store
 from ..services.mysql_knowledge_base import get_knowledge_base
+from ..services.pipeline_profiles import get_pipeline_profile, load_profile_benchmarks
+from ..services.request_coalescing import (
+    IdempotencyKeyReused,
+    get_idempotency_store,
+    get_single_flight,
+    requirement_fingerprint,
+)
+from ..services.telemetry import TelemetryRecorder
+from ..services.uncertainty import bootstrap_intervals
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["estimation"])
 
 
+def _run_estimation(requirement: ProjectRequirement, previous_estimation_id: Optional[str] = None) -> Dict[str, Any]:
+    """Run the workflow and build the response body (called in a worker thread)."""
+    # Run workflow - returns both estimation and analyzed requirement
+    telemetry = TelemetryRecorder()
+    estimation, analyzed_req = run_estimation_workflow(
+        requirement, telemetry=telemetry, previous_estimation_id=previous_estimation_id
+    )
+    
+    # Convert to dict for response
+    estimation_dict = estimation.model_dump()
+    
+    # Add analyzed requirement to response
+    if analyzed_req:
+        estimation_dict['analyzed_requirement'] = analyzed_req.model_dump()
+    
+    return {
+        "success": True,
+        "estimation": estimation_dict,
+        "telemetry": telemetry.summary()
+    }
+
+
+async def _coalesced_estimation(
+    requirement: ProjectRequirement,
+    idempotency_key: Optional[str],
+    client_id: str,
+    previous_estimation_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Run an estimation, sharing the result with identical concurrent requests.
+    
+    A retry with an already answered Idempotency-Key gets the recorded
+    response; a request identical to one still running attaches to it (see
+    services/request_coalescing.py). Other requests pass admission control
+    (services/admission.py) before the workflow runs in a worker thread,
+    so the event loop stays free to accept the duplicates.
+    
+    Returns:
+        Response body ("coalesced" is True if it was shared or replayed,
+        "admission" reports the queue position and wait)
+    
+    Raises:
+        IdempotencyKeyReused if the key was used for a different request
+        AdmissionRejected if the estimation queue is full
+    """
+    fingerprint = requirement_fingerprint(requirement, previous_estimation_id)
+    idempotency = get_idempotency_store()
+    if idempotency_key:
+        recorded = idempotency.get(idempotency_key, fingerprint)
+        if recorded is not None:
+            logger.info(f"✓ Replaying the response recorded for Idempotency-Key {idempotency_key}")
+            return {**recorded, "coalesced": True}
+    
+    async def call() -> Dict[str, Any]:
+        if not settings.admission_enabled:
+            return await run_in_threadpool(_run_estimation, requirement, previous_estimation_id)
+        async with get_admission_controller().admit(
+            client_id, MODE_PRIORITY[requirement.mode], requirement.job_class
+        ) as ticket:
+            result = await run_in_threadpool(_run_estimation, requirement, previous_estimation_id)
+        return {**result, "admission": ticket.summary()}
+    
+    if settings.single_flight_enabled:
+        result, shared = await get_single_flight().run(fingerprint, call)
+    else:
+        result, shared = await call(), False
+    
+    if idempotency_key:
+        idempotency.put(idempotency_key, fingerprint, result)
+    return {**result, "coalesced": shared}
+
+
+def _client_id(request: Request, x_client_id: Optional[str]) -> str:
+    """Client an estimation is admitted for: the X-Client-Id header, else the caller's IP."""
+    return x_client_id or (request.client.host if request.client else "unknown")
+
+
+def _admission_rejected(e: AdmissionRejected) -> HTTPException:
+    """429 response telling the client when to retry."""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
 @router.post("/estimate", response_model=Dict[str, Any])
 async def create_estimation(
     requirement: ProjectRequirement,
-    background_tasks: BackgroundTasks
+    background_tasks: BackgroundTasks,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    x_client_id: Optional[str] = Header(None)
 ) -> Dict[str, Any]:
     """
     Generate project estimation from requirements.
@@ -24,36 +122,282 @@ async def create_estimation(
     Args:
         requirement: Project requirement details
         background_tasks: FastAPI background tasks
+        request: HTTP request (its client IP identifies callers without X-Client-Id)
+        idempotency_key: Idempotency-Key header; retries with the same key
+            get the first response instead of a new estimation
+        x_client_id: X-Client-Id header, the client for per-client admission limits
         
     Returns:
-        Project estimation with epics and tasks
+        Project estimation with epics and tasks (429 with Retry-After when the queue is full)
     """
     try:
         logger.info(f"Received estimation request for: {requirement.project_name}")
         
-        # Run workflow - returns both estimation and analyzed requirement
-        estimation, analyzed_req = run_estimation_workflow(requirement)
+        return await _coalesced_estimation(requirement, idempotency_key, _client_id(request, x_client_id))
         
-        # Convert to dict for response
-        estimation_dict = estimation.model_dump()
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AdmissionRejected as e:
+        raise _admission_rejected(e)
+    except Exception as e:
+        logger.error(f"Estimation failed: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate estimation: {str(e)}"
+        )
+
+
+@router.post("/estimate/{estimation_id}/incremental", response_model=Dict[str, Any])
+async def create_incremental_estimation(
+    estimation_id: str,
+    requirement: ProjectRequirement,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None),
+    x_client_id: Optional[str] = Header(None)
+) -> Dict[str, Any]:
+    """
+    Re-estimate an earlier estimation after its requirements were edited.
+    
+    The edited requirements are re-analyzed; only epic categories that were
+    added or changed are re-retrieved and regenerated, the epics of unchanged
+    categories are carried over verbatim.
+    
+    Args:
+        estimation_id: estimation_id of the earlier estimation
+        requirement: Edited project requirements
+        request: HTTP request
+        idempotency_key: Idempotency-Key header (see create_estimation)
+        x_client_id: X-Client-Id header (see create_estimation)
+        
+    Returns:
+        Updated project estimation (with a new estimation_id and the requirement_diff)
+    """
+    try:
+        logger.info(f"Received incremental estimation request for: {requirement.project_name} (from {estimation_id})")
         
-        # Add analyzed requirement to response
-        if analyzed_req:
-            estimation_dict['analyzed_requirement'] = analyzed_req.model_dump()
+        return await _coalesced_estimation(
+            requirement, idempotency_key, _client_id(request, x_client_id), previous_estimation_id=estimation_id
+        )
+        
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except AdmissionRejected as e:
+        raise _admission_rejected(e)
+    except UnknownEstimationError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Incremental estimation failed: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to generate estimation: {str(e)}"
+        )
+
+
+@router.get("/queue")
+async def get_queue_status(request: Request, x_client_id: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """
+    Get the estimation queue's load, per-class wait metrics and the caller's queue positions.
+    
+    Returns:
+        Running and queued jobs, recent throughput, the current Retry-After,
+        per job class (interactive / bulk) running, queued and wait time
+        percentiles, and the caller's running jobs and queue positions
+    """
+    return {
+        "success": True,
+        "queue": get_admission_controller().status(_client_id(request, x_client_id))
+    }
+
+
+@router.post("/estimate/intervals")
+async def recompute_intervals(estimation: ProjectEstimation) -> Dict[str, Any]:
+    """
+    Recompute the confidence intervals of an (edited) estimation.
+    
+    Args:
+        estimation: Estimation with the current task hours
         
-        result = {
+    Returns:
+        Bootstrap p50/p80/p95 hours for the total, per platform and per epic
+    """
+    try:
+        return {
             "success": True,
-            "estimation": estimation_dict
+            "confidence_intervals": bootstrap_intervals(estimation)
         }
         
-        return result
+    except Exception as e:
+        logger.error(f"Failed to compute confidence intervals: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to compute confidence intervals: {str(e)}"
+        )
+
+
+@router.get("/estimations")
+async def list_estimations(
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    List stored estimations, newest first.
+    
+    Args:
+        limit: Page size
+        before: next_cursor of the previous page
+        
+    Returns:
+        Estimation summaries and the cursor of the next page (None on the last page)
+    """
+    try:
+        items, next_cursor = get_estimation_store().list(limit=limit, before=before)
+        
+        return {
+            "success": True,
+            "estimations": items,
+            "next_cursor": next_cursor
+        }
         
     except Exception as e:
-        logger.error(f"Estimation failed: {e}")
+        logger.error(f"Failed to list estimations: {e}")
         raise HTTPException(
             status_code=500,
-            detail=f"Failed to generate estimation: {str(e)}"
+            detail=f"Failed to list estimations: {str(e)}"
+        )
+
+
+@router.get("/estimations/{estimation_id}")
+async def get_estimation(estimation_id: str, version: Optional[int] = Query(None, ge=1)) -> Dict[str, Any]:
+    """
+    Reopen a stored estimation without regenerating it.
+    
+    Args:
+        estimation_id: Stored estimation
+        version: Edit version (defaults to the latest)
+        
+    Returns:
+        The estimation (with its analyzed_requirement) and its version history
+    """
+    try:
+        record = get_estimation_store().get(estimation_id, version)
+    except Exception as e:
+        logger.error(f"Failed to load estimation {estimation_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to load estimation: {str(e)}"
+        )
+    
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Unknown estimation or version: {estimation_id}")
+    
+    estimation_dict = record["estimation"].model_dump()
+    if record["analyzed_requirement"]:
+        estimation_dict['analyzed_requirement'] = record["analyzed_requirement"].model_dump()
+    
+    return {
+        "success": True,
+        "estimation": estimation_dict,
+        "version": record["version"],
+        "latest_version": record["latest_version"],
+        "versions": record["versions"]
+    }
+
+
+@router.put("/estimations/{estimation_id}")
+async def save_estimation_version(
+    estimation_id: str,
+    estimation: ProjectEstimation,
+    note: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Save an edited estimation as a new version (stored as a diff to the previous one).
+    
+    Args:
+        estimation_id: Stored estimation
+        estimation: Edited estimation
+        note: Optional description of the edit
+        
+    Returns:
+        The saved version (unchanged estimations keep the latest version)
+    """
+    try:
+        version = get_estimation_store().add_version(estimation_id, estimation, note)
+    except Exception as e:
+        logger.error(f"Failed to save estimation {estimation_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to save estimation: {str(e)}"
+        )
+    
+    if version is None:
+        raise HTTPException(status_code=404, detail=f"Unknown estimation: {estimation_id}")
+    
+    return {
+        "success": True,
+        "estimation_id": estimation_id,
+        "version": version
+    }
+
+
+@router.get("/estimations/{estimation_id}/diff")
+async def diff_estimations(
+    estimation_id: str,
+    from_version: Optional[int] = Query(None, ge=1),
+    to_version: Optional[int] = Query(None, ge=1),
+    to_estimation_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Compare two versions of a stored estimation, or two stored estimations.
+    
+    Args:
+        estimation_id: Estimation compared from
+        from_version: Its version (defaults to the previous version, or the
+            latest when comparing with another estimation)
+        to_version: Version compared to (defaults to the latest)
+        to_estimation_id: Estimation compared to (defaults to estimation_id)
+        
+    Returns:
+        Epic-level summary (hours, added/removed/changed epics) and the structural changes
+    """
+    try:
+        diff = get_estimation_store().diff(estimation_id, from_version, to_version, to_estimation_id)
+    except Exception as e:
+        logger.error(f"Failed to diff estimation {estimation_id}: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to compare estimations: {str(e)}"
         )
+    
+    if diff is None:
+        raise HTTPException(status_code=404, detail="Unknown estimation or version")
+    
+    return {
+        "success": True,
+        **diff
+    }
+
+
+@router.get("/profiles")
+async def list_profiles() -> Dict[str, Any]:
+    """
+    Get the pipeline profile behind each estimation mode.
+    
+    Returns:
+        Profiles per mode, with their latest benchmark results if available
+    """
+    benchmarks = load_profile_benchmarks()
+    
+    return {
+        "success": True,
+        "profiles": {
+            mode.value: {
+                **get_pipeline_profile(mode),
+                "benchmark": benchmarks.get("modes", {}).get(mode.value)
+            }
+            for mode in EstimationMode
+        },
+        "benchmarked_at": benchmarks.get("benchmarked_at")
+    }
 
 
 @router.get("/epics")
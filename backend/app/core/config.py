@@ -18,6 +18,16 @@ class Settings(BaseSettings):
     openai_model: str = "gpt-4o-mini"
     openai_embedding_model: str = "text-embedding-3-small"
     openai_temperature: float = 0.4
+    openai_max_retries: int = 2
+    openai_timeout_seconds: float = 120.0  # Per-request timeout (deadline-bound calls use less)
+    
+    # Per-node model routing: comma-separated, ordered model lists (primary first,
+    # then fallbacks tried on timeouts/errors). Empty = use openai_model.
+    openai_model_analysis: str = "gpt-4o-mini"
+    openai_model_modify: str = ""
+    openai_model_generate: str = ""
+    openai_model_repair: str = ""
+    openai_fallback_models: str = "gpt-4o-mini"  # Appended to every node's chain
     
     # MySQL Configuration
     mysql_host: str = "localhost"
@@ -31,16 +41,100 @@ class Settings(BaseSettings):
     api_title: str = "EB Estimation Agent API"
     api_version: str = "1.0.0"
     
+    # Custom Epic Generation (modify and generate run as separate concurrent calls)
+    modify_max_tokens: int = 2000  # Delta patch output only
+    generate_max_tokens: int = 8000
+    
+    # Fan-out generation: large projects split epic categories into shards generated in parallel
+    generation_fanout_min_features: int = 40  # 0 disables fan-out
+    generation_fanout_shard_size: int = 8  # Epic categories per shard
+    generation_fanout_max_shards: int = 6
+    generate_shard_max_tokens: int = 4000
+    
+    # Prompt budget per generation call (prompt + reserved output), split by PROMPT_SECTION_SHARES
+    prompt_budget_tokens: int = 32000
+    
     # External API (Future)
     external_estimate_api_url: str = "https://api.example.com/estimates"
     external_api_key: str = ""
     
+    # Deadlines (per-request time budget, see services/deadline.py)
+    estimation_deadline_seconds: float = 180.0
+    deadline_min_generation_seconds: float = 20.0  # Less left: mandatory + retrieved epics only
+    deadline_fast_model_seconds: float = 60.0  # Less left: fast model, reduced retrieval, no repair retry
+    deadline_finalize_seconds: float = 2.0
+    deadline_reduced_retrieval_categories: int = 10
+    deadline_min_fallback_seconds: float = 10.0  # Less left after a failed call: no fallback model
+    
     # Logging
     log_level: str = "INFO"
     
+    # Telemetry (per-estimation LLM call records, appended as JSON lines)
+    telemetry_log_path: str = str(PROJECT_ROOT / "telemetry" / "estimations.jsonl")
+    
     # Retrieval Configuration
     similarity_top_k: int = 5
     similarity_threshold: float = 0.8
+    speculative_retrieval_enabled: bool = True  # Prefetch KB candidates while analysis runs
+    speculative_prefetch_top_k: int = 20
+    streamed_analysis_enabled: bool = True  # Embed category queries while the analysis streams
+    streamed_retrieval_workers: int = 4
+    
+    # Historical hour statistics (services/hour_statistics.py, rebuilt at KB ingestion)
+    hour_stats_clusters: int = 0  # Epic embedding clusters, 0 = sqrt(epics / 2)
+    
+    # Bootstrap confidence intervals (services/uncertainty.py)
+    bootstrap_replicates: int = 2000
+    bootstrap_min_group_size: int = 3  # Task names need this many historical estimates to contribute hour ratios
+    
+    # Local task hour model (services/hour_model.py, trained with `python -m backend.app.services.hour_model train`)
+    hour_model_enabled: bool = True  # Once trained, new custom epics are generated without hours and the model predicts them
+    hour_model_alpha: float = 1.0  # Ridge L2 penalty
+    hour_model_min_samples: int = 20  # KB tasks a platform needs to get a model
+    hour_model_holdout: float = 0.2  # Fraction of KB estimations held out for evaluation
+    
+    # Generated task hours vs nearest historical tasks (check_task_hours_node)
+    task_hours_check_enabled: bool = True
+    task_hours_check_max_ratio: float = 3.0  # Outlier if hours > ratio x or < 1/ratio x the neighbors' median
+    task_hours_check_neighbors: int = 5
+    task_hours_check_min_similarity: float = 0.6
+    task_hours_check_min_neighbors: int = 2
+    
+    # Semantic requirement cache (services/requirement_cache.py)
+    requirement_cache_enabled: bool = True
+    requirement_cache_similarity: float = 0.97  # Min cosine similarity of briefs to reuse a stored run
+    requirement_cache_max_entries: int = 500
+    requirement_cache_dir: str = str(PROJECT_ROOT / "requirement_cache")
+    
+    # Estimation store (services/estimation_store.py)
+    estimation_store_path: str = str(PROJECT_ROOT / "estimations.db")  # SQLite database
+    estimation_store_snapshot_interval: int = 20  # Versions per full snapshot, the others are stored as diffs
+    estimation_store_page_size: int = 20
+    
+    # Request coalescing (services/request_coalescing.py)
+    single_flight_enabled: bool = True  # Identical concurrent estimation requests share one workflow run
+    idempotency_ttl_seconds: int = 86400  # How long a response is replayed to retries with the same Idempotency-Key
+    idempotency_max_entries: int = 1000
+    
+    # Admission control (services/admission.py)
+    admission_enabled: bool = True
+    admission_max_concurrent: int = 4  # Estimation workflows running at once
+    admission_max_per_client: int = 2  # Of which one client (X-Client-Id header, else IP) may run
+    admission_queue_size: int = 20  # Waiting jobs beyond this are rejected with 429
+    admission_queue_timeout_seconds: float = 60.0  # Queued longer: 429 (the deadline only starts once admitted)
+    admission_priority_aging_seconds: float = 30.0  # Waiting this long raises a job by one priority level
+    admission_throughput_window_seconds: float = 600.0  # Recent completions used for Retry-After
+    admission_max_retry_after_seconds: int = 600
+    # Job classes: weighted fair share of started jobs while both classes are queued
+    admission_interactive_weight: int = 4
+    admission_bulk_weight: int = 1  # Bulk's guaranteed minimum: bulk_weight / (interactive_weight + bulk_weight)
+    admission_interactive_reserved_slots: int = 1  # Running slots bulk jobs never take, so interactive jobs start without waiting for a bulk run
+    admission_bulk_queue_timeout_seconds: float = 1800.0  # Bulk jobs may wait behind interactive work much longer
+    
+    # LLM Record/Replay (cassettes)
+    llm_cassette_mode: str = "off"  # off | record | replay
+    llm_cassette_dir: str = str(PROJECT_ROOT / "cassettes")
+    llm_cassette_replay_latency_scale: float = 0.0  # 0 = CPU speed, 1.0 = recorded latency
     
     model_config = SettingsConfigDict(
         env_file=str(ENV_FILE),
@@ -1,6 +1,6 @@
 """Application constants."""
 
-from typing import List
+from typing import Any, Dict, List, Tuple
 
 # Mandatory Epics that MUST be included in every estimation
 MANDATORY_EPICS: List[str] = [
@@ -17,11 +17,40 @@ MANDATORY_EPICS: List[str] = [
 # Platform names
 PLATFORMS = ["Flutter", "Web App", "API", "CMS"]
 
-# Prompts for AI agents
-ANALYZE_REQUIREMENT_PROMPT = """You are an expert software requirements analyst specializing in project estimation. Analyze this project requirement and extract structured information for estimation and planning.
+# Default platform equivalences for adapting historical epics to target platforms:
+# target platform -> ordered (source platform, hour scaling factor) candidates.
+# Only end-user frontends are interchangeable; CMS (admin) and API work is never
+# derived from another platform. Factors are overridden by ratios learned from
+# the KB (see services/platform_adapter.py).
+PLATFORM_EQUIVALENCES: Dict[str, List[Tuple[str, float]]] = {
+    "Flutter": [("Web App", 1.0)],
+    "Web App": [("Flutter", 1.0)],
+    "CMS": [],
+    "API": [],
+}
+
+# Single-letter platform codes used in compact epic summaries (see utils/epic_utils.py)
+PLATFORM_CODES: Dict[str, str] = {
+    "Flutter": "F",
+    "Web App": "W",
+    "API": "A",
+    "CMS": "C",
+}
+
+# OpenAI pricing in USD per 1M tokens: (input, cached input, output).
+# Matched by longest model-name prefix, so dated snapshots resolve to their family.
+MODEL_PRICING: Dict[str, Tuple[float, float, float]] = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "text-embedding-3-small": (0.02, 0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.13, 0.0),
+}
 
-Project Requirement:
-{requirement}
+# Prompts for AI agents
+ANALYZE_REQUIREMENT_PROMPT = """You are an expert software requirements analyst specializing in project estimation. Analyze the project requirement given at the end of this message and extract structured information for estimation and planning.
 
 **CRITICAL ANALYSIS GUIDELINES:**
 1. BE PRECISE & COMPREHENSIVE: Extract ALL explicit and implied requirements
@@ -224,41 +253,36 @@ Don't assume features - extract ONLY what's mentioned or clearly required for th
 Return valid JSON in this format:
 {{
   "domain": "domain_name",
-  "features": ["feature1", "feature2", "feature3"],
-  "tech_stack": ["tech1", "tech2"],
   "platforms": ["Flutter", "API", "CMS", "Web App"],
-  "initial_epics": ["Feature 1 Epic Name", "Feature 2 Epic Name", "Feature 3 Epic Name"],
   "epic_categories": {{
     "Feature 1 Epic Name": ["feature1"],
     "Feature 2 Epic Name": ["feature2"],
     "Feature 3 Epic Name": ["feature3"]
   }},
+  "features": ["feature1", "feature2", "feature3"],
+  "tech_stack": ["tech1", "tech2"],
+  "initial_epics": ["Feature 1 Epic Name", "Feature 2 Epic Name", "Feature 3 Epic Name"],
   "user_types": ["usertype1", "usertype2", "usertype3"],
   "special_requirements": ["requirement1"]
 }}
 
 IMPORTANT: Each epic in initial_epics must have exactly ONE corresponding feature in epic_categories.
-"""
-
-GENERATE_CUSTOM_EPIC_PROMPT = """You are an expert software project estimator with 15+ years of experience. Analyze the project requirements and generate custom epics with complete HIGH-LEVEL task breakdowns and conservative effort estimates.
 
-# INPUTS PROVIDED:
+---
 
-## 1. Project Requirements:
-- **Domain**: {domain}
-- **Project Type**: {project_type}
-- **Target Platforms**: {platforms}
-- **User Types**: {user_types}
-- **Key Features**: {features}
+Project Requirement:
+{requirement}
+"""
 
-## 2. Mandatory Epics (already included with fixed hours - learn patterns from these):
-{mandatory_epics_summary}
+GENERATE_CUSTOM_EPIC_PROMPT = """You are an expert software project estimator with 15+ years of experience. Analyze the project requirements (see PROJECT CONTEXT at the end of this request) and generate custom epics with complete HIGH-LEVEL task breakdowns and conservative effort estimates.
 
-## 3. Retrieved Similar Epics (learn patterns from these):
-{retrieved_epics_summary}
+# INPUTS PROVIDED:
 
-## 4. Already Covered Epic Names (DO NOT duplicate):
-{existing_epic_names}
+The PROJECT CONTEXT section at the end of this request lists:
+1. Project Requirements (domain, target platforms, user types, key features)
+2. Mandatory Epics (already included with fixed hours - learn patterns from these)
+3. Retrieved Similar Epics (learn patterns from these)
+4. Already Covered Epic Names (DO NOT duplicate)
 
 ---
 
@@ -276,69 +300,19 @@ The mandatory and retrieved epics are REFERENCE EXAMPLES to learn from:
 - **Effort ranges**: How many hours do similar tasks usually take?
 - **Task breakdown patterns**: How are features split into deliverable tasks?
 
- **DO NOT COPY:**
-- **Platforms**: Examples may show Flutter, Web App, API, CMS
-- You MUST use ONLY your target platforms: {platforms}
-- Adapt the effort estimates to your target platforms
+ **PLATFORMS:** The examples are already adapted to your Target Platforms (PROJECT CONTEXT). Use ONLY those platforms.
 
 **LEARNING PROCESS:**
 
 1. **Study Epic Patterns**: "Authentication epic has 6-8 tasks (signup, login, OTP, password reset)"
 2. **Study Task Descriptions**: "Email/Mobile signup with validation" (not just "Signup")
 3. **Study Effort Ranges**: "Login tasks typically take 4-8h per platform"
-4. **Adapt to Your Platforms**: Saw Web App:8h in example? Your target is Flutter? Use Flutter:8h instead
 
 ## CRITICAL RULES:
 
-### 1. Platform Adaptation  MOST IMPORTANT
-
-**YOUR TARGET PLATFORMS: {platforms}**
-
-**You must TRANSLATE examples to your target platforms:**
-
- **Translation Examples:**
-
-**Example 1 - Mobile App Project:**
-```
-REFERENCE EXAMPLE (has Web App):
-Task: "User profile management"
-Efforts: {{"Flutter": 12, "Web App": 12, "API": 16}}
-
-YOUR TARGET: ["Flutter", "API", "CMS"]
-YOUR OUTPUT (Web App removed, adapted to target):
-Task: "User profile management"  
-Efforts: {{"Flutter": 12, "API": 16}}  ← Web App excluded!
-```
-
-**Example 2 - Web App Project:**
-```
-REFERENCE EXAMPLE (has Flutter):
-Task: "Dashboard with real-time updates"
-Efforts: {{"Flutter": 24, "API": 20}}
-
-YOUR TARGET: ["Web App", "API", "CMS"]
-YOUR OUTPUT (Flutter → Web App translation):
-Task: "Dashboard with real-time updates"
-Efforts: {{"Web App": 24, "API": 20}}  ← Used Web App instead of Flutter!
-```
-
-**Example 3 - Filtering Multiple Platforms:**
-```
-REFERENCE EXAMPLE (has all 4 platforms):
-Task: "Notification system"
-Efforts: {{"Flutter": 8, "Web App": 8, "API": 12, "CMS": 8}}
-
-YOUR TARGET: ["Flutter", "API"]
-YOUR OUTPUT (only target platforms):
-Task: "Notification system"
-Efforts: {{"Flutter": 8, "API": 12}}  ← Only Flutter + API included!
-```
+### 1. Platforms
 
-**RULES:**
-- If example has your target platform → Use that effort value 
-- If example lacks your target platform → Adapt from similar platform (Flutter ↔ Web App) ✅
-- If example has extra platforms → Remove them
-- Never include platforms outside: {platforms} 
+Output efforts ONLY for your Target Platforms - never include any other platform.
 
 ### 2. Task Breakdown (HIGH-LEVEL, NOT GRANULAR)
 
@@ -494,8 +468,7 @@ Backend (API) tasks almost always need MORE hours than frontend:
 - ✗ "Complex dashboard with analytics" = 12h → Should be 30-40h
 
 ### 4. Avoid Duplicates
-Do NOT generate epics similar to already covered:
-{existing_epic_names}
+Do NOT generate epics similar to the Already Covered Epic Names listed in PROJECT CONTEXT.
 
 **Semantic duplicates to avoid:**
 - "Payment Gateway" ≈ "Payment Processing" ≈ "Payment Integration"
@@ -628,7 +601,7 @@ When you see these features in ANY domain, create MULTIPLE epics, not just one:
 
 **CRITICAL: Include user type in epic name when epics are specific to certain users:**
 
-**User Types Available: {user_types}**
+**User Types Available: see User Types in PROJECT CONTEXT**
 
 **Naming Rules (Universal across all domains):**
 
@@ -699,48 +672,33 @@ Each epic should have 3-8 HIGH-LEVEL tasks (not granular sub-tasks).
 - User-specific: "Save Inspirations - Bride/Groom", "Portfolio Uploads - Photographer/Videographer", "Profile Creation - Venue"
 
 ```json
-{{
+{
   "custom_epics": [
-    {{
+    {
       "name": "Epic Name - UserType",
       "description": "Brief description",
       "tasks": [
-        {{
+        {
           "description": "High-level task combining related work (e.g., 'Build login screen with validation and session management')",
-          "efforts": {{
+          "efforts": {
             "Platform1": 12,
             "Platform2": 16
-          }}
-        }},
-        {{
+          }
+        },
+        {
           "description": "Another complete deliverable task",
-          "efforts": {{
+          "efforts": {
             "Platform1": 8,
             "Platform2": 12
-          }}
-        }}
+          }
+        }
       ]
-    }}
+    }
   ]
-}}
+}
 ```
 
-** FINAL REMINDER - PLATFORM ENFORCEMENT:**
-
-YOUR TARGET PLATFORMS: **{platforms}**
-
-Before returning JSON, verify EVERY task:
--  Does it ONLY have platforms from {platforms}?
--  Does it have "Web App" when target is ["Flutter", "API", "CMS"]? → REMOVE IT!
--  Does it have "Flutter" when target is ["Web App", "API"]? → REPLACE with "Web App"!
-
-**Common mistakes to avoid:**
-- Including "Web App" in mobile-only projects
-- Including "Flutter" in web-only projects  
-- Copying platform keys directly from examples
-- Missing target platforms that should be included
-
-**Your output MUST be filtered to target platforms!**
+** FINAL REMINDER:** Every task must use ONLY your Target Platforms (listed in PROJECT CONTEXT).
 
 ## Validation Checklist:
 - [ ] 5-10 HIGH-LEVEL tasks per epic (not 15+ granular sub-tasks)
@@ -748,8 +706,7 @@ Before returning JSON, verify EVERY task:
 - [ ] Each task is a complete deliverable component
 - [ ] No duplicate/similar epic names
 - [ ] All epics match project domain and features
-- [ ] **CRITICAL: Only platforms from {platforms} included** ← VERIFY THIS!
-- [ ] **CRITICAL: No platforms outside {platforms}** ← DOUBLE CHECK!
+- [ ] **CRITICAL: Only platforms from your Target Platforms included** ← VERIFY THIS!
 - [ ] **CRITICAL: Backend (API) hours are 1.5-2x frontend** ← VERIFY THIS!
 - [ ] Effort estimates LEARNED from retrieved epics (don't go lower without reason)
 - [ ] Hours are CONSERVATIVE (6-40h range per task, minimum 6h)
@@ -779,3 +736,267 @@ Generate **20-30 custom epics** to ensure comprehensive coverage. Focus on domai
 
 Return ONLY valid JSON, no additional text."""
 
+
+# Static instruction blocks for the custom epic calls (modify retrieved + generate new).
+# These form a stable prompt prefix (eligible for provider-side prefix caching);
+# all per-project values go into PROJECT_CONTEXT_TEMPLATE, which is appended last.
+MODIFY_RETRIEVED_EPICS_SYSTEM_MESSAGE = """You are an expert software estimator. The project domain, target platforms, user types and features are given in the PROJECT CONTEXT section, and the retrieved epics to adapt (with [E#]/[T#] identifiers) are listed at the end of the request.
+
+Your task: adapt the retrieved similar epics (NOT mandatory ones) to the project by returning ONLY A PATCH:
+- **Refer to epics and tasks by identifier only** - never repeat epic names or task descriptions
+- **ONLY report hours that change** and platforms to remove
+- **ONLY ADD new tasks if project needs additional features**
+- **Omit epics that need no changes**
+- **ONLY use platforms from your Target Platforms**
+
+Return valid JSON only."""
+
+GENERATE_CUSTOM_EPIC_SYSTEM_MESSAGE = """You are an expert software estimator. The project domain, target platforms, user types and features are given in the PROJECT CONTEXT section at the end of the request.
+
+Your task: GENERATE new custom epics for features not covered by the mandatory and retrieved epics.
+
+ PLATFORMS: The example epics are already adapted to your Target Platforms. Learn task patterns and effort ranges from them, and **ONLY include platforms from your Target Platforms**.
+
+ CRITICAL INSTRUCTION - EPIC NAMING WITH USER TYPES:
+
+USER TYPES IN PROJECT: the User Types listed in PROJECT CONTEXT
+
+**Epic Naming Rules:**
+1. **Generic epics** (used by all users) → Use plain name
+   Examples: "Authentication", "Database Design", "Notification", "Payment Integration"
+
+2. **User-specific epics** (specific to one user type) → Add "- UserType" suffix
+   Examples: "Profile Management - Customer", "Dashboard - Admin", "Order Management - Seller"
+
+3. **Multiple user types** → Use "/" separator
+   Examples: "Messaging - Buyer/Seller", "Reviews - Customer/Vendor"
+
+**Decision Logic:**
+- If ALL user types use the feature → Generic name (e.g., "Authentication")
+- If SPECIFIC user types use the feature → Add user type (e.g., "Dashboard - Admin")
+- If feature differs per user type → Create separate epic per type
+
+**WHY:** Shows feature ownership, groups by user journey, improves retrieval accuracy.
+
+ COVERAGE REQUIREMENT:
+Generate **15-25 custom epics** to ensure comprehensive coverage of all features.
+
+Analyze the Key Features list in PROJECT CONTEXT carefully.
+
+**CRITICAL: Map every major feature to epics:**
+- Break down complex feature areas into multiple focused epics
+- Each payment method → Separate epic (if multiple payment methods exist)
+- Each AI/ML capability → Separate epic (Prediction, Recommendation, Detection, Analysis)
+- Each integration → Separate epic (Google Classroom, Canvas, Turnitin, etc.)
+- Each major user flow → Separate epic (Onboarding, Profile, Dashboard, Settings)
+- Platform-specific features → Separate epics (Offline Sync, Localization, Location Services)
+- Admin features → Multiple epics (Dashboard, User Mgmt, Billing, Analytics, Compliance)
+- Content management → Separate epics (CMS Pages, Email Templates, File Uploads)
+
+**Epic Count Guidelines:**
+- 10-20 features in requirements → Generate 15-20 epics
+- 20-40 features in requirements → Generate 20-30 epics
+- 40+ features in requirements → Generate 30-40 epics
+
+Key responsibilities:
+- Generate **15-25 domain-specific epics** for the project domain
+- **Use "Epic Name - UserType" format when epic is user-specific**
+- Ensure ALL features from requirements are covered (study features list exhaustively)
+- Base effort estimates on similar tasks
+- Avoid duplicating the Already Covered Epic Names
+- Each epic should have 3-8 high-level tasks (not granular sub-tasks)
+
+Return valid JSON only."""
+
+MODIFY_RETRIEVED_EPICS_PROMPT = """# TASK: ADAPT RETRIEVED EPICS (Similar Epics Only) - RETURN A PATCH
+
+The RETRIEVED EPICS TO ADAPT at the end of this request were retrieved from knowledge base based on similarity. Every epic has an identifier like [E1] and every task an identifier like [T1] (task identifiers are local to their epic).
+
+The Mandatory Epics listed in PROJECT CONTEXT are already included unchanged. Learn from their structure but don't modify them.
+
+**YOUR TASK:**
+1. Review each retrieved epic and its tasks against the project requirements
+2. Adjust effort hours ONLY where the project domain or requirements justify it
+3. Remove a platform from an epic only if the project doesn't need that work (epics are already adapted to your Target Platforms)
+4. ADD new tasks ONLY if project requirements specifically need features not covered by existing tasks
+5. Leave everything else untouched - existing tasks, names and descriptions are kept automatically
+
+**CRITICAL RULES:**
+- ✓ Refer to epics/tasks by identifier ("E1", "T3") - DO NOT repeat names or task descriptions
+- ✓ Report only CHANGED hours - unchanged tasks must not appear in the patch
+- ✓ Omit epics that need no changes entirely
+- ✓ Hours and new tasks must only use your Target Platforms
+- ✗ You cannot rename epics, reword tasks or remove tasks - don't try"""
+
+MODIFY_EPICS_OUTPUT_FORMAT = """# OUTPUT FORMAT:
+
+Return a JSON patch (only epics that change):
+
+```json
+{
+  "epic_patches": [
+    {
+      "epic_id": "E1",
+      "hours": {
+        "T2": {"API": 16},               // changed hours only (task id -> platform -> hours)
+        "T5": {"Flutter": 12, "API": 20}
+      },
+      "remove_platforms": ["CMS"],       // platforms to drop from every task of this epic
+      "add_tasks": [                     // ONLY if the project needs a feature not covered
+        {
+          "description": "New task description",
+          "efforts": {"Platform1": 10, "Platform2": 14}
+        }
+      ]
+    }
+  ]
+}
+```
+
+All fields except "epic_id" are optional. Return {"epic_patches": []} if no retrieved epic needs changes."""
+
+# Relative shares of the prompt token budget left after instructions and reserved output
+PROMPT_SECTION_SHARES: Dict[str, float] = {
+    "mandatory_epics": 0.15,
+    "retrieved_epics": 0.6,
+    "features": 0.25,
+}
+
+# Per-project data - always appended AFTER the static instructions above
+PROJECT_CONTEXT_TEMPLATE = """# PROJECT CONTEXT
+
+## Project Requirements:
+- **Domain**: {domain}
+- **Target Platforms**: {platforms}
+- **User Types**: {user_types}
+- **Key Features**: {features}
+
+Epic summaries list "- task: hours per platform" with platform codes F=Flutter, W=Web App, A=API, C=CMS.
+
+## Mandatory Epics (For Reference - DO NOT MODIFY):
+{mandatory_epics_summary}
+
+{retrieved_epics_section}## Already Covered Epic Names (DO NOT duplicate):
+{existing_epic_names}
+
+REMINDER: Output ONLY these Target Platforms: {platforms}"""
+
+# Retrieved epic summaries in the generate call's PROJECT CONTEXT (the modify call
+# gets the retrieved epics only once, as its [E#]/[T#] listing)
+RETRIEVED_EPICS_SECTION_TEMPLATE = """## Retrieved Similar Epics ({retrieved_count} epics):
+{retrieved_epics_summary}
+
+"""
+
+# Appended after PROJECT CONTEXT when custom epic generation is fanned out per category shard
+GENERATE_SHARD_TEMPLATE = """# YOUR SHARD ({shard_index} of {shard_count})
+
+Custom epic generation is split across parallel requests by epic category.
+Generate custom epics ONLY for the categories below (about 1-2 epics per category);
+this overrides the overall epic count guidance above.
+
+{shard_categories}
+
+Handled by other requests (DO NOT generate epics for these): {other_categories}"""
+
+# Appended after PROJECT CONTEXT when the pipeline profile sets a custom epic target
+CUSTOM_EPIC_TARGET_TEMPLATE = """# EPIC COUNT FOR THIS ESTIMATION
+
+Generate {min_epics}-{max_epics} custom epics, covering the most important uncovered features first;
+this overrides the overall epic count guidance above."""
+
+# Appended after PROJECT CONTEXT for incremental re-estimation (only changed categories are regenerated)
+INCREMENTAL_CATEGORIES_TEMPLATE = """# CHANGED REQUIREMENTS ONLY
+
+This is a re-estimation after the requirements were edited. The epics listed under
+"Already Covered Epic Names" are kept from the previous estimation. Generate custom epics
+ONLY for the added or changed categories below (about 1-2 epics per category);
+this overrides the overall epic count guidance above.
+
+{categories}"""
+
+# Appended after PROJECT CONTEXT when a trained hour model predicts the hours of new custom epics
+TASK_STRUCTURE_ONLY_TEMPLATE = """# HOURS ARE PREDICTED SEPARATELY
+
+Hours for new custom epics are predicted by a model trained on past estimates. For every task,
+output "platforms" (the Target Platforms the task needs) INSTEAD OF "efforts", e.g.
+{"description": "Build login screen with validation", "platforms": ["Flutter", "API"]}
+This overrides the effort guidance and output format above; everything else still applies."""
+
+# Pipeline profiles selected by ProjectRequirement.mode (see services/pipeline_profiles.py).
+# None means "use the server setting". node_roles maps each workflow role to the
+# ModelRouter role it is sent to, e.g. fast routes every call to the analysis model.
+# analysis is "llm" or "lexical" (no LLM call); without generation, epics not covered
+# by the KB are estimated from historical hour statistics (estimate_from_history_node).
+PIPELINE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "instant": {
+        "description": "Ballpark quote without any LLM call: lexical analysis, KB epics and historical hours",
+        "analysis": "lexical",
+        "generation": False,
+        "node_roles": {"analysis": "analysis", "modify": "analysis", "generate": "analysis", "repair": "analysis"},
+        "retrieval_results_per_category": 1,
+        "retrieval_threshold": 0.6,
+        "max_retrieval_categories": 30,
+        "custom_epic_target": None,
+        "generate_max_tokens": None,
+        "generation_fanout": False,
+        "modify_retrieved": False,
+        "max_repair_retries": 0,
+    },
+    "quick": {
+        "description": "Ballpark quote from one analysis call: KB epics per category and historical hours",
+        "analysis": "llm",
+        "generation": False,
+        "node_roles": {"analysis": "analysis", "modify": "analysis", "generate": "analysis", "repair": "analysis"},
+        "retrieval_results_per_category": 1,
+        "retrieval_threshold": 0.6,
+        "max_retrieval_categories": None,
+        "custom_epic_target": None,
+        "generate_max_tokens": None,
+        "generation_fanout": False,
+        "modify_retrieved": False,
+        "max_repair_retries": 0,
+    },
+    "fast": {
+        "description": "Rough estimate in seconds: fast model everywhere, no modify pass, no repair retry",
+        "analysis": "llm",
+        "generation": True,
+        "node_roles": {"analysis": "analysis", "modify": "analysis", "generate": "analysis", "repair": "analysis"},
+        "retrieval_results_per_category": 1,
+        "retrieval_threshold": 0.75,
+        "max_retrieval_categories": 12,
+        "custom_epic_target": (5, 10),
+        "generate_max_tokens": 3000,
+        "generation_fanout": False,
+        "modify_retrieved": False,
+        "max_repair_retries": 0,
+    },
+    "standard": {
+        "description": "Default pipeline: routed models, modify pass, up to 2 repair retries",
+        "analysis": "llm",
+        "generation": True,
+        "node_roles": {"analysis": "analysis", "modify": "modify", "generate": "generate", "repair": "repair"},
+        "retrieval_results_per_category": 1,
+        "retrieval_threshold": 0.7,
+        "max_retrieval_categories": None,
+        "custom_epic_target": None,
+        "generate_max_tokens": None,
+        "generation_fanout": True,
+        "modify_retrieved": True,
+        "max_repair_retries": 2,
+    },
+    "thorough": {
+        "description": "Detailed estimate: strongest model for analysis, deeper retrieval, more custom epics",
+        "analysis": "llm",
+        "generation": True,
+        "node_roles": {"analysis": "generate", "modify": "modify", "generate": "generate", "repair": "repair"},
+        "retrieval_results_per_category": 2,
+        "retrieval_threshold": 0.6,
+        "max_retrieval_categories": None,
+        "custom_epic_target": (20, 35),
+        "generate_max_tokens": 12000,
+        "generation_fanout": True,
+        "modify_retrieved": True,
+        "max_repair_retries": 2,
+    },
+}
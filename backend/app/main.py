@@ -1,5 +1,6 @@
 """FastAPI application for EB Estimation Agent."""
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -44,6 +45,15 @@ async def lifespan(app: FastAPI):
             "Run: python -m backend.app.services.mysql_knowledge_base init"
         )
 
+    # Load (or build, if no ingestion saved them yet) the hour statistics before serving requests
+    try:
+        from .services.hour_statistics import prepare_hour_statistics
+        statistics = await asyncio.to_thread(prepare_hour_statistics)
+        logger.info(f"✓ Hour statistics for KB {statistics.kb_version}")
+    except Exception as e:
+        logger.error(f"Hour statistics unavailable: {e}")
+        logger.warning("Run: python -m backend.app.services.hour_statistics build")
+
     yield
 
     logger.info("Shutting down application...")
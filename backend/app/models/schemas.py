@@ -15,12 +15,33 @@ class Platform(str, Enum):
     CMS = "CMS"
 
 
+class EstimationMode(str, Enum):
+    """Quality tier selecting a pipeline profile (see PIPELINE_PROFILES)."""
+    
+    INSTANT = "instant"
+    QUICK = "quick"
+    FAST = "fast"
+    STANDARD = "standard"
+    THOROUGH = "thorough"
+
+
+class JobClass(str, Enum):
+    """Scheduling class of an estimation request (see services/admission.py)."""
+    
+    INTERACTIVE = "interactive"
+    BULK = "bulk"
+
+
 class ProjectRequirement(BaseModel):
     """Input project requirement from user."""
     
     project_name: str = Field(..., description="Name of the project")
     description: str = Field(..., description="Detailed project requirements")
     additional_context: Optional[str] = Field(None, description="Any additional context")
+    deadline_seconds: Optional[float] = Field(None, gt=0, description="Time budget for the estimation in seconds (defaults to the server setting)")
+    mode: EstimationMode = Field(EstimationMode.STANDARD, description="Quality tier: instant / quick (no generation, ballpark), fast, standard, or thorough")
+    use_cached_estimate: bool = Field(False, description="Return the stored estimate of a near-duplicate brief instead of regenerating its epics")
+    job_class: JobClass = Field(JobClass.INTERACTIVE, description="interactive (a user waiting) or bulk (batch re-estimations, scheduled behind interactive work with a guaranteed minimum share)")
     
     class Config:
         json_schema_extra = {
@@ -98,6 +119,8 @@ class Epic(BaseModel):
     is_mandatory: bool = Field(False, description="Whether epic is mandatory")
     source_template: Optional[str] = Field(None, description="Source template name")
     user_types: Optional[List[str]] = Field(default=None, description="User types this epic is designed for (extracted from epic name or requirements)")
+    kb_epic_id: Optional[int] = Field(default=None, exclude=True, description="Knowledge base epic id (retrieved epics only, with source_template)")
+    similarity: Optional[float] = Field(default=None, exclude=True, description="Similarity to the retrieval query (retrieved epics only)")
     
     @property
     def total_hours(self) -> int:
@@ -143,6 +166,13 @@ class ProjectEstimation(BaseModel):
     target_platforms: List[Platform]
     epics: List[Epic]
     generated_at: datetime = Field(default_factory=datetime.now)
+    degradations: List[str] = Field(default_factory=list, description="Deadline degradation steps applied (see services/deadline.py)")
+    mode: EstimationMode = Field(EstimationMode.STANDARD, description="Quality tier the estimation was produced with")
+    hour_adjustments: List[Dict[str, Any]] = Field(default_factory=list, description="Generated task hours corrected to the median of their nearest historical tasks")
+    confidence_intervals: Optional[Dict[str, Any]] = Field(None, description="Bootstrap p50/p80/p95 hours for the total, per platform and per epic (see services/uncertainty.py)")
+    cache_hit: Optional[Dict[str, Any]] = Field(None, description="Near-duplicate brief whose stored run was reused (see services/requirement_cache.py)")
+    estimation_id: Optional[str] = Field(None, description="Id of the stored run, for incremental re-estimation after the requirements are edited")
+    requirement_diff: Optional[Dict[str, Any]] = Field(None, description="Incremental re-estimation (or near-duplicate cache hit): epic categories re-estimated, carried over and removed")
     
     @property
     def total_hours(self) -> int:
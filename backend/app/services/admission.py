@@ -0,0 +1,354 @@
+"""Admission control for estimation jobs: bounded concurrency, weighted fair job classes and backpressure."""
+
+import asyncio
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+from ..core.config import settings
+from ..models.schemas import EstimationMode, JobClass
+
+logger = logging.getLogger(__name__)
+
+# Queue priority per mode within a job class (lower starts first): cheap
+# ballpark modes return in seconds and should not wait behind full generations
+MODE_PRIORITY = {
+    EstimationMode.INSTANT: 0,
+    EstimationMode.QUICK: 0,
+    EstimationMode.FAST: 1,
+    EstimationMode.STANDARD: 2,
+    EstimationMode.THOROUGH: 3,
+}
+
+# Scheduling order of classes with equal virtual time
+JOB_CLASSES = (JobClass.INTERACTIVE, JobClass.BULK)
+
+
+def class_weight(job_class: JobClass) -> int:
+    """Weighted fair share of a job class (settings.admission_*_weight)."""
+    if job_class == JobClass.BULK:
+        return settings.admission_bulk_weight
+    return settings.admission_interactive_weight
+
+
+def class_queue_timeout(job_class: JobClass) -> float:
+    """Longest a job of the class waits in the queue before it is rejected."""
+    if job_class == JobClass.BULK:
+        return settings.admission_bulk_queue_timeout_seconds
+    return settings.admission_queue_timeout_seconds
+
+
+def _wait_percentiles(waits: Deque[float]) -> Dict[str, float]:
+    """Mean, p50 and p95 of recent queue waits in seconds (zeros without any)."""
+    if not waits:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0}
+    ordered = sorted(waits)
+    return {
+        "mean": round(sum(ordered) / len(ordered), 2),
+        "p50": round(ordered[int(0.5 * (len(ordered) - 1))], 2),
+        "p95": round(ordered[int(0.95 * (len(ordered) - 1))], 2),
+    }
+
+
+class AdmissionRejected(Exception):
+    """The queue is full (or the wait timed out); the client should retry after retry_after seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    """One estimation job's passage through admission."""
+
+    client_id: str
+    job_class: JobClass
+    priority: int
+    seq: int
+    enqueued_at: float
+    future: asyncio.Future
+    queue_position: int = 0  # Position on arrival (0: started right away)
+    started_at: Optional[float] = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Admission details reported with the response."""
+        return {
+            "job_class": self.job_class.value,
+            "queue_position": self.queue_position,
+            "waited_seconds": round((self.started_at or time.monotonic()) - self.enqueued_at, 2),
+        }
+
+
+class AdmissionController:
+    """
+    Gate in front of the estimation workflow.
+
+    At most settings.admission_max_concurrent jobs run at once, and at most
+    settings.admission_max_per_client of them for one client. Other jobs wait
+    in a queue of settings.admission_queue_size, one list per job class.
+
+    Free slots go to the classes by stride scheduling: each class has a
+    virtual time advancing by 1 / weight per started job, and the queued
+    class with the lowest virtual time starts next. While both classes are
+    queued, interactive jobs therefore go ahead of queued bulk work, and
+    bulk still gets its weighted share of starts as a guaranteed minimum. A
+    class that was idle resumes at the current virtual time, so it cannot
+    bank credit. Bulk jobs never take the last
+    settings.admission_interactive_reserved_slots slots, so an interactive
+    job does not wait for a bulk run to finish on an instance busy with bulk.
+
+    Within a class, jobs are ordered by priority (see MODE_PRIORITY) and then
+    arrival; a waiting job gains one priority level every
+    settings.admission_priority_aging_seconds so expensive modes are not
+    starved. When the queue overflows, the job that would start last is
+    rejected, as is a job waiting longer than its class's queue timeout,
+    with a Retry-After derived from recent throughput. Used from the event
+    loop only, so no locking is needed.
+    """
+
+    def __init__(self):
+        """Initialize with no running or queued jobs."""
+        self._queues: Dict[JobClass, List[Ticket]] = {job_class: [] for job_class in JOB_CLASSES}
+        self._running: Dict[str, int] = {}
+        self._running_by_class: Dict[JobClass, int] = {job_class: 0 for job_class in JOB_CLASSES}
+        self._running_total = 0
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._pass: Dict[JobClass, float] = {job_class: 0.0 for job_class in JOB_CLASSES}
+        self._started: Dict[JobClass, int] = {job_class: 0 for job_class in JOB_CLASSES}
+        self._waits: Dict[JobClass, Deque[float]] = {job_class: deque(maxlen=1000) for job_class in JOB_CLASSES}
+        self._completions: Deque[float] = deque(maxlen=1000)
+        self._durations: Deque[float] = deque(maxlen=100)
+        self._created_at = time.monotonic()
+
+    @asynccontextmanager
+    async def admit(
+        self,
+        client_id: str,
+        priority: int,
+        job_class: JobClass = JobClass.INTERACTIVE
+    ) -> AsyncIterator[Ticket]:
+        """
+        Wait for a slot, then hold it for the duration of the block.
+
+        Args:
+            client_id: Client the job belongs to (per-client limit)
+            priority: Queue priority within the class (lower starts first)
+            job_class: Scheduling class
+
+        Yields:
+            The job's ticket (see Ticket.summary)
+
+        Raises:
+            AdmissionRejected if the queue is full or the wait timed out
+        """
+        ticket = await self._acquire(client_id, priority, job_class)
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    async def _acquire(self, client_id: str, priority: int, job_class: JobClass) -> Ticket:
+        """Queue a job and wait until _dispatch starts it."""
+        now = time.monotonic()
+        ticket = Ticket(client_id, job_class, priority, next(self._seq), now, asyncio.get_running_loop().create_future())
+        if not self._queues[job_class]:
+            self._pass[job_class] = max(self._pass[job_class], self._virtual_time)
+        self._queues[job_class].append(ticket)
+        self._dispatch()
+        if ticket.future.done():
+            return ticket
+
+        if self._queued() > settings.admission_queue_size:
+            # Bounded queue: the job that would start last is shed
+            shed = self._schedule_order(time.monotonic())[-1]
+            self._queues[shed.job_class].remove(shed)
+            rejection = AdmissionRejected(
+                f"Estimation queue is full ({settings.admission_queue_size} waiting)", self.retry_after()
+            )
+            if shed is ticket:
+                raise rejection
+            shed.future.set_exception(rejection)
+            logger.info(f"Shed the queued {shed.job_class.value} estimation of client {shed.client_id} for a higher priority job")
+
+        ticket.queue_position = self.queue_position(ticket)
+        logger.info(f"{job_class.value.title()} estimation for client {client_id} queued at position {ticket.queue_position}")
+        timeout = class_queue_timeout(job_class)
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket in self._queues[job_class]:
+                self._queues[job_class].remove(ticket)
+            elif ticket.started_at is not None:
+                # Started just as the wait ended: hand the slot to the next job
+                self._release(ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected(
+                    f"Estimation waited {timeout:.0f}s in the queue without starting", self.retry_after()
+                )
+            raise
+        return ticket
+
+    def _release(self, ticket: Ticket) -> None:
+        """Free a finished job's slot, record its completion and start the next jobs."""
+        now = time.monotonic()
+        self._running_total -= 1
+        self._running_by_class[ticket.job_class] -= 1
+        self._running[ticket.client_id] -= 1
+        if not self._running[ticket.client_id]:
+            del self._running[ticket.client_id]
+        self._completions.append(now)
+        self._durations.append(now - ticket.started_at)
+        self._dispatch()
+
+    def _queued(self) -> int:
+        """Jobs waiting in all classes."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _order_key(self, ticket: Ticket, now: float):
+        """Order within a class: aged priority, then arrival."""
+        aging = (now - ticket.enqueued_at) / settings.admission_priority_aging_seconds
+        return (ticket.priority - aging, ticket.seq)
+
+    def _ordered(self, job_class: JobClass, now: float) -> List[Ticket]:
+        """Queued jobs of a class, next first."""
+        return sorted(self._queues[job_class], key=lambda t: self._order_key(t, now))
+
+    def _can_start(self, ticket: Ticket) -> bool:
+        """Whether the per-client limit and the interactive reserve allow a job to start."""
+        if self._running.get(ticket.client_id, 0) >= settings.admission_max_per_client:
+            return False
+        if ticket.job_class == JobClass.BULK:
+            bulk_slots = max(settings.admission_max_concurrent - settings.admission_interactive_reserved_slots, 1)
+            return self._running_by_class[JobClass.BULK] < bulk_slots
+        return True
+
+    def _dispatch(self) -> None:
+        """Start queued jobs while there is capacity: the class with the lowest virtual time first."""
+        now = time.monotonic()
+        while self._running_total < settings.admission_max_concurrent:
+            candidates = {}
+            for job_class in JOB_CLASSES:
+                ticket = next((t for t in self._ordered(job_class, now) if self._can_start(t)), None)
+                if ticket:
+                    candidates[job_class] = ticket
+            if not candidates:
+                break
+            job_class = min(candidates, key=lambda c: self._pass[c])
+            ticket = candidates[job_class]
+
+            self._queues[job_class].remove(ticket)
+            self._virtual_time = self._pass[job_class]
+            self._pass[job_class] += 1 / class_weight(job_class)
+            self._running_total += 1
+            self._running_by_class[job_class] += 1
+            self._running[ticket.client_id] = self._running.get(ticket.client_id, 0) + 1
+            self._started[job_class] += 1
+            self._waits[job_class].append(now - ticket.enqueued_at)
+            ticket.started_at = now
+            ticket.future.set_result(None)
+
+    def _schedule_order(self, now: float) -> List[Ticket]:
+        """Queued jobs in the order they would start, ignoring per-client limits and the reserve."""
+        queues = {job_class: self._ordered(job_class, now) for job_class in JOB_CLASSES}
+        passes = dict(self._pass)
+        order: List[Ticket] = []
+        while any(queues.values()):
+            job_class = min((c for c in JOB_CLASSES if queues[c]), key=lambda c: passes[c])
+            order.append(queues[job_class].pop(0))
+            passes[job_class] += 1 / class_weight(job_class)
+        return order
+
+    def queue_position(self, ticket: Ticket) -> int:
+        """1-based position of a queued job (0 if not queued)."""
+        order = self._schedule_order(time.monotonic())
+        return order.index(ticket) + 1 if ticket in order else 0
+
+    def throughput(self) -> float:
+        """Jobs completed per second over the last settings.admission_throughput_window_seconds (0.0 if none)."""
+        now = time.monotonic()
+        window = min(settings.admission_throughput_window_seconds, now - self._created_at)
+        recent = sum(1 for t in self._completions if t >= now - window)
+        return recent / max(window, 1.0)
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the current queue has likely drained.
+
+        Based on the recent completion rate; without recent completions, on
+        the mean job duration (or the estimation deadline) per slot.
+        """
+        backlog = self._queued() + 1
+        rate = self.throughput()
+        if rate > 0:
+            seconds = backlog / rate
+        else:
+            duration = sum(self._durations) / len(self._durations) if self._durations else settings.estimation_deadline_seconds
+            seconds = backlog * duration / settings.admission_max_concurrent
+        return max(1, min(int(math.ceil(seconds)), settings.admission_max_retry_after_seconds))
+
+    def status(self, client_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Current load and per-class wait metrics.
+
+        Args:
+            client_id: Also report this client's running jobs and queue positions
+
+        Returns:
+            Dict with running, max_concurrent, queued, queue_size,
+            throughput_per_minute, retry_after and classes (per job class:
+            weight, running, queued, started, oldest_queued_seconds and
+            wait_seconds mean/p50/p95 over its recent starts), plus client
+            when given
+        """
+        now = time.monotonic()
+        status = {
+            "running": self._running_total,
+            "max_concurrent": settings.admission_max_concurrent,
+            "queued": self._queued(),
+            "queue_size": settings.admission_queue_size,
+            "throughput_per_minute": round(self.throughput() * 60, 2),
+            "retry_after": self.retry_after(),
+            "classes": {
+                job_class.value: {
+                    "weight": class_weight(job_class),
+                    "running": self._running_by_class[job_class],
+                    "queued": len(self._queues[job_class]),
+                    "started": self._started[job_class],
+                    "oldest_queued_seconds": round(
+                        max((now - t.enqueued_at for t in self._queues[job_class]), default=0.0), 2
+                    ),
+                    "wait_seconds": _wait_percentiles(self._waits[job_class]),
+                }
+                for job_class in JOB_CLASSES
+            },
+        }
+        if client_id is not None:
+            order = self._schedule_order(now)
+            status["client"] = {
+                "client_id": client_id,
+                "running": self._running.get(client_id, 0),
+                "queue_positions": [i + 1 for i, t in enumerate(order) if t.client_id == client_id],
+            }
+        return status
+
+
+# Singleton instance
+_admission_controller: Optional[AdmissionController] = None
+_admission_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Get or create the admission controller singleton."""
+    global _admission_controller
+    with _admission_controller_lock:
+        if _admission_controller is None:
+            _admission_controller = AdmissionController()
+        return _admission_controller
@@ -0,0 +1,73 @@
+"""Estimation deadlines, per-node time budgets and graceful degradation steps."""
+
+import logging
+import time
+from typing import Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Degradation steps reported in ProjectEstimation.degradations, in escalation order
+DEGRADATION_STEPS = {
+    "reduced_retrieval": "Fewer epic categories were searched in the knowledge base",
+    "fast_model": "Custom epics were generated with the fast model",
+    "skipped_repair": "The repair retry after failed validation was skipped",
+    "retrieved_only": "No custom epics were generated: estimation uses mandatory and retrieved epics only",
+}
+
+
+class Deadline:
+    """
+    Time budget for one estimation request.
+
+    Node budgets are derived from the remaining time minus what must stay
+    reserved for the nodes after it, so a slow early node shrinks the budget
+    of later ones instead of overrunning the request deadline.
+    """
+
+    def __init__(self, seconds: Optional[float] = None):
+        """
+        Start the deadline clock.
+
+        Args:
+            seconds: Total time budget (defaults to settings.estimation_deadline_seconds)
+        """
+        self.total_seconds = seconds or settings.estimation_deadline_seconds
+        self.started = time.monotonic()
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (never negative)."""
+        return max(self.total_seconds - (time.monotonic() - self.started), 0.0)
+
+    def elapsed(self) -> float:
+        """Seconds since the request started."""
+        return time.monotonic() - self.started
+
+    def node_budget(self, node: str) -> float:
+        """
+        Time budget for a node's LLM calls.
+
+        Analysis keeps deadline_min_generation_seconds in reserve so that at
+        least a mandatory + retrieved estimation can still be returned;
+        generation keeps deadline_finalize_seconds for the final nodes.
+
+        Args:
+            node: Workflow node name
+
+        Returns:
+            Seconds available to the node (at least 1)
+        """
+        reserves = {
+            "analyze_requirement": settings.deadline_min_generation_seconds,
+            "generate_custom_epics": settings.deadline_finalize_seconds,
+        }
+        return max(self.remaining() - reserves.get(node, 0.0), 1.0)
+
+    def degrade(self, step: str) -> str:
+        """Log a degradation step and return its identifier for the state."""
+        logger.warning(
+            f"Deadline degradation '{step}' ({self.remaining():.1f}s of {self.total_seconds:.0f}s left): "
+            f"{DEGRADATION_STEPS[step]}"
+        )
+        return step
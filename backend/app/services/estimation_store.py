@@ -0,0 +1,436 @@
+"""Persistent store of estimations and their edit versions (SQLite)."""
+
+import json
+import logging
+import sqlite3
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from ..core.config import settings
+from ..models.schemas import AnalyzedRequirement, ProjectEstimation
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS estimations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    project_name TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    total_hours INTEGER NOT NULL,
+    latest_version INTEGER NOT NULL,
+    cache_entry_id TEXT,
+    analyzed_requirement BLOB
+);
+CREATE TABLE IF NOT EXISTS estimation_versions (
+    estimation_id INTEGER NOT NULL REFERENCES estimations(id) ON DELETE CASCADE,
+    version INTEGER NOT NULL,
+    created_at TEXT NOT NULL,
+    is_snapshot INTEGER NOT NULL,
+    total_hours INTEGER NOT NULL,
+    note TEXT,
+    payload BLOB NOT NULL,
+    PRIMARY KEY (estimation_id, version)
+);
+"""
+
+# Not part of an estimation's content: assigned by the store on every read
+_VOLATILE_KEYS = ("estimation_id",)
+
+
+def _pack(value: Any) -> bytes:
+    """Compressed compact JSON."""
+    return zlib.compress(json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+
+def _unpack(blob: bytes) -> Any:
+    """Inverse of _pack."""
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def structural_diff(old: Any, new: Any, path: Optional[List[Any]] = None) -> List[List[Any]]:
+    """
+    Operations turning one JSON document into another.
+
+    Dicts are compared key by key and lists of equal length item by item, so
+    editing one task's hours yields a single ["set", [path...], value]
+    operation. Removed dict keys yield ["del", [path...]]. A list whose
+    length changed is replaced as a whole.
+
+    Args:
+        old: Previous document
+        new: New document
+        path: Path of the compared values (keys and list indexes)
+
+    Returns:
+        Operations, applied in order by apply_structural_diff
+    """
+    path = path or []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: List[List[Any]] = [["del", path + [key]] for key in old if key not in new]
+        for key, value in new.items():
+            if key not in old:
+                ops.append(["set", path + [key], value])
+            else:
+                ops.extend(structural_diff(old[key], value, path + [key]))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for index, (old_item, new_item) in enumerate(zip(old, new)):
+            ops.extend(structural_diff(old_item, new_item, path + [index]))
+        return ops
+    return [] if old == new else [["set", path, new]]
+
+
+def apply_structural_diff(document: Any, ops: List[List[Any]]) -> Any:
+    """
+    Apply structural_diff operations to a document.
+
+    Returns:
+        The updated document (modified in place unless the root is replaced)
+    """
+    for op in ops:
+        action, path = op[0], op[1]
+        if not path:
+            document = op[2] if action == "set" else None
+            continue
+        parent = document
+        for key in path[:-1]:
+            parent = parent[key]
+        if action == "set":
+            parent[path[-1]] = op[2]
+        else:
+            del parent[path[-1]]
+    return document
+
+
+def _estimation_document(estimation: ProjectEstimation) -> Dict[str, Any]:
+    """JSON content of an estimation as stored in versions."""
+    document = estimation.model_dump(mode="json")
+    for key in _VOLATILE_KEYS:
+        document.pop(key, None)
+    return document
+
+
+def _epic_hours(document: Dict[str, Any]) -> Dict[str, int]:
+    """Total hours per epic name of an estimation document."""
+    hours: Dict[str, int] = {}
+    for epic in document.get("epics") or []:
+        total = sum(sum(task.get("efforts", {}).values()) for task in epic.get("tasks") or [])
+        hours[epic["name"]] = hours.get(epic["name"], 0) + total
+    return hours
+
+
+def summarize_changes(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Epic-level summary of two estimation documents.
+
+    Returns:
+        Dict with total_hours (from/to), epics_added, epics_removed and
+        epics_changed (name, from_hours, to_hours)
+    """
+    old_hours, new_hours = _epic_hours(old), _epic_hours(new)
+    return {
+        "total_hours": {"from": sum(old_hours.values()), "to": sum(new_hours.values())},
+        "epics_added": [name for name in new_hours if name not in old_hours],
+        "epics_removed": [name for name in old_hours if name not in new_hours],
+        "epics_changed": [
+            {"name": name, "from_hours": old_hours[name], "to_hours": hours}
+            for name, hours in new_hours.items() if name in old_hours and old_hours[name] != hours
+        ],
+    }
+
+
+class EstimationStore:
+    """
+    SQLite store of estimations.
+
+    One row per estimation holds its metadata and compressed analyzed
+    requirement. Its content is kept as versions: version 1 is the generated
+    estimation, every saved edit adds a version holding only the structural
+    diff to the previous one. Every settings.estimation_store_snapshot_interval
+    versions a full snapshot is written instead, so reading any version
+    applies a bounded number of diffs. All payloads are zlib-compressed JSON.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the store, creating the database if needed.
+
+        Args:
+            path: SQLite database file (defaults to settings.estimation_store_path)
+        """
+        self.path = Path(path or settings.estimation_store_path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Connection for one operation (sqlite3 connections are not shared across threads)."""
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction, holding the database write lock from the start."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def save(
+        self,
+        estimation: ProjectEstimation,
+        analyzed_requirement: Optional[AnalyzedRequirement] = None,
+        cache_entry_id: Optional[str] = None
+    ) -> str:
+        """
+        Store a new estimation as version 1.
+
+        Args:
+            estimation: Generated estimation
+            analyzed_requirement: Its requirement analysis
+            cache_entry_id: Requirement cache entry of the run (for incremental re-estimation)
+
+        Returns:
+            Estimation id
+        """
+        now = datetime.now().isoformat()
+        document = _estimation_document(estimation)
+        analysis = _pack(analyzed_requirement.model_dump(mode="json")) if analyzed_requirement else None
+
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO estimations (project_name, mode, created_at, updated_at, total_hours, "
+                "latest_version, cache_entry_id, analyzed_requirement) VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+                (estimation.project_name, estimation.mode.value, now, now, estimation.total_hours, cache_entry_id, analysis)
+            )
+            estimation_id = cursor.lastrowid
+            conn.execute(
+                "INSERT INTO estimation_versions (estimation_id, version, created_at, is_snapshot, total_hours, note, payload) "
+                "VALUES (?, 1, ?, 1, ?, NULL, ?)",
+                (estimation_id, now, estimation.total_hours, _pack(document))
+            )
+
+        logger.info(f"✓ Stored estimation {estimation_id} for {estimation.project_name}")
+        return str(estimation_id)
+
+    def add_version(self, estimation_id: str, estimation: ProjectEstimation, note: Optional[str] = None) -> Optional[int]:
+        """
+        Store an edited estimation as a new version.
+
+        Args:
+            estimation_id: Stored estimation
+            estimation: Edited estimation
+            note: Optional description of the edit
+
+        Returns:
+            The new version (the latest one if nothing changed), or None if the estimation is unknown
+        """
+        row_id = self._row_id(estimation_id)
+        if row_id is None:
+            return None
+
+        document = _estimation_document(estimation)
+        with self._transaction() as conn:
+            row = conn.execute("SELECT latest_version FROM estimations WHERE id = ?", (row_id,)).fetchone()
+            if row is None:
+                return None
+            latest = row["latest_version"]
+            ops = structural_diff(self._load_document(conn, row_id, latest), document)
+            if not ops:
+                return latest
+
+            version = latest + 1
+            is_snapshot = (version - 1) % settings.estimation_store_snapshot_interval == 0
+            now = datetime.now().isoformat()
+            conn.execute(
+                "INSERT INTO estimation_versions (estimation_id, version, created_at, is_snapshot, total_hours, note, payload) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row_id, version, now, int(is_snapshot), estimation.total_hours, note, _pack(document if is_snapshot else ops))
+            )
+            conn.execute(
+                "UPDATE estimations SET latest_version = ?, updated_at = ?, total_hours = ?, project_name = ? WHERE id = ?",
+                (version, now, estimation.total_hours, estimation.project_name, row_id)
+            )
+
+        logger.info(f"✓ Stored version {version} of estimation {estimation_id} ({len(ops)} changes)")
+        return version
+
+    def list(self, limit: Optional[int] = None, before: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        List estimations, newest first.
+
+        Pages are keyset-paginated on the estimation id, so a page costs an
+        index range scan however deep it is.
+
+        Args:
+            limit: Page size (defaults to settings.estimation_store_page_size)
+            before: Cursor returned with the previous page
+
+        Returns:
+            (estimation summaries, cursor of the next page or None on the last page)
+        """
+        limit = limit or settings.estimation_store_page_size
+        cursor = self._row_id(before) if before else None
+        query = (
+            "SELECT id, project_name, mode, created_at, updated_at, total_hours, latest_version FROM estimations "
+            + ("WHERE id < ? " if cursor is not None else "")
+            + "ORDER BY id DESC LIMIT ?"
+        )
+        params = ((cursor,) if cursor is not None else ()) + (limit + 1,)
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        items = [{**dict(row), "id": str(row["id"])} for row in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return items, next_cursor
+
+    def get(self, estimation_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Load a stored estimation.
+
+        Args:
+            estimation_id: Stored estimation
+            version: Version to load (defaults to the latest)
+
+        Returns:
+            Dict with id, project_name, mode, created_at, updated_at,
+            latest_version, version, cache_entry_id, analyzed_requirement,
+            estimation and versions (version, created_at, total_hours, note),
+            or None if the estimation or version is unknown
+        """
+        row_id = self._row_id(estimation_id)
+        if row_id is None:
+            return None
+
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM estimations WHERE id = ?", (row_id,)).fetchone()
+            if row is None:
+                return None
+            version = version or row["latest_version"]
+            document = self._load_document(conn, row_id, version)
+            if document is None:
+                return None
+            versions = conn.execute(
+                "SELECT version, created_at, total_hours, note FROM estimation_versions "
+                "WHERE estimation_id = ? ORDER BY version",
+                (row_id,)
+            ).fetchall()
+
+        analysis = row["analyzed_requirement"]
+        return {
+            "id": str(row_id),
+            "project_name": row["project_name"],
+            "mode": row["mode"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "latest_version": row["latest_version"],
+            "version": version,
+            "cache_entry_id": row["cache_entry_id"],
+            "analyzed_requirement": AnalyzedRequirement(**_unpack(analysis)) if analysis else None,
+            "estimation": ProjectEstimation(**document).model_copy(update={"estimation_id": str(row_id)}),
+            "versions": [dict(v) for v in versions],
+        }
+
+    def diff(
+        self,
+        estimation_id: str,
+        from_version: Optional[int] = None,
+        to_version: Optional[int] = None,
+        to_estimation_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Compare two versions of an estimation, or two estimations.
+
+        Args:
+            estimation_id: Estimation compared from
+            from_version: Its version (defaults to the one before the latest when
+                comparing versions of one estimation, else to the latest)
+            to_version: Version compared to (defaults to the latest)
+            to_estimation_id: Estimation compared to (defaults to estimation_id)
+
+        Returns:
+            Dict with from/to (id, version), summary (see summarize_changes) and
+            changes (structural_diff operations), or None if an estimation or
+            version is unknown
+        """
+        from_id = self._row_id(estimation_id)
+        to_id = self._row_id(to_estimation_id) if to_estimation_id else from_id
+        if from_id is None or to_id is None:
+            return None
+
+        with self._connect() as conn:
+            latest = {
+                row["id"]: row["latest_version"]
+                for row in conn.execute("SELECT id, latest_version FROM estimations WHERE id IN (?, ?)", (from_id, to_id))
+            }
+            if from_id not in latest or to_id not in latest:
+                return None
+            to_version = to_version or latest[to_id]
+            if from_version is None:
+                from_version = max(to_version - 1, 1) if from_id == to_id else latest[from_id]
+            old = self._load_document(conn, from_id, from_version)
+            new = self._load_document(conn, to_id, to_version)
+        if old is None or new is None:
+            return None
+
+        return {
+            "from": {"id": str(from_id), "version": from_version},
+            "to": {"id": str(to_id), "version": to_version},
+            "summary": summarize_changes(old, new),
+            "changes": structural_diff(old, new),
+        }
+
+    def _load_document(self, conn: sqlite3.Connection, row_id: int, version: int) -> Optional[Dict[str, Any]]:
+        """Rebuild a version from its nearest snapshot and the diffs after it."""
+        rows = conn.execute(
+            "SELECT version, payload FROM estimation_versions WHERE estimation_id = ? AND version <= ? "
+            "AND version >= (SELECT MAX(version) FROM estimation_versions "
+            "WHERE estimation_id = ? AND version <= ? AND is_snapshot = 1) ORDER BY version",
+            (row_id, version, row_id, version)
+        ).fetchall()
+        if not rows or rows[-1]["version"] != version:
+            return None
+
+        document = _unpack(rows[0]["payload"])
+        for row in rows[1:]:
+            document = apply_structural_diff(document, _unpack(row["payload"]))
+        return document
+
+    @staticmethod
+    def _row_id(estimation_id: Optional[str]) -> Optional[int]:
+        """Parse an estimation id (None if malformed)."""
+        try:
+            return int(estimation_id)
+        except (TypeError, ValueError):
+            return None
+
+
+# Singleton instance
+_estimation_store: Optional[EstimationStore] = None
+_estimation_store_lock = threading.Lock()
+
+
+def get_estimation_store() -> EstimationStore:
+    """Get or create the estimation store singleton."""
+    global _estimation_store
+    with _estimation_store_lock:
+        if _estimation_store is None:
+            _estimation_store = EstimationStore()
+        return _estimation_store
@@ -0,0 +1,451 @@
+"""Local regression model predicting task hours from task and epic embeddings."""
+
+import json
+import logging
+import threading
+import warnings
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.schemas import Epic, Platform
+from .hour_statistics import (
+    EMBEDDING_BATCH_SIZE,
+    PLATFORM_ORDER,
+    HourStatistics,
+    get_hour_statistics,
+    normalize_task_name,
+)
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever hour_features or the embedded texts change; models saved with
+# another version are not served (retrain them)
+FEATURE_VERSION = 2
+
+
+def epic_feature_text(epic_name: str) -> str:
+    """Text embedded for an epic's features, the same at training and prediction time."""
+    return f"Epic: {epic_name}"
+
+
+def hour_features(task_embeddings: np.ndarray, epic_embeddings: np.ndarray) -> np.ndarray:
+    """
+    Model input: the row-normalized task embedding followed by the row-normalized epic embedding.
+
+    Args:
+        task_embeddings: (tasks, dimensions) embeddings of normalized task names
+        epic_embeddings: (tasks, dimensions) embeddings of each task's epic_feature_text (zeros if unknown)
+
+    Returns:
+        (tasks, 2 * dimensions) float32 features
+    """
+    def normalized(matrix: np.ndarray) -> np.ndarray:
+        matrix = np.asarray(matrix, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    return np.hstack([normalized(task_embeddings), normalized(epic_embeddings)])
+
+
+def fit_ridge(features: np.ndarray, targets: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    Closed-form ridge regression with an unpenalized intercept.
+
+    Solved in the primal (features x features) or dual (samples x samples)
+    form, whichever system is smaller.
+
+    Returns:
+        (features + 1,) weights, the intercept last
+    """
+    feature_mean = features.mean(axis=0)
+    target_mean = targets.mean()
+    centered = (features - feature_mean).astype(np.float64)
+    centered_targets = targets - target_mean
+
+    if len(centered) >= centered.shape[1]:
+        gram = centered.T @ centered
+        gram[np.diag_indices_from(gram)] += alpha
+        coefficients = np.linalg.solve(gram, centered.T @ centered_targets)
+    else:
+        gram = centered @ centered.T
+        gram[np.diag_indices_from(gram)] += alpha
+        coefficients = centered.T @ np.linalg.solve(gram, centered_targets)
+
+    return np.append(coefficients, target_mean - feature_mean @ coefficients).astype(np.float32)
+
+
+class HourModel:
+    """
+    Per-platform ridge regression of log hours on task and epic embeddings.
+
+    Trained from the KB task hours, using the task name embeddings kept in the
+    hour statistics and embeddings of the KB epic names, and
+    served in-process so hours for generated tasks are reproducible and cost
+    no LLM output tokens.
+    """
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        kb_version: str,
+        metrics: Optional[Dict[str, Any]] = None,
+        feature_version: int = FEATURE_VERSION
+    ):
+        """
+        Initialize from trained weights (see train / load).
+
+        Args:
+            weights: (platforms, features + 1) weights in PLATFORM_ORDER, NaN rows for
+                platforms without training data
+            kb_version: KB version the model was trained on
+            metrics: Holdout evaluation of the training run
+            feature_version: FEATURE_VERSION of the features the model was trained on
+        """
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.kb_version = kb_version
+        self.metrics = metrics or {}
+        self.feature_version = feature_version
+
+    @classmethod
+    def train(
+        cls,
+        features: np.ndarray,
+        hours: np.ndarray,
+        kb_version: str,
+        alpha: Optional[float] = None
+    ) -> "HourModel":
+        """
+        Fit one ridge regression per platform on log1p(hours).
+
+        Args:
+            features: (tasks, features) output of hour_features
+            hours: (tasks, platforms) historical hours, NaN where a task has no estimate
+            kb_version: KB version of the training data
+            alpha: L2 penalty (defaults to settings.hour_model_alpha)
+
+        Returns:
+            HourModel
+        """
+        alpha = alpha if alpha is not None else settings.hour_model_alpha
+        weights = np.full((len(PLATFORM_ORDER), features.shape[1] + 1), np.nan, dtype=np.float32)
+        for p in range(len(PLATFORM_ORDER)):
+            valid = ~np.isnan(hours[:, p])
+            if valid.sum() >= settings.hour_model_min_samples:
+                weights[p] = fit_ridge(features[valid], np.log1p(hours[valid, p]), alpha)
+        return cls(weights, kb_version)
+
+    def predict(self, features: np.ndarray) -> np.ndarray:
+        """
+        Predict hours for every platform.
+
+        Returns:
+            (tasks, platforms) hours, NaN for platforms the model was not trained for
+        """
+        log_hours = features @ self.weights[:, :-1].T + self.weights[:, -1]
+        return np.expm1(np.clip(log_hours, 0, None))
+
+    def trained_platforms(self) -> List[Platform]:
+        """Platforms with enough training data to have a model."""
+        return [platform for p, platform in enumerate(PLATFORM_ORDER) if not np.isnan(self.weights[p, -1])]
+
+    def save(self, path: Path) -> None:
+        """Save the weights as a compressed .npz file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                weights=self.weights,
+                kb_version=np.array(self.kb_version),
+                metrics=np.array(json.dumps(self.metrics)),
+                feature_version=np.array(self.feature_version),
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "HourModel":
+        """Load weights saved by save() (models saved before feature versioning are version 1)."""
+        with np.load(path, allow_pickle=False) as data:
+            feature_version = int(data["feature_version"]) if "feature_version" in data.files else 1
+            return cls(data["weights"], str(data["kb_version"]), json.loads(str(data["metrics"])), feature_version)
+
+
+def embed_kb_epics(
+    epic_index: Dict,
+    embed_texts: Callable[[List[str]], List[List[float]]]
+) -> Dict[tuple, np.ndarray]:
+    """
+    Embed the epic_feature_text of every KB epic.
+
+    The similarity index embeddings are not used: they embed an epic's first
+    task along with its name, which predict_epic_hours cannot reproduce.
+
+    Args:
+        epic_index: Output of MySQLKnowledgeBase.load_epic_index()
+        embed_texts: Embeds a batch of texts
+
+    Returns:
+        Dict mapping (estimation_name, epic_id) -> embedding
+    """
+    epics = epic_index.get("epics", [])
+    names = sorted({epic["epic_name"] for epic in epics})
+    vectors = []
+    for start in range(0, len(names), EMBEDDING_BATCH_SIZE):
+        vectors.extend(embed_texts([epic_feature_text(name) for name in names[start:start + EMBEDDING_BATCH_SIZE]]))
+    by_name = dict(zip(names, np.asarray(vectors, dtype=np.float32)))
+    return {(epic["estimation_name"], epic["epic_id"]): by_name[epic["epic_name"]] for epic in epics}
+
+
+def load_training_data(
+    task_hours: Dict[tuple, Dict[Platform, float]],
+    epic_embeddings: Dict[tuple, np.ndarray],
+    statistics: HourStatistics
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build the training set from the KB.
+
+    Args:
+        task_hours: Output of MySQLKnowledgeBase.get_task_platform_hours()
+        epic_embeddings: Output of embed_kb_epics()
+        statistics: Hour statistics built with task name embeddings
+
+    Returns:
+        (features, (tasks, platforms) hours, (tasks,) estimation name of each task)
+    """
+    if not len(statistics.task_embeddings):
+        raise ValueError("Hour statistics have no task embeddings; rebuild them with the knowledge base available")
+
+    platform_column = {platform: i for i, platform in enumerate(PLATFORM_ORDER)}
+    task_keys = list(task_hours)
+    hours = np.full((len(task_keys), len(PLATFORM_ORDER)), np.nan, dtype=np.float64)
+    for row, key in enumerate(task_keys):
+        for platform, value in task_hours[key].items():
+            hours[row, platform_column[platform]] = value
+
+    names = np.array([normalize_task_name(key[2]) for key in task_keys], dtype=str)
+    task_rows = np.clip(np.searchsorted(statistics.task_names, names), 0, len(statistics.task_names) - 1)
+    if not np.array_equal(statistics.task_names[task_rows], names):
+        raise ValueError("Hour statistics are out of date with the knowledge base; rebuild them first")
+
+    epic_features = np.zeros((len(task_keys), statistics.task_embeddings.shape[1]), dtype=np.float32)
+    for row, key in enumerate(task_keys):
+        embedding = epic_embeddings.get((key[0], key[1]))
+        if embedding is not None:
+            epic_features[row] = embedding
+
+    groups = np.array([key[0] for key in task_keys], dtype=str)
+    return hour_features(statistics.task_embeddings[task_rows], epic_features), hours, groups
+
+
+def evaluate_holdout(
+    features: np.ndarray,
+    hours: np.ndarray,
+    groups: np.ndarray,
+    holdout: float,
+    alpha: Optional[float] = None,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Train on a split of the KB estimations and evaluate on the held-out ones.
+
+    Whole estimations are held out, since tasks of one estimation share
+    names and epics with each other. The model is compared with the
+    baseline of predicting the training median per platform.
+
+    Returns:
+        Per-platform and overall MAE / median absolute percentage error of the model and the baseline
+    """
+    rng = np.random.default_rng(seed)
+    estimations = np.unique(groups)
+    held_out = rng.choice(estimations, size=max(1, int(round(len(estimations) * holdout))), replace=False)
+    test = np.isin(groups, held_out)
+    if test.all() or not test.any():
+        raise ValueError(f"Need at least two KB estimations for a holdout split, found {len(estimations)}")
+
+    model = HourModel.train(features[~test], hours[~test], kb_version="holdout", alpha=alpha)
+    predicted = model.predict(features[test])
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # Platforms without training hours
+        baseline = np.nanmedian(hours[~test], axis=0)
+
+    def errors(predictions: np.ndarray, actual: np.ndarray) -> Dict[str, float]:
+        absolute = np.abs(predictions - actual)
+        return {
+            "mae_hours": round(float(absolute.mean()), 2),
+            "median_ape_pct": round(float(np.median(absolute / np.maximum(actual, 1)) * 100), 1),
+        }
+
+    metrics: Dict[str, Any] = {
+        "train_estimations": int(len(estimations) - len(held_out)),
+        "holdout_estimations": int(len(held_out)),
+        "platforms": {},
+    }
+    all_actual, all_model, all_baseline = [], [], []
+    for p, platform in enumerate(PLATFORM_ORDER):
+        valid = ~np.isnan(hours[test, p]) & ~np.isnan(predicted[:, p])
+        if not valid.any():
+            continue
+        actual = hours[test, p][valid]
+        metrics["platforms"][platform.value] = {
+            "samples": int(valid.sum()),
+            "model": errors(predicted[valid, p], actual),
+            "baseline": errors(np.full(len(actual), baseline[p]), actual),
+        }
+        all_actual.append(actual)
+        all_model.append(predicted[valid, p])
+        all_baseline.append(np.full(len(actual), baseline[p]))
+
+    if all_actual:
+        actual = np.concatenate(all_actual)
+        metrics["overall"] = {
+            "samples": int(len(actual)),
+            "model": errors(np.concatenate(all_model), actual),
+            "baseline": errors(np.concatenate(all_baseline), actual),
+        }
+    return metrics
+
+
+def default_model_path() -> Path:
+    """Path of the trained model (app/data/hour_model.npz)."""
+    return Path(__file__).parent.parent / "data" / "hour_model.npz"
+
+
+def train_hour_model(
+    path: Optional[Path] = None,
+    holdout: Optional[float] = None,
+    alpha: Optional[float] = None,
+    save: bool = True
+) -> HourModel:
+    """
+    Train the model from the knowledge base, evaluating it on a holdout split first.
+
+    The saved model is refit on all KB estimations; its metrics are those of the holdout run.
+
+    Args:
+        path: Output path (defaults to app/data/hour_model.npz)
+        holdout: Fraction of KB estimations held out (defaults to settings.hour_model_holdout, 0 = skip)
+        alpha: L2 penalty (defaults to settings.hour_model_alpha)
+        save: Save the trained model (False only evaluates)
+
+    Returns:
+        Trained HourModel, with its holdout metrics
+    """
+    from .mysql_knowledge_base import get_knowledge_base
+
+    kb = get_knowledge_base()
+    features, hours, groups = load_training_data(
+        kb.get_task_platform_hours(), embed_kb_epics(kb.load_epic_index(), kb.embed_queries), get_hour_statistics()
+    )
+    holdout = holdout if holdout is not None else settings.hour_model_holdout
+    metrics = evaluate_holdout(features, hours, groups, holdout, alpha) if holdout else {}
+
+    model = HourModel.train(features, hours, kb.get_kb_version(), alpha)
+    model.metrics = {"training_tasks": int(len(features)), **metrics}
+    logger.info(
+        f"✓ Trained hour model on {len(features)} KB tasks for "
+        f"{', '.join(p.value for p in model.trained_platforms())}"
+    )
+    if save:
+        model.save(path or default_model_path())
+    return model
+
+
+def predict_epic_hours(model: HourModel, epics: List[Epic]) -> int:
+    """
+    Set the hours of every task in the epics from the model (in place).
+
+    Task descriptions (normalized like the KB task names) and epic_feature_text
+    of the epic names are embedded in a single request, matching the training features. Platforms the model has no weights for keep
+    their current hours.
+
+    Returns:
+        Number of tasks with predicted hours
+    """
+    tasks = [(e, task) for e, epic in enumerate(epics) for task in epic.tasks]
+    if not tasks:
+        return 0
+
+    from .mysql_knowledge_base import get_knowledge_base
+
+    texts = [normalize_task_name(task.description) for _, task in tasks] + [epic_feature_text(epic.name) for epic in epics]
+    embeddings = np.array(get_knowledge_base().embed_queries(texts), dtype=np.float32)
+    task_embeddings, epic_embeddings = embeddings[:len(tasks)], embeddings[len(tasks):]
+    predicted = model.predict(hour_features(task_embeddings, epic_embeddings[[e for e, _ in tasks]]))
+
+    for row, (_, task) in enumerate(tasks):
+        for platform in list(task.efforts):
+            value = predicted[row, PLATFORM_ORDER.index(platform)]
+            if not np.isnan(value):
+                task.efforts[platform] = max(1, int(round(float(value))))
+    return len(tasks)
+
+
+# Singleton instance, reloaded when the saved file changes
+_hour_model: Optional[HourModel] = None
+_hour_model_mtime: Optional[float] = None
+_hour_model_lock = threading.Lock()
+
+
+def get_hour_model() -> Optional[HourModel]:
+    """
+    Get the trained hour model, or None if it is disabled or has not been trained.
+
+    Reloads the model after it was retrained.
+    """
+    global _hour_model, _hour_model_mtime
+    if not settings.hour_model_enabled:
+        return None
+    path = default_model_path()
+    with _hour_model_lock:
+        mtime = path.stat().st_mtime if path.exists() else None
+        if mtime is None:
+            _hour_model, _hour_model_mtime = None, None
+        elif _hour_model is None or mtime != _hour_model_mtime:
+            _hour_model, _hour_model_mtime = HourModel.load(path), mtime
+            logger.info(f"Loaded hour model trained on KB {_hour_model.kb_version}")
+            if _hour_model.feature_version != FEATURE_VERSION:
+                logger.warning(
+                    f"Hour model was trained on feature version {_hour_model.feature_version}, "
+                    f"expected {FEATURE_VERSION}; not using it until it is retrained"
+                )
+        if _hour_model is not None and _hour_model.feature_version != FEATURE_VERSION:
+            return None
+        return _hour_model
+
+
+# CLI for training and evaluating the model
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(levelname)s:%(name)s:%(message)s'
+    )
+
+    def print_metrics(metrics: Dict[str, Any]) -> None:
+        if "overall" not in metrics:
+            print("(no holdout evaluation)")
+            return
+        print(
+            f"Holdout: {metrics['holdout_estimations']} of "
+            f"{metrics['train_estimations'] + metrics['holdout_estimations']} KB estimations"
+        )
+        print(f"{'Platform':<10} {'Tasks':>6} {'MAE h':>8} {'MdAPE %':>8} {'Base MAE':>9} {'Base MdAPE':>11}")
+        rows = list(metrics["platforms"].items()) + [("overall", metrics["overall"])]
+        for name, values in rows:
+            print(
+                f"{name:<10} {values['samples']:>6} {values['model']['mae_hours']:>8} "
+                f"{values['model']['median_ape_pct']:>8} {values['baseline']['mae_hours']:>9} "
+                f"{values['baseline']['median_ape_pct']:>11}"
+            )
+
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    holdout = float(sys.argv[2]) if len(sys.argv) > 2 else None
+    if command in ("train", "evaluate"):
+        model = train_hour_model(holdout=holdout, save=command == "train")
+        if command == "train":
+            print(f"✓ Wrote hour model for KB {model.kb_version} to {default_model_path()}")
+        print_metrics(model.metrics)
+    else:
+        print("Usage: python -m backend.app.services.hour_model [train | evaluate] [holdout fraction]")
@@ -0,0 +1,479 @@
+"""Precomputed historical hour distributions over the knowledge base."""
+
+import logging
+import re
+import threading
+import warnings
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.schemas import Platform
+
+logger = logging.getLogger(__name__)
+
+# Per (group, platform) statistics, in this order along the last array axis
+STAT_FIELDS = ("count", "median", "p10", "p90")
+_QUANTILES = (0.5, 0.1, 0.9)
+
+# Task names embedded per request when building the nearest-neighbour task index
+EMBEDDING_BATCH_SIZE = 1000
+
+# Hour ratios kept per platform for bootstrap resampling (see hour_ratios)
+RATIO_POOL_SIZE = 20000
+
+PLATFORM_ORDER: List[Platform] = list(Platform)
+
+
+def normalize_task_name(name: str) -> str:
+    """Normalize a task or epic name for grouping ("Sign-up with Email " -> "sign up with email")."""
+    return " ".join(re.findall(r"[a-z0-9]+", (name or "").lower()))
+
+
+def group_distributions(hours: np.ndarray, groups: np.ndarray, group_count: int) -> np.ndarray:
+    """
+    Hour distribution per group and platform, fully vectorized.
+
+    Values are sorted by (group, hours) once per platform; each group's
+    quantiles are then read at its offsets with linear interpolation
+    (numpy's default percentile method). NaN hours are ignored.
+
+    Args:
+        hours: (items, platforms) hours, NaN where an item has no estimate
+        groups: (items,) group index of each item
+        group_count: Number of groups
+
+    Returns:
+        (groups, platforms, len(STAT_FIELDS)) float32 array, NaN statistics for empty cells
+    """
+    stats = np.full((group_count, hours.shape[1], len(STAT_FIELDS)), np.nan, dtype=np.float32)
+    for p in range(hours.shape[1]):
+        valid = ~np.isnan(hours[:, p])
+        values, value_groups = hours[valid, p], groups[valid]
+        order = np.lexsort((values, value_groups))
+        values = values[order]
+
+        counts = np.bincount(value_groups, minlength=group_count)
+        starts = np.cumsum(counts) - counts
+        present = counts > 0
+        stats[:, p, 0] = counts
+
+        for field, q in enumerate(_QUANTILES, start=1):
+            position = starts[present] + q * (counts[present] - 1)
+            lower = np.floor(position).astype(int)
+            upper = np.ceil(position).astype(int)
+            stats[present, p, field] = values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+    return stats
+
+
+def spherical_kmeans(matrix: np.ndarray, k: int, iterations: int = 25, seed: int = 0) -> np.ndarray:
+    """
+    Cluster row-normalized embeddings by cosine similarity.
+
+    Returns:
+        (k, dimensions) normalized centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, matrix)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Empty clusters keep their previous centroid
+        updated = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+        if np.allclose(updated, centroids):
+            break
+        centroids = updated
+    return centroids.astype(np.float32)
+
+
+class HourStatistics:
+    """
+    Historical hour distributions (count, median, p10, p90 per platform) held as NumPy arrays.
+
+    Tasks are grouped by normalized task name; epics (summed task hours) by
+    normalized epic name and by epic-embedding cluster, so an unseen epic can
+    be calibrated from the cluster nearest to its embedding. Task names are
+    also embedded, so generated tasks can be compared with their nearest
+    historical tasks, and the spread of each task's hours around its name's
+    median is kept as a pool of ratios for bootstrap intervals. Built at KB
+    ingestion (or at startup if missing) and saved next to the other derived data.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        """
+        Initialize from precomputed arrays (see build / load).
+
+        Args:
+            arrays: task_names, task_stats, epic_names, epic_stats, centroids,
+                cluster_stats, overall_task, overall_epic, kb_version and
+                optionally task_embeddings (row-normalized, aligned with task_names)
+                and ratio_values / ratio_offsets (per-platform hour ratio pools)
+        """
+        self.kb_version = str(arrays["kb_version"])
+        self.task_names = arrays["task_names"]
+        self.task_stats = arrays["task_stats"]
+        self.epic_names = arrays["epic_names"]
+        self.epic_stats = arrays["epic_stats"]
+        self.centroids = arrays["centroids"]
+        self.cluster_stats = arrays["cluster_stats"]
+        self.overall_task = arrays["overall_task"]
+        self.overall_epic = arrays["overall_epic"]
+        # Stored as float16 to halve the file size
+        self.task_embeddings = np.asarray(arrays.get("task_embeddings", np.zeros((0, 0))), dtype=np.float32)
+        # Platform p's ratios are ratio_values[ratio_offsets[p]:ratio_offsets[p + 1]]
+        self.ratio_values = np.asarray(arrays.get("ratio_values", np.zeros(0)), dtype=np.float32)
+        self.ratio_offsets = np.asarray(
+            arrays.get("ratio_offsets", np.zeros(len(PLATFORM_ORDER) + 1)), dtype=np.int64
+        )
+
+    @classmethod
+    def build(
+        cls,
+        task_hours: Dict[tuple, Dict[Platform, float]],
+        epic_index: Dict,
+        kb_version: str,
+        cluster_count: Optional[int] = None,
+        embed_texts: Optional[Callable[[List[str]], List[List[float]]]] = None
+    ) -> "HourStatistics":
+        """
+        Compute all distributions from the knowledge base.
+
+        Args:
+            task_hours: Output of MySQLKnowledgeBase.get_task_platform_hours()
+            epic_index: Output of MySQLKnowledgeBase.load_epic_index()
+            kb_version: KB version the statistics are computed from
+            cluster_count: Epic clusters (defaults to settings.hour_stats_clusters,
+                0 = sqrt(epics / 2))
+            embed_texts: Embeds a batch of texts; when given, task names are
+                embedded for nearest_task_hours
+
+        Returns:
+            HourStatistics
+        """
+        platform_column = {platform: i for i, platform in enumerate(PLATFORM_ORDER)}
+
+        # Task rows: hours per platform, grouped by normalized task name
+        task_keys = list(task_hours)
+        hours = np.full((len(task_keys), len(PLATFORM_ORDER)), np.nan, dtype=np.float64)
+        for row, key in enumerate(task_keys):
+            for platform, value in task_hours[key].items():
+                hours[row, platform_column[platform]] = value
+
+        task_names, task_groups = np.unique(
+            np.array([normalize_task_name(key[2]) for key in task_keys], dtype=str), return_inverse=True
+        )
+        task_stats = group_distributions(hours, task_groups, len(task_names))
+
+        # Hours relative to their task name's median, for names estimated often enough to have a spread
+        group_stats = task_stats[task_groups]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = hours / group_stats[:, :, 1]
+        pooled = (group_stats[:, :, 0] >= settings.bootstrap_min_group_size) & np.isfinite(ratios)
+        rng = np.random.default_rng(0)
+        ratio_pools = []
+        for p in range(len(PLATFORM_ORDER)):
+            pool = ratios[pooled[:, p], p]
+            if len(pool) > RATIO_POOL_SIZE:
+                pool = rng.choice(pool, size=RATIO_POOL_SIZE, replace=False)
+            ratio_pools.append(pool.astype(np.float32))
+
+        # Epic rows: summed task hours per (estimation, epic)
+        epic_keys, epic_rows = np.unique(
+            np.array([f"{key[0]}\x1f{key[1]}" for key in task_keys], dtype=str), return_inverse=True
+        )
+        epic_hours = np.full((len(epic_keys), len(PLATFORM_ORDER)), np.nan, dtype=np.float64)
+        for p in range(len(PLATFORM_ORDER)):
+            valid = ~np.isnan(hours[:, p])
+            totals = np.bincount(epic_rows[valid], weights=hours[valid, p], minlength=len(epic_keys))
+            has_platform = np.bincount(epic_rows[valid], minlength=len(epic_keys)) > 0
+            epic_hours[has_platform, p] = totals[has_platform]
+
+        # Epic names and embeddings come from the similarity index
+        index_rows = {
+            f"{epic['estimation_name']}\x1f{epic['epic_id']}": i
+            for i, epic in enumerate(epic_index.get("epics", []))
+        }
+        epic_name_list = [
+            normalize_task_name(epic_index["epics"][index_rows[key]]["epic_name"]) if key in index_rows else ""
+            for key in epic_keys
+        ]
+        epic_names, epic_groups = np.unique(np.array(epic_name_list, dtype=str), return_inverse=True)
+
+        matrix = epic_index.get("matrix")
+        embedded = np.array([key in index_rows for key in epic_keys], dtype=bool)
+        if matrix is not None and len(matrix) and embedded.any():
+            vectors = matrix[[index_rows[key] for key in epic_keys[embedded]]]
+            k = cluster_count if cluster_count is not None else settings.hour_stats_clusters
+            k = min(k or max(1, int(np.sqrt(len(vectors) / 2))), len(vectors))
+            centroids = spherical_kmeans(vectors, k)
+            clusters = np.argmax(vectors @ centroids.T, axis=1)
+            cluster_stats = group_distributions(epic_hours[embedded], clusters, k)
+        else:
+            centroids = np.zeros((0, 0), dtype=np.float32)
+            cluster_stats = np.zeros((0, len(PLATFORM_ORDER), len(STAT_FIELDS)), dtype=np.float32)
+
+        task_embeddings = np.zeros((0, 0), dtype=np.float16)
+        if embed_texts is not None and len(task_names):
+            vectors = []
+            for start in range(0, len(task_names), EMBEDDING_BATCH_SIZE):
+                vectors.extend(embed_texts(task_names[start:start + EMBEDDING_BATCH_SIZE].tolist()))
+            task_embeddings = np.array(vectors, dtype=np.float32)
+            task_embeddings /= np.linalg.norm(task_embeddings, axis=1, keepdims=True)
+            task_embeddings = task_embeddings.astype(np.float16)
+
+        statistics = cls({
+            "kb_version": np.array(kb_version),
+            "task_names": task_names,
+            "task_stats": task_stats,
+            "epic_names": epic_names,
+            "epic_stats": group_distributions(epic_hours, epic_groups, len(epic_names)),
+            "centroids": centroids,
+            "cluster_stats": cluster_stats,
+            "overall_task": group_distributions(hours, np.zeros(len(hours), dtype=int), 1)[0],
+            "overall_epic": group_distributions(epic_hours, np.zeros(len(epic_hours), dtype=int), 1)[0],
+            "task_embeddings": task_embeddings,
+            "ratio_values": np.concatenate(ratio_pools),
+            "ratio_offsets": np.concatenate(([0], np.cumsum([len(pool) for pool in ratio_pools]))),
+        })
+        logger.info(
+            f"✓ Hour statistics for KB {kb_version}: {len(task_keys)} tasks in {len(task_names)} task names, "
+            f"{len(epic_keys)} epics in {len(epic_names)} epic names and {len(centroids)} clusters"
+        )
+        return statistics
+
+    def save(self, path: Path) -> None:
+        """Save the arrays as a compressed .npz file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f,
+                kb_version=np.array(self.kb_version),
+                task_names=self.task_names,
+                task_stats=self.task_stats,
+                epic_names=self.epic_names,
+                epic_stats=self.epic_stats,
+                centroids=self.centroids,
+                cluster_stats=self.cluster_stats,
+                overall_task=self.overall_task,
+                overall_epic=self.overall_epic,
+                task_embeddings=self.task_embeddings.astype(np.float16),
+                ratio_values=self.ratio_values,
+                ratio_offsets=self.ratio_offsets,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "HourStatistics":
+        """Load arrays saved by save()."""
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    @staticmethod
+    def _as_dict(stats: np.ndarray) -> Dict[Platform, Dict[str, float]]:
+        """Convert a (platforms, STAT_FIELDS) row to {Platform: {field: value}} for platforms with data."""
+        return {
+            platform: {
+                field: (int(value) if field == "count" else round(float(value), 1))
+                for field, value in zip(STAT_FIELDS, stats[p])
+            }
+            for p, platform in enumerate(PLATFORM_ORDER)
+            if stats[p, 0] > 0
+        }
+
+    def _lookup(self, names: np.ndarray, stats: np.ndarray, name: str) -> Optional[Dict[Platform, Dict[str, float]]]:
+        """Binary search a sorted name array."""
+        key = normalize_task_name(name)
+        i = int(np.searchsorted(names, key))
+        if i < len(names) and names[i] == key:
+            return self._as_dict(stats[i])
+        return None
+
+    def task_hours(self, task_name: str) -> Optional[Dict[Platform, Dict[str, float]]]:
+        """Distribution of historical hours for a task name (None if never estimated)."""
+        return self._lookup(self.task_names, self.task_stats, task_name)
+
+    def epic_hours(self, epic_name: str) -> Optional[Dict[Platform, Dict[str, float]]]:
+        """Distribution of historical total hours for an epic name (None if never estimated)."""
+        return self._lookup(self.epic_names, self.epic_stats, epic_name)
+
+    def cluster_hours(self, embedding: List[float]) -> Optional[Dict[Platform, Dict[str, float]]]:
+        """Distribution of total hours of the epic cluster nearest to an epic embedding."""
+        if not len(self.centroids):
+            return None
+        query = np.asarray(embedding, dtype=np.float32)
+        cluster = int(np.argmax(self.centroids @ (query / np.linalg.norm(query))))
+        return self._as_dict(self.cluster_stats[cluster])
+
+    def nearest_task_hours(
+        self,
+        embeddings: np.ndarray,
+        neighbors: int,
+        min_similarity: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Median historical hours of each query task's nearest KB tasks.
+
+        One matrix product ranks every KB task name for every query; the
+        median hours of the top neighbors above min_similarity are then
+        combined per platform.
+
+        Args:
+            embeddings: (queries, dimensions) task description embeddings
+            neighbors: Nearest KB task names considered per query
+            min_similarity: Minimum cosine similarity of a neighbor
+
+        Returns:
+            ((queries, platforms) median of the neighbors' median hours, NaN without
+            neighbors; (queries, platforms) number of neighbors with hours)
+        """
+        shape = (len(embeddings), len(PLATFORM_ORDER))
+        if not len(self.task_embeddings) or not len(embeddings):
+            return np.full(shape, np.nan), np.zeros(shape, dtype=int)
+
+        queries = np.asarray(embeddings, dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        similarities = queries @ self.task_embeddings.T
+
+        k = min(neighbors, similarities.shape[1])
+        nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        close = np.take_along_axis(similarities, nearest, axis=1) >= min_similarity
+
+        medians = self.task_stats[nearest, :, 1].astype(np.float64)  # (queries, k, platforms)
+        medians[~close] = np.nan
+        counts = (~np.isnan(medians)).sum(axis=1)
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN rows: no neighbors
+            return np.nanmedian(medians, axis=1), counts
+
+    def hour_ratios(self, platform: Optional[Platform] = None) -> np.ndarray:
+        """
+        Historical task hours divided by the median hours of the same task name.
+
+        Args:
+            platform: Platform whose ratios to return; all platforms when None
+                or when the platform has no pooled ratios
+
+        Returns:
+            (ratios,) float32 array, empty if the statistics predate ratio pools
+        """
+        if platform is not None:
+            p = PLATFORM_ORDER.index(platform)
+            pool = self.ratio_values[self.ratio_offsets[p]:self.ratio_offsets[p + 1]]
+            if len(pool):
+                return pool
+        return self.ratio_values
+
+    def overall_epic_hours(self) -> Dict[Platform, Dict[str, float]]:
+        """Distribution of total hours over all KB epics."""
+        return self._as_dict(self.overall_epic)
+
+    def overall_task_hours(self) -> Dict[Platform, Dict[str, float]]:
+        """Distribution of hours over all KB tasks."""
+        return self._as_dict(self.overall_task)
+
+
+def default_statistics_path() -> Path:
+    """Path of the saved statistics (app/data/hour_statistics.npz)."""
+    return Path(__file__).parent.parent / "data" / "hour_statistics.npz"
+
+
+def build_hour_statistics(path: Optional[Path] = None) -> HourStatistics:
+    """
+    Recompute the statistics from the knowledge base and save them.
+
+    Called after KB ingestion; running servers pick up the new file on their next lookup.
+    """
+    from .mysql_knowledge_base import get_knowledge_base
+
+    kb = get_knowledge_base()
+    statistics = HourStatistics.build(
+        kb.get_task_platform_hours(),
+        kb.load_epic_index(),
+        kb.get_kb_version(),
+        embed_texts=kb.embed_queries
+    )
+    statistics.save(path or default_statistics_path())
+    return statistics
+
+
+# Singleton instance, reloaded when the saved file changes
+_hour_statistics: Optional[HourStatistics] = None
+_hour_statistics_mtime: Optional[float] = None
+_hour_statistics_lock = threading.Lock()
+
+
+def get_hour_statistics() -> HourStatistics:
+    """
+    Get the hour statistics singleton.
+
+    Loads the saved statistics and reloads them after a re-ingestion rewrote
+    the file. They are never built here, on the request path (see
+    prepare_hour_statistics).
+
+    Raises:
+        FileNotFoundError if no statistics have been saved yet
+    """
+    global _hour_statistics, _hour_statistics_mtime
+    path = default_statistics_path()
+    with _hour_statistics_lock:
+        mtime = path.stat().st_mtime if path.exists() else None
+        if mtime is None:
+            raise FileNotFoundError(
+                f"No saved hour statistics at {path}; they are built at KB ingestion, "
+                f"at startup or with: python -m backend.app.services.hour_statistics build"
+            )
+        if _hour_statistics is None or mtime != _hour_statistics_mtime:
+            _hour_statistics = HourStatistics.load(path)
+            _hour_statistics_mtime = mtime
+            logger.info(f"Loaded hour statistics for KB {_hour_statistics.kb_version}")
+        return _hour_statistics
+
+
+def prepare_hour_statistics() -> HourStatistics:
+    """
+    Build the statistics if none have been saved yet, and load them.
+
+    Called at application startup, so the first request does not pay for
+    building them (which embeds every KB task name).
+    """
+    if not default_statistics_path().exists():
+        logger.info("No saved hour statistics, building them from the knowledge base")
+        build_hour_statistics()
+    return get_hour_statistics()
+
+
+# CLI for rebuilding and inspecting the statistics
+if __name__ == "__main__":
+    import sys
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(levelname)s:%(name)s:%(message)s'
+    )
+
+    def print_stats(label: str, stats: Optional[Dict[Platform, Dict[str, float]]]) -> None:
+        print(f"{label}:")
+        if not stats:
+            print("  (no historical estimates)")
+        for platform, values in (stats or {}).items():
+            print(
+                f"  {platform.value}: median {values['median']}h "
+                f"(p10 {values['p10']}h, p90 {values['p90']}h, n={values['count']})"
+            )
+
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        statistics = build_hour_statistics()
+        print(f"✓ Wrote hour statistics for KB {statistics.kb_version} to {default_statistics_path()}")
+        print_stats("All epics", statistics.overall_epic_hours())
+        print_stats("All tasks", statistics.overall_task_hours())
+    elif len(sys.argv) > 2 and sys.argv[1] in ("task", "epic"):
+        statistics = get_hour_statistics()
+        name = " ".join(sys.argv[2:])
+        lookup = statistics.task_hours if sys.argv[1] == "task" else statistics.epic_hours
+        print_stats(f"{sys.argv[1].capitalize()} '{name}'", lookup(name))
+    else:
+        print("Usage: python -m backend.app.services.hour_statistics [build | task <name> | epic <name>]")
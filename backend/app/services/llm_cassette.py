@@ -0,0 +1,163 @@
+"""Record/replay cassette store for OpenAI calls.
+
+In ``record`` mode every chat completion and embedding request is fingerprinted
+and written (with its response) to a local cassette directory. In ``replay``
+mode the same requests are served from disk, so the full estimation graph can
+be profiled and load-tested offline, deterministically and at CPU speed.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when no recording matches a request."""
+
+
+class CassetteStore:
+    """File-based store of recorded OpenAI requests and responses."""
+
+    def __init__(
+        self,
+        mode: Optional[str] = None,
+        cassette_dir: Optional[str] = None,
+        latency_scale: Optional[float] = None
+    ):
+        """
+        Initialize the cassette store.
+
+        Args:
+            mode: "off", "record" or "replay" (defaults to settings.llm_cassette_mode)
+            cassette_dir: Directory holding cassette files
+            latency_scale: Multiplier applied to recorded latency on replay
+                (0 = serve instantly, 1.0 = reproduce recorded latency)
+        """
+        self.mode = (mode or settings.llm_cassette_mode).lower()
+        if self.mode not in CASSETTE_MODES:
+            raise ValueError(f"Invalid cassette mode '{self.mode}', expected one of {CASSETTE_MODES}")
+
+        self.cassette_dir = Path(cassette_dir or settings.llm_cassette_dir)
+        self.latency_scale = (
+            settings.llm_cassette_replay_latency_scale if latency_scale is None else latency_scale
+        )
+        self._lock = threading.Lock()
+
+        if self.mode != "off":
+            logger.info(f"LLM cassette mode: {self.mode} (dir: {self.cassette_dir})")
+
+    @staticmethod
+    def fingerprint(kind: str, request: Dict[str, Any]) -> str:
+        """
+        Compute a stable fingerprint for a request.
+
+        Args:
+            kind: Request kind ("chat" or "embedding")
+            request: JSON-serializable request parameters
+
+        Returns:
+            Hex SHA-256 digest of the canonical request
+        """
+        canonical = json.dumps({"kind": kind, **request}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, kind: str, fingerprint: str) -> Path:
+        return self.cassette_dir / f"{kind}_{fingerprint}.json"
+
+    def call(
+        self,
+        kind: str,
+        request: Dict[str, Any],
+        fn: Callable[[], Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Execute a request through the cassette layer.
+
+        Args:
+            kind: Request kind ("chat" or "embedding")
+            request: JSON-serializable request parameters (used for the fingerprint)
+            fn: Callable performing the live API call, returning a JSON-serializable dict
+
+        Returns:
+            Response dict (live, recorded, or replayed)
+
+        Raises:
+            CassetteMissError: In replay mode when the request was never recorded
+        """
+        if self.mode == "off":
+            return fn()
+
+        fingerprint = self.fingerprint(kind, request)
+
+        if self.mode == "replay":
+            return self._replay(kind, fingerprint)
+
+        start = time.perf_counter()
+        response = fn()
+        latency_ms = (time.perf_counter() - start) * 1000
+        self._record(kind, fingerprint, request, response, latency_ms)
+        return response
+
+    def _record(
+        self,
+        kind: str,
+        fingerprint: str,
+        request: Dict[str, Any],
+        response: Dict[str, Any],
+        latency_ms: float
+    ) -> None:
+        entry = {
+            "fingerprint": fingerprint,
+            "kind": kind,
+            "recorded_at": datetime.now().isoformat(),
+            "latency_ms": round(latency_ms, 1),
+            "request": request,
+            "response": response,
+        }
+        path = self._path(kind, fingerprint)
+        tmp_path = path.with_suffix(".tmp")
+
+        with self._lock:
+            self.cassette_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            tmp_path.replace(path)
+
+        logger.debug(f"Recorded {kind} cassette {fingerprint[:12]} ({latency_ms:.0f}ms)")
+
+    def _replay(self, kind: str, fingerprint: str) -> Dict[str, Any]:
+        path = self._path(kind, fingerprint)
+        if not path.exists():
+            raise CassetteMissError(f"No recorded {kind} response for fingerprint {fingerprint[:12]} in {self.cassette_dir}")
+
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+
+        if self.latency_scale > 0:
+            time.sleep(entry.get("latency_ms", 0) * self.latency_scale / 1000)
+
+        logger.debug(f"Replayed {kind} cassette {fingerprint[:12]}")
+        return entry["response"]
+
+
+# Singleton instance
+_cassette_store: Optional[CassetteStore] = None
+
+
+def get_cassette_store() -> CassetteStore:
+    """Get or create cassette store singleton."""
+    global _cassette_store
+    if _cassette_store is None:
+        _cassette_store = CassetteStore()
+    return _cassette_store
@@ -0,0 +1,77 @@
+"""Per-node model routing with ordered fallbacks."""
+
+import logging
+from typing import Dict, List, Optional
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Workflow roles that can be routed to different models
+MODEL_ROLES = ("analysis", "modify", "generate", "repair")
+
+
+def _parse_models(value: str) -> List[str]:
+    """Parse a comma-separated model list, dropping blanks."""
+    return [m.strip() for m in (value or "").split(",") if m.strip()]
+
+
+class ModelRouter:
+    """
+    Maps workflow roles to an ordered list of models.
+
+    The first model is the primary; the rest are tried in order when the
+    primary times out or errors. A fast model can handle the structured
+    analysis while the strongest model is reserved for the heavy generation.
+    """
+
+    def __init__(self, routes: Optional[Dict[str, List[str]]] = None):
+        """
+        Initialize the router.
+
+        Args:
+            routes: Role -> ordered model list (defaults to settings.openai_model_<role>,
+                falling back to settings.openai_model)
+        """
+        if routes is None:
+            routes = {
+                role: _parse_models(getattr(settings, f"openai_model_{role}"))
+                for role in MODEL_ROLES
+            }
+        self.fallbacks = _parse_models(settings.openai_fallback_models)
+        self.routes: Dict[str, List[str]] = {}
+
+        for role in MODEL_ROLES:
+            chain = routes.get(role) or [settings.openai_model]
+            # Append global fallbacks, keeping order and removing duplicates
+            self.routes[role] = list(dict.fromkeys(chain + self.fallbacks))
+
+        logger.info(f"Model routing: {self.routes}")
+
+    def models_for(self, role: Optional[str]) -> List[str]:
+        """
+        Get the ordered model chain for a role.
+
+        Args:
+            role: One of MODEL_ROLES, or None for the default model
+
+        Returns:
+            Ordered list of models to try
+        """
+        if role is None:
+            return [settings.openai_model]
+        if role not in self.routes:
+            raise ValueError(f"Unknown model role '{role}', expected one of {MODEL_ROLES}")
+        return self.routes[role]
+
+
+# Singleton instance
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Get or create model router singleton."""
+    global _model_router
+    if _model_router is None:
+        _model_router = ModelRouter()
+    return _model_router
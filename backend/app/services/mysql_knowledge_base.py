@@ -6,8 +6,10 @@ Replaces ChromaDB with MySQL for vector embeddings
 import logging
 import json
 import os
+import time
+from itertools import combinations
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import mysql.connector
 from mysql.connector import Error
 import numpy as np
@@ -15,6 +17,10 @@ import openai
 from dotenv import load_dotenv
 
 from ..models.schemas import Epic, Task, Platform
+from ..utils.epic_utils import format_epic_summary
+from .llm_cassette import get_cassette_store
+from .platform_adapter import get_platform_adapter
+from .telemetry import record_llm_call
 
 # Load environment
 load_dotenv()
@@ -31,6 +37,12 @@ MYSQL_CONFIG = {
 
 EMBEDDING_MODEL = "text-embedding-3-small"
 
+# Legacy platform names in historical data mapped to Platform values
+PLATFORM_ALIASES = {
+    "Web Service": "API",
+    "Designer": "CMS",
+}
+
 
 class MySQLKnowledgeBase:
     """MySQL-based vector knowledge base for epic templates"""
@@ -52,22 +64,33 @@ class MySQLKnowledgeBase:
     
     def _get_embedding(self, text: str) -> List[float]:
         """Get embedding for text using OpenAI API"""
+        return self._get_embeddings(text)[0]
+    
+    def _get_embeddings(self, input_data) -> List[List[float]]:
+        """Get embeddings for a text or a list of texts in one OpenAI API request"""
         try:
-            response = openai.embeddings.create(
+            request = {"model": EMBEDDING_MODEL, "input": input_data}
+            
+            def call() -> Dict:
+                response = openai.embeddings.create(**request)
+                return {
+                    "embeddings": [item.embedding for item in response.data],
+                    "usage": {"prompt_tokens": response.usage.prompt_tokens} if response.usage else None
+                }
+            
+            start = time.perf_counter()
+            result = get_cassette_store().call("embedding", request, call)
+            record_llm_call(
+                kind="embedding",
                 model=EMBEDDING_MODEL,
-                input=text
+                latency_ms=(time.perf_counter() - start) * 1000,
+                prompt_tokens=(result.get("usage") or {}).get("prompt_tokens", 0)
             )
-            return response.data[0].embedding
+            return result["embeddings"]
         except Exception as e:
             logger.error(f"Error getting embedding: {e}")
             raise
     
-    def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        a = np.array(a)
-        b = np.array(b)
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-    
     def load_templates_from_directory(self, templates_dir: str = "data/templates"):
         """
         Load JSON templates into MySQL database
@@ -157,29 +180,31 @@ class MySQLKnowledgeBase:
         conn.close()
         
         logger.info(f"✓ Total templates loaded: {len(json_files)}, Total epics: {total_epics}")
+        
+        self.build_epic_summaries()
+        
+        from .hour_statistics import build_hour_statistics
+        build_hour_statistics()
     
-    def retrieve_similar_epics(
-        self, 
-        query_text: str, 
-        n_results: int = 3,
-        similarity_threshold: float = 0.4
-    ) -> List[Epic]:
+    def embed_query(self, query_text: str) -> List[float]:
+        """Embed a retrieval query (same model as the stored epic embeddings)."""
+        return self._get_embedding(query_text)
+    
+    def embed_queries(self, query_texts: List[str]) -> List[List[float]]:
+        """Embed several retrieval queries in a single request."""
+        return self._get_embeddings(list(query_texts)) if query_texts else []
+    
+    def load_epic_index(self) -> Dict:
         """
-        Retrieve similar epics based on query using vector similarity
+        Load every KB epic with its embedding into an in-memory similarity index.
+        
+        Loading is the expensive part of retrieval (one row and JSON-decoded
+        embedding per epic), so a loaded index can be reused for many queries.
         
-        Args:
-            query_text: Search query text
-            n_results: Maximum number of epics to return
-            similarity_threshold: Minimum similarity score (0.0-1.0)
-            
         Returns:
-            List of Epic objects with tasks
+            Dict with "epics" (epic_id, epic_name, estimation_name per row) and
+            "matrix" (row-normalized embeddings)
         """
-        logger.info(f"Searching for similar epics: '{query_text[:100]}'...")
-        
-        # Generate embedding for query
-        query_embedding = self._get_embedding(query_text)
-        
         conn = self._get_connection()
         cursor = conn.cursor(dictionary=True)
         
@@ -194,64 +219,104 @@ class MySQLKnowledgeBase:
         """)
         
         epic_records = cursor.fetchall()
+        cursor.close()
+        conn.close()
         
-        # Calculate similarity for each epic
-        epic_similarities = []
-        
+        epics = []
+        vectors = []
         for epic_record in epic_records:
             try:
-                embedding = json.loads(epic_record['embedding'].decode('utf-8'))
-                similarity = self._cosine_similarity(query_embedding, embedding)
-                
-                if similarity >= similarity_threshold:
-                    epic_similarities.append({
-                        'epic_id': epic_record['epic_id'],
-                        'epic_name': epic_record['epic_name'],
-                        'estimation_name': epic_record['estimation_name'],
-                        'similarity': similarity
-                    })
+                vectors.append(json.loads(epic_record['embedding'].decode('utf-8')))
+                epics.append({
+                    'epic_id': epic_record['epic_id'],
+                    'epic_name': epic_record['epic_name'],
+                    'estimation_name': epic_record['estimation_name']
+                })
             except Exception as e:
                 logger.warning(f"Error processing epic {epic_record['epic_name']}: {e}")
                 continue
         
-        # Sort by similarity and limit results
-        epic_similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        epic_similarities = epic_similarities[:n_results]
+        matrix = np.array(vectors, dtype=np.float32)
+        if len(matrix):
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
         
-        logger.info(f"Found {len(epic_similarities)} similar epics")
+        logger.info(f"Loaded similarity index of {len(epics)} epics")
+        return {"epics": epics, "matrix": matrix}
+    
+    def rank_epics(
+        self,
+        index: Dict,
+        query_embedding: List[float],
+        n_results: int,
+        similarity_threshold: float
+    ) -> List[Dict]:
+        """
+        Rank indexed epics by cosine similarity to a query embedding.
         
-        # Fetch all tasks for matching epics
-        result_epics = []
+        Returns:
+            Up to n_results epic info dicts (with 'similarity'), best first
+        """
+        if not index["epics"]:
+            return []
+        
+        query = np.array(query_embedding, dtype=np.float32)
+        similarities = index["matrix"] @ (query / np.linalg.norm(query))
+        
+        ranked = []
+        for i in np.argsort(-similarities, kind="stable")[:n_results]:
+            if similarities[i] < similarity_threshold:
+                break
+            ranked.append({**index["epics"][i], 'similarity': float(similarities[i])})
+        return ranked
+    
+    def fetch_epics(
+        self,
+        epic_infos: List[Dict],
+        cache: Optional[Dict[Tuple[str, int], Epic]] = None
+    ) -> List[Epic]:
+        """
+        Build Epic objects (with tasks) for ranked epic infos.
+        
+        Tasks for all epics not found in cache are fetched in one query.
         
-        for epic_info in epic_similarities:
-            # Get all tasks for this epic
-            cursor.execute("""
-                SELECT task_name, platform, estimated_hour
+        Args:
+            epic_infos: Output of rank_epics
+            cache: Already fetched epics by (estimation_name, epic_id), e.g. speculative candidates
+            
+        Returns:
+            Epic copies in epic_infos order, with the given similarity
+        """
+        cache = cache or {}
+        missing = [
+            info for info in epic_infos
+            if (info['estimation_name'], info['epic_id']) not in cache
+        ]
+        
+        # Group task rows by epic, then by task_name
+        tasks_by_epic: Dict[Tuple[str, int], Dict[str, Dict[Platform, int]]] = {}
+        if missing:
+            conn = self._get_connection()
+            cursor = conn.cursor(dictionary=True)
+            
+            placeholders = ", ".join(["(%s, %s)"] * len(missing))
+            params = [value for info in missing for value in (info['epic_id'], info['estimation_name'])]
+            cursor.execute(f"""
+                SELECT epic_id, estimation_name, task_name, platform, estimated_hour
                 FROM json_embeddings
-                WHERE epic_id = %s AND estimation_name = %s
+                WHERE (epic_id, estimation_name) IN ({placeholders})
                 ORDER BY task_name, platform
-            """, (epic_info['epic_id'], epic_info['estimation_name']))
+            """, params)
             
-            task_records = cursor.fetchall()
-            
-            # Group by task_name
-            tasks_dict = {}
-            for record in task_records:
+            for record in cursor.fetchall():
+                tasks_dict = tasks_by_epic.setdefault((record['estimation_name'], record['epic_id']), {})
                 task_name = record['task_name']
                 if task_name not in tasks_dict:
                     tasks_dict[task_name] = {}
                 
-                platform_name = record['platform']
+                # Map legacy names ("Web Service" -> "API", "Designer" -> "CMS") for compatibility
+                platform_name = PLATFORM_ALIASES.get(record['platform'], record['platform'])
                 estimated_hour = record['estimated_hour']
                 
-                # Map "Web Service" to "API" for compatibility
-                if platform_name == "Web Service":
-                    platform_name = "API"
-                
-                # Map "Designer" to "CMS" for compatibility
-                if platform_name == "Designer":
-                    platform_name = "CMS"
-                
                 try:
                     # Try to match with Platform enum
                     platform = Platform(platform_name)
@@ -261,9 +326,19 @@ class MySQLKnowledgeBase:
                     logger.debug(f"Skipping unknown platform '{platform_name}' for task '{task_name}'")
                     continue
             
+            cursor.close()
+            conn.close()
+        
+        result_epics = []
+        for epic_info in epic_infos:
+            key = (epic_info['estimation_name'], epic_info['epic_id'])
+            if key in cache:
+                result_epics.append(cache[key].model_copy(deep=True, update={"similarity": epic_info['similarity']}))
+                continue
+            
             # Create Task objects
             tasks = []
-            for task_name, efforts in tasks_dict.items():
+            for task_name, efforts in tasks_by_epic.get(key, {}).items():
                 task = Task(
                     description=task_name,
                     efforts=efforts,
@@ -278,16 +353,54 @@ class MySQLKnowledgeBase:
                 description=f"From {epic_info['estimation_name']}",
                 tasks=tasks,
                 is_mandatory=False,
-                source_template=epic_info['estimation_name']
+                source_template=epic_info['estimation_name'],
+                kb_epic_id=epic_info['epic_id'],
+                similarity=epic_info['similarity']
             )
             
             result_epics.append(epic)
         
-        cursor.close()
-        conn.close()
-        
         return result_epics
     
+    def retrieve_similar_epics(
+        self, 
+        query_text: str, 
+        n_results: int = 3,
+        similarity_threshold: float = 0.4,
+        index: Optional[Dict] = None,
+        cache: Optional[Dict[Tuple[str, int], Epic]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> List[Epic]:
+        """
+        Retrieve similar epics based on query using vector similarity
+        
+        Args:
+            query_text: Search query text
+            n_results: Maximum number of epics to return
+            similarity_threshold: Minimum similarity score (0.0-1.0)
+            index: Preloaded load_epic_index() result (loaded if omitted)
+            cache: Already fetched epics by (estimation_name, epic_id)
+            query_embedding: Precomputed embedding of query_text (embedded if omitted)
+            
+        Returns:
+            List of Epic objects with tasks
+        """
+        logger.info(f"Searching for similar epics: '{query_text[:100]}'...")
+        
+        # Generate embedding for query
+        if query_embedding is None:
+            query_embedding = self.embed_query(query_text)
+        
+        if index is None:
+            index = self.load_epic_index()
+        
+        # Sort by similarity and limit results
+        epic_similarities = self.rank_epics(index, query_embedding, n_results, similarity_threshold)
+        
+        logger.info(f"Found {len(epic_similarities)} similar epics")
+        
+        return self.fetch_epics(epic_similarities, cache)
+    
     def get_epic_by_name(
         self, 
         epic_name: str, 
@@ -377,6 +490,189 @@ class MySQLKnowledgeBase:
         
         return epic
     
+    def get_task_platform_hours(self) -> Dict[tuple, Dict[Platform, float]]:
+        """
+        Get historical hours for every task, grouped across platforms.
+        
+        Returns:
+            Dict mapping (estimation_name, epic_id, task_name) -> {Platform: hours}
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        cursor.execute("""
+            SELECT estimation_name, epic_id, task_name, platform, estimated_hour
+            FROM json_embeddings
+        """)
+        
+        task_hours: Dict[tuple, Dict[Platform, float]] = {}
+        for record in cursor.fetchall():
+            platform_name = PLATFORM_ALIASES.get(record['platform'], record['platform'])
+            try:
+                platform = Platform(platform_name)
+            except ValueError:
+                continue
+            
+            key = (record['estimation_name'], record['epic_id'], record['task_name'])
+            task_hours.setdefault(key, {})[platform] = float(record['estimated_hour'])
+        
+        cursor.close()
+        conn.close()
+        
+        return task_hours
+    
+    def get_kb_version(self, cursor=None) -> str:
+        """
+        Get the current knowledge base version.
+        
+        Derived from the row count and highest row id, so any ingestion
+        (including clear + reload) produces a new version.
+        """
+        own_cursor = cursor is None
+        if own_cursor:
+            conn = self._get_connection()
+            cursor = conn.cursor(dictionary=True)
+        
+        cursor.execute("SELECT COUNT(*) AS row_count, COALESCE(MAX(id), 0) AS max_id FROM json_embeddings")
+        row = cursor.fetchone()
+        
+        if own_cursor:
+            cursor.close()
+            conn.close()
+        
+        return f"{row['row_count']}.{row['max_id']}"
+    
+    def _summary_version(self, cursor) -> str:
+        """Summaries depend on both the KB contents and the platform ratios used to adapt them."""
+        return f"{self.get_kb_version(cursor)}-{get_platform_adapter().version}"
+    
+    def build_epic_summaries(self) -> int:
+        """
+        Precompute compact prompt summaries for every KB epic.
+        
+        One summary is stored per epic and per target platform subset (efforts
+        adapted with the platform adapter, as at retrieval), keyed by epic id and
+        KB version. Existing summaries (of any version) are replaced.
+        
+        Returns:
+            Number of summaries stored
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS epic_summaries (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                estimation_name VARCHAR(500),
+                epic_id INT,
+                platforms VARCHAR(100),
+                kb_version VARCHAR(64),
+                summary TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_summary_lookup (kb_version, platforms, epic_id)
+            )
+        """)
+        
+        version = self._summary_version(cursor)
+        
+        cursor.execute("""
+            SELECT estimation_name, epic_id, epic_name, task_name, platform, estimated_hour
+            FROM json_embeddings
+            ORDER BY estimation_name, epic_id, task_name, platform
+        """)
+        
+        # Group rows into epics (same task grouping as retrieve_similar_epics)
+        epics: Dict[Tuple[str, int], Epic] = {}
+        tasks: Dict[Tuple[str, int], Dict[str, Dict[Platform, int]]] = {}
+        for record in cursor.fetchall():
+            key = (record['estimation_name'], record['epic_id'])
+            if key not in epics:
+                epics[key] = Epic(name=record['epic_name'], source_template=record['estimation_name'])
+                tasks[key] = {}
+            
+            platform_name = PLATFORM_ALIASES.get(record['platform'], record['platform'])
+            try:
+                platform = Platform(platform_name)
+            except ValueError:
+                continue
+            tasks[key].setdefault(record['task_name'], {})[platform] = int(float(record['estimated_hour']))
+        
+        subsets = [
+            list(subset)
+            for size in range(1, len(Platform) + 1)
+            for subset in combinations(list(Platform), size)
+        ]
+        adapter = get_platform_adapter()
+        
+        rows = []
+        for key, epic in epics.items():
+            for subset in subsets:
+                # Same adaptation as the retrieval node (adapter.adapt_epics), without per-epic logging
+                adapted_tasks = []
+                for task_name, efforts in tasks[key].items():
+                    adapted = adapter.adapt_efforts(efforts, subset)
+                    if adapted:
+                        adapted_tasks.append(Task(description=task_name, efforts=adapted, source=key[0], is_custom=False))
+                if adapted_tasks:
+                    summary = format_epic_summary(epic.model_copy(update={"tasks": adapted_tasks}))
+                    rows.append((key[0], key[1], _platforms_key(subset), version, summary))
+        
+        cursor.execute("DELETE FROM epic_summaries")
+        cursor.executemany("""
+            INSERT INTO epic_summaries (estimation_name, epic_id, platforms, kb_version, summary)
+            VALUES (%s, %s, %s, %s, %s)
+        """, rows)
+        conn.commit()
+        
+        cursor.close()
+        conn.close()
+        
+        logger.info(f"✓ Stored {len(rows)} epic summaries for {len(epics)} epics (version {version})")
+        return len(rows)
+    
+    def get_epic_summaries(
+        self,
+        keys: List[Tuple[str, int]],
+        platforms: List[Platform]
+    ) -> Dict[Tuple[str, int], str]:
+        """
+        Get precomputed summaries for retrieved epics.
+        
+        Args:
+            keys: (estimation_name, epic_id) of each epic
+            platforms: Project target platforms
+            
+        Returns:
+            Dict mapping (estimation_name, epic_id) -> summary for the current
+            KB version (epics without a stored summary are omitted)
+        """
+        if not keys:
+            return {}
+        
+        conn = self._get_connection()
+        cursor = conn.cursor(dictionary=True)
+        
+        version = self._summary_version(cursor)
+        epic_ids = sorted({epic_id for _, epic_id in keys})
+        placeholders = ", ".join(["%s"] * len(epic_ids))
+        cursor.execute(f"""
+            SELECT estimation_name, epic_id, summary
+            FROM epic_summaries
+            WHERE kb_version = %s AND platforms = %s AND epic_id IN ({placeholders})
+        """, (version, _platforms_key(platforms), *epic_ids))
+        
+        wanted = set(keys)
+        summaries = {}
+        for record in cursor.fetchall():
+            key = (record['estimation_name'], record['epic_id'])
+            if key in wanted:
+                summaries[key] = record['summary']
+        
+        cursor.close()
+        conn.close()
+        
+        return summaries
+    
     def get_stats(self) -> Dict:
         """Get statistics about the knowledge base"""
         conn = self._get_connection()
@@ -414,6 +710,11 @@ class MySQLKnowledgeBase:
         }
 
 
+def _platforms_key(platforms: List[Platform]) -> str:
+    """Canonical key for a platform subset (Platform enum order)."""
+    return ",".join(p.value for p in Platform if p in platforms)
+
+
 # Singleton instance
 _kb_instance = None
 
@@ -443,5 +744,12 @@ if __name__ == "__main__":
         stats = kb.get_stats()
         print(f"\n✓ Loaded {stats['total_epics']} epics from {stats['total_templates']} templates")
         print(f"✓ Templates: {', '.join(stats['templates'])}")
+    elif len(sys.argv) > 1 and sys.argv[1] == "summaries":
+        count = kb.build_epic_summaries()
+        print(f"✓ Stored {count} epic summaries")
+    elif len(sys.argv) > 1 and sys.argv[1] == "stats":
+        from .hour_statistics import build_hour_statistics
+        statistics = build_hour_statistics()
+        print(f"✓ Rebuilt hour statistics for KB {statistics.kb_version}")
     else:
-        print("Usage: python -m backend.app.services.mysql_knowledge_base init")
+        print("Usage: python -m backend.app.services.mysql_knowledge_base [init|summaries|stats]")
@@ -2,10 +2,14 @@
 
 import json
 import logging
-from typing import Dict, Any, Optional, List
-from openai import OpenAI
+import time
+from typing import Dict, Any, Optional, List, Callable, Tuple
+from openai import OpenAI, APIError, APIConnectionError, APITimeoutError, RateLimitError, InternalServerError
 
 from ..core.config import settings
+from .llm_cassette import get_cassette_store
+from .telemetry import record_llm_call
+from .model_router import get_model_router
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +19,17 @@ class OpenAIService:
     
     def __init__(self):
         """Initialize OpenAI client."""
-        self.client = OpenAI(api_key=settings.openai_api_key)
+        # Retries are handled by _create_with_retries so they can be counted in telemetry
+        self.client = OpenAI(
+            api_key=settings.openai_api_key,
+            max_retries=0,
+            timeout=settings.openai_timeout_seconds
+        )
         self.model = settings.openai_model
         self.embedding_model = settings.openai_embedding_model
         self.temperature = settings.openai_temperature
+        self.cassette = get_cassette_store()
+        self.router = get_model_router()
         
         logger.info(f"Initialized OpenAI service with model: {self.model}")
     
@@ -27,7 +38,10 @@ class OpenAIService:
         prompt: str,
         system_message: str = "You are a helpful assistant.",
         temperature: Optional[float] = None,
-        max_tokens: int = 8000
+        max_tokens: int = 8000,
+        role: Optional[str] = None,
+        on_progress: Optional[Callable[[str], None]] = None,
+        timeout: Optional[float] = None
     ) -> str:
         """
         Generate completion from OpenAI.
@@ -37,34 +51,206 @@ class OpenAIService:
             system_message: System message for context
             temperature: Sampling temperature (overrides default)
             max_tokens: Maximum tokens in response
+            role: Workflow role ("analysis", "modify", "generate", "repair") used to
+                pick the model chain from the router; None uses the default model
+            on_progress: If given, the response is streamed and this is called with
+                the text received so far after every chunk (restarting from the
+                beginning if a fallback model takes over)
+            timeout: Deadline-derived timeout in seconds for the whole model chain; a
+                timed-out call is not retried, and a fallback model only gets the time
+                left if that is at least settings.deadline_min_fallback_seconds
             
         Returns:
             Generated text
         """
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature or self.temperature,
-                max_tokens=max_tokens
+        models = self.router.models_for(role) if role else [self.model]
+        deadline_at = time.monotonic() + timeout if timeout is not None else None
+        
+        def remaining() -> Optional[float]:
+            return deadline_at - time.monotonic() if deadline_at is not None else None
+        
+        def can_fall_back(index: int) -> bool:
+            left = remaining()
+            return index + 1 < len(models) and (left is None or left >= settings.deadline_min_fallback_seconds)
+        
+        for index, model in enumerate(models):
+            try:
+                return self._chat_completion(
+                    model, prompt, system_message, temperature, max_tokens, on_progress, remaining()
+                )
+            except APITimeoutError as e:
+                if not can_fall_back(index):
+                    logger.error(f"OpenAI request timed out ({model}): {e}")
+                    raise
+                logger.warning(f"Model {model} timed out for role '{role}'. Falling back to {models[index + 1]}")
+            except APIError as e:
+                if not can_fall_back(index):
+                    logger.error(f"OpenAI API error: {e}")
+                    raise
+                logger.warning(f"Model {model} failed for role '{role}': {e}. Falling back to {models[index + 1]}")
+            except Exception as e:
+                logger.error(f"OpenAI API error: {e}")
+                raise
+    
+    def _chat_completion(
+        self,
+        model: str,
+        prompt: str,
+        system_message: str,
+        temperature: Optional[float],
+        max_tokens: int,
+        on_progress: Optional[Callable[[str], None]] = None,
+        timeout: Optional[float] = None
+    ) -> str:
+        """Run one chat completion against a specific model and record its telemetry."""
+        request = {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": temperature or self.temperature,
+            "max_tokens": max_tokens
+        }
+        if on_progress:
+            request["stream"] = True
+            request["stream_options"] = {"include_usage": True}
+        
+        retries = 0
+        streamed = False
+        
+        def count_retry() -> None:
+            nonlocal retries
+            retries += 1
+        
+        def call() -> Dict[str, Any]:
+            nonlocal streamed
+            # The timeout is not part of the request fingerprint (cassettes stay reusable)
+            options = {"timeout": timeout} if timeout is not None else {}
+            response, _ = self._create_with_retries(
+                lambda: self.client.chat.completions.create(**request, **options),
+                retry_timeouts=timeout is None,
+                on_retry=count_retry
             )
-            
-            content = response.choices[0].message.content
-            return content.strip()
-            
+            if on_progress:
+                streamed = True
+                return self._consume_stream(response, on_progress)
+            choice = response.choices[0]
+            return {
+                "content": choice.message.content,
+                "finish_reason": choice.finish_reason,
+                "usage": response.usage.model_dump() if response.usage else None
+            }
+        
+        start = time.perf_counter()
+        try:
+            result = self.cassette.call("chat", request, call)
         except Exception as e:
-            logger.error(f"OpenAI API error: {e}")
+            # Failed and timed-out calls are recorded too
+            record_llm_call(
+                kind="chat",
+                model=model,
+                latency_ms=(time.perf_counter() - start) * 1000,
+                retries=retries,
+                error=type(e).__name__
+            )
             raise
+        latency_ms = (time.perf_counter() - start) * 1000
+        
+        if on_progress and not streamed:
+            # Replayed from a cassette: deliver the whole response at once
+            on_progress(result["content"])
+        
+        # Record token usage, including prompt tokens served from the provider's prefix cache
+        # (kept local: the singleton service runs concurrent calls on several threads)
+        usage = self._usage_counts(result.get("usage"))
+        logger.info(
+            f"OpenAI usage ({model}): {usage['prompt_tokens']} prompt tokens "
+            f"({usage['cached_tokens']} cached), "
+            f"{usage['completion_tokens']} completion tokens, {latency_ms:.0f}ms"
+        )
+        record_llm_call(
+            kind="chat",
+            model=model,
+            latency_ms=latency_ms,
+            retries=retries,
+            finish_reason=result.get("finish_reason"),
+            **usage
+        )
+        
+        return result["content"].strip()
+    
+    @staticmethod
+    def _consume_stream(stream, on_progress: Callable[[str], None]) -> Dict[str, Any]:
+        """Read a streamed chat completion, reporting the accumulated text after each chunk."""
+        content = ""
+        finish_reason = None
+        usage = None
+        
+        for chunk in stream:
+            # With include_usage, the final chunk carries usage and no choices
+            if chunk.usage:
+                usage = chunk.usage.model_dump()
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.delta.content:
+                content += choice.delta.content
+                on_progress(content)
+            if choice.finish_reason:
+                finish_reason = choice.finish_reason
+        
+        return {"content": content, "finish_reason": finish_reason, "usage": usage}
+    
+    @staticmethod
+    def _create_with_retries(
+        create: Callable[[], Any],
+        retry_timeouts: bool = True,
+        on_retry: Optional[Callable[[], None]] = None
+    ) -> Tuple[Any, int]:
+        """
+        Call the OpenAI client, retrying transient errors with exponential backoff.
+        
+        Args:
+            create: Callable performing the API request
+            retry_timeouts: Whether timeouts count as transient (False for deadline-bound calls)
+            on_retry: Called before every retry, so retries are known even if the call fails
+        
+        Returns:
+            Tuple of (response, number of retries performed)
+        """
+        max_retries = settings.openai_max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                return create(), attempt
+            except (APIConnectionError, RateLimitError, InternalServerError) as e:
+                if attempt >= max_retries or (isinstance(e, APITimeoutError) and not retry_timeouts):
+                    raise
+                logger.warning(f"OpenAI transient error (attempt {attempt + 1}/{max_retries + 1}): {e}")
+                if on_retry:
+                    on_retry()
+                time.sleep(2 ** attempt)
+    
+    @staticmethod
+    def _usage_counts(usage: Optional[Dict[str, Any]]) -> Dict[str, int]:
+        """Extract token counts (including cached prompt tokens) from a usage payload."""
+        usage = usage or {}
+        details = usage.get("prompt_tokens_details") or {}
+        return {
+            "prompt_tokens": usage.get("prompt_tokens") or 0,
+            "completion_tokens": usage.get("completion_tokens") or 0,
+            "cached_tokens": details.get("cached_tokens") or 0,
+        }
     
     def generate_json_completion(
         self,
         prompt: str,
         system_message: str = "You are a helpful assistant that returns JSON.",
         temperature: Optional[float] = None,
-        max_tokens: int = 8000
+        max_tokens: int = 8000,
+        role: Optional[str] = None,
+        on_progress: Optional[Callable[[str], None]] = None,
+        timeout: Optional[float] = None
     ) -> Dict[str, Any]:
         """
         Generate JSON completion from OpenAI.
@@ -74,6 +260,9 @@ class OpenAIService:
             system_message: System message
             temperature: Sampling temperature
             max_tokens: Maximum tokens in response (default 8000 for large JSON outputs)
+            role: Workflow role used for model routing (see generate_completion)
+            on_progress: Streaming callback for the partial raw text (see generate_completion)
+            timeout: Deadline-derived timeout in seconds (see generate_completion)
             
         Returns:
             Parsed JSON dictionary
@@ -83,7 +272,10 @@ class OpenAIService:
                 prompt=prompt,
                 system_message=system_message,
                 temperature=temperature or 0.3,  # Lower temperature for structured output
-                max_tokens=max_tokens
+                max_tokens=max_tokens,
+                role=role,
+                on_progress=on_progress,
+                timeout=timeout
             )
             
             # Try to extract JSON from response
@@ -124,13 +316,7 @@ class OpenAIService:
             Embedding vector
         """
         try:
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
-            
-            embedding = response.data[0].embedding
-            return embedding
+            return self._embed(text)[0]
             
         except Exception as e:
             logger.error(f"Error creating embedding: {e}")
@@ -147,17 +333,51 @@ class OpenAIService:
             List of embedding vectors
         """
         try:
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=texts
-            )
-            
-            embeddings = [item.embedding for item in response.data]
-            return embeddings
+            return self._embed(texts)
             
         except Exception as e:
             logger.error(f"Error creating batch embeddings: {e}")
             raise
+    
+    def _embed(self, input_data) -> List[List[float]]:
+        """Run an embeddings request (single text or list) through the cassette layer."""
+        request = {"model": self.embedding_model, "input": input_data}
+        retries = 0
+        
+        def count_retry() -> None:
+            nonlocal retries
+            retries += 1
+        
+        def call() -> Dict[str, Any]:
+            response, _ = self._create_with_retries(
+                lambda: self.client.embeddings.create(**request),
+                on_retry=count_retry
+            )
+            return {
+                "embeddings": [item.embedding for item in response.data],
+                "usage": {"prompt_tokens": response.usage.prompt_tokens} if response.usage else None
+            }
+        
+        start = time.perf_counter()
+        try:
+            result = self.cassette.call("embedding", request, call)
+        except Exception as e:
+            record_llm_call(
+                kind="embedding",
+                model=request["model"],
+                latency_ms=(time.perf_counter() - start) * 1000,
+                retries=retries,
+                error=type(e).__name__
+            )
+            raise
+        record_llm_call(
+            kind="embedding",
+            model=request["model"],
+            latency_ms=(time.perf_counter() - start) * 1000,
+            prompt_tokens=(result.get("usage") or {}).get("prompt_tokens", 0),
+            retries=retries
+        )
+        return result["embeddings"]
 
 
 # Singleton instance
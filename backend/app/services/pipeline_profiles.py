@@ -0,0 +1,57 @@
+"""Pipeline profiles for the fast / standard / thorough estimation modes."""
+
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from ..core.config import settings
+from ..core.constants import PIPELINE_PROFILES
+from ..models.schemas import EstimationMode
+
+logger = logging.getLogger(__name__)
+
+# Written by backend/scripts/benchmark_profiles.py
+BENCHMARKS_PATH = Path(__file__).parent.parent / "data" / "profile_benchmarks.json"
+
+
+def get_pipeline_profile(mode: Union[EstimationMode, str, None] = None) -> Dict[str, Any]:
+    """
+    Get the pipeline profile for an estimation mode.
+
+    Settings-backed values (None in PIPELINE_PROFILES) are resolved, so nodes
+    can read every key directly.
+
+    Args:
+        mode: Estimation mode (defaults to standard)
+
+    Returns:
+        Profile dict (a copy, safe to modify)
+    """
+    mode = EstimationMode(mode or EstimationMode.STANDARD)
+    profile = dict(PIPELINE_PROFILES[mode.value])
+    profile["mode"] = mode.value
+    if profile["generate_max_tokens"] is None:
+        profile["generate_max_tokens"] = settings.generate_max_tokens
+    return profile
+
+
+def load_profile_benchmarks(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load the latest benchmark results per mode.
+
+    Args:
+        path: Benchmarks JSON path (defaults to app/data/profile_benchmarks.json)
+
+    Returns:
+        Benchmarks dict, empty if the benchmark has not been run yet
+    """
+    benchmarks_path = Path(path) if path else BENCHMARKS_PATH
+    if not benchmarks_path.exists():
+        return {}
+    try:
+        with open(benchmarks_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid profile benchmarks file {benchmarks_path}: {e}")
+        return {}
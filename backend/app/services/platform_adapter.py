@@ -0,0 +1,202 @@
+"""Deterministic platform adaptation of historical epics."""
+
+import hashlib
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from statistics import median
+from typing import Dict, List, Tuple
+
+from ..core.constants import PLATFORM_EQUIVALENCES
+from ..models.schemas import Epic, Platform
+
+logger = logging.getLogger(__name__)
+
+# Minimum number of tasks carrying both platforms before a learned ratio replaces the default
+MIN_RATIO_SAMPLES = 20
+
+
+class PlatformAdapter:
+    """
+    Translates task efforts from the platforms a KB epic was estimated for to
+    the project's target platforms.
+
+    A missing target platform is derived from the first available equivalent
+    source platform, scaled by its hour factor (e.g. Web App -> Flutter x1.0);
+    platforms outside the target set are dropped.
+    """
+
+    def __init__(self, config_path: str = None):
+        """
+        Initialize the adapter.
+
+        Args:
+            config_path: Path to learned ratios JSON, defaults to app/data/platform_ratios.json
+                (PLATFORM_EQUIVALENCES is used when the file doesn't exist)
+        """
+        if config_path is None:
+            config_path = Path(__file__).parent.parent / "data" / "platform_ratios.json"
+
+        self.config_path = Path(config_path)
+        self.equivalences = self._load_equivalences()
+        # Changes whenever the ratios change (keys precomputed adapted summaries)
+        self.version = hashlib.sha256(json.dumps(
+            {t.value: [(s.value, f) for s, f in sources] for t, sources in self.equivalences.items()},
+            sort_keys=True
+        ).encode("utf-8")).hexdigest()[:8]
+
+    def _load_equivalences(self) -> Dict[Platform, List[Tuple[Platform, float]]]:
+        """Load equivalences from the learned ratios file, falling back to defaults."""
+        raw = PLATFORM_EQUIVALENCES
+        if self.config_path.exists():
+            try:
+                with open(self.config_path, 'r') as f:
+                    raw = json.load(f)["equivalences"]
+                logger.info(f"Loaded learned platform ratios from {self.config_path}")
+            except (json.JSONDecodeError, KeyError) as e:
+                logger.error(f"Invalid platform ratios file {self.config_path}: {e}, using defaults")
+                raw = PLATFORM_EQUIVALENCES
+
+        return {
+            Platform(target): [(Platform(source), float(factor)) for source, factor in sources]
+            for target, sources in raw.items()
+        }
+
+    def adapt_efforts(
+        self,
+        efforts: Dict[Platform, int],
+        target_platforms: List[Platform]
+    ) -> Dict[Platform, int]:
+        """
+        Adapt one task's efforts to the target platforms.
+
+        Args:
+            efforts: Historical hours per platform
+            target_platforms: Project target platforms
+
+        Returns:
+            Hours for target platforms only (may be empty)
+        """
+        adapted = {}
+        for platform in target_platforms:
+            if platform in efforts:
+                adapted[platform] = efforts[platform]
+                continue
+
+            for source, factor in self.equivalences.get(platform, []):
+                if source in efforts:
+                    adapted[platform] = max(1, round(efforts[source] * factor))
+                    break
+
+        return adapted
+
+    def adapt_epics(self, epics: List[Epic], target_platforms: List[Platform]) -> List[Epic]:
+        """
+        Adapt epics to the target platforms (in place).
+
+        Args:
+            epics: Epics retrieved from the knowledge base
+            target_platforms: Project target platforms
+
+        Returns:
+            Epics with at least one task left after adaptation
+        """
+        adapted_epics = []
+        for epic in epics:
+            adapted_tasks = []
+            translated = 0
+            for task in epic.tasks:
+                efforts = self.adapt_efforts(task.efforts, target_platforms)
+                translated += len(set(efforts) - set(task.efforts))
+                if efforts:
+                    task.efforts = efforts
+                    adapted_tasks.append(task)
+
+            if adapted_tasks:
+                epic.tasks = adapted_tasks
+                adapted_epics.append(epic)
+                logger.info(f"  ✓ {epic.name}: {len(adapted_tasks)} tasks ({translated} platform efforts translated)")
+            else:
+                logger.info(f"  ✗ {epic.name}: Excluded (no tasks for target platforms)")
+
+        return adapted_epics
+
+
+def learn_platform_ratios(task_hours: Dict[tuple, Dict[Platform, float]]) -> Dict:
+    """
+    Learn hour-scaling factors between platforms from historical tasks.
+
+    For every (target, source) pair, the factor is the median of target/source
+    hours over tasks estimated for both. Pairs with fewer than MIN_RATIO_SAMPLES
+    samples keep the default factor; sources are ordered by sample count.
+
+    Args:
+        task_hours: Output of MySQLKnowledgeBase.get_task_platform_hours()
+
+    Returns:
+        JSON-serializable dict with "equivalences" and "samples"
+    """
+    ratios: Dict[Tuple[str, str], List[float]] = {}
+    for efforts in task_hours.values():
+        for target, target_hours in efforts.items():
+            for source, source_hours in efforts.items():
+                if source != target and source_hours > 0 and target_hours > 0:
+                    ratios.setdefault((target.value, source.value), []).append(target_hours / source_hours)
+
+    equivalences = {}
+    samples = {}
+    for target, default_sources in PLATFORM_EQUIVALENCES.items():
+        sources = []
+        for source, default_factor in default_sources:
+            pair_ratios = ratios.get((target, source), [])
+            factor = round(median(pair_ratios), 2) if len(pair_ratios) >= MIN_RATIO_SAMPLES else default_factor
+            sources.append((source, factor, len(pair_ratios)))
+            samples[f"{source}->{target}"] = len(pair_ratios)
+
+        sources.sort(key=lambda item: item[2], reverse=True)
+        equivalences[target] = [[source, factor] for source, factor, _ in sources]
+
+    return {
+        "learned_at": datetime.now().isoformat(),
+        "equivalences": equivalences,
+        "samples": samples,
+    }
+
+
+# Singleton instance
+_platform_adapter = None
+
+
+def get_platform_adapter() -> PlatformAdapter:
+    """Get singleton instance of PlatformAdapter."""
+    global _platform_adapter
+    if _platform_adapter is None:
+        _platform_adapter = PlatformAdapter()
+    return _platform_adapter
+
+
+# CLI for learning ratios from the knowledge base
+if __name__ == "__main__":
+    import sys
+
+    from .mysql_knowledge_base import get_knowledge_base
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(levelname)s:%(name)s:%(message)s'
+    )
+
+    if len(sys.argv) > 1 and sys.argv[1] == "learn":
+        adapter = PlatformAdapter()
+        learned = learn_platform_ratios(get_knowledge_base().get_task_platform_hours())
+
+        adapter.config_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(adapter.config_path, 'w') as f:
+            json.dump(learned, f, indent=2)
+
+        print(f"✓ Wrote platform ratios to {adapter.config_path}")
+        for target, sources in learned["equivalences"].items():
+            print(f"  {target}: {', '.join(f'{s} x{factor}' for s, factor in sources) or '(none)'}")
+    else:
+        print("Usage: python -m backend.app.services.platform_adapter learn")
@@ -0,0 +1,167 @@
+"""Token-budgeted assembly of generation prompt sections."""
+
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Rough characters-per-token ratio used when the tokenizer is unavailable
+APPROX_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def _get_encoding(model: str):
+    """Load the tokenizer for a model (None if tiktoken or its encoding files are unavailable)."""
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken not installed, approximating token counts")
+        return None
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Encoding files are downloaded on first use; offline hosts fall back to the estimate
+        logger.warning(f"Could not load tokenizer for {model}, approximating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count tokens in text with the model's tokenizer.
+
+    Args:
+        text: Text to count
+        model: Model name (defaults to settings.openai_model)
+
+    Returns:
+        Token count (approximated from length when no tokenizer is available)
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding(model or settings.openai_model)
+    if encoding is None:
+        return len(text) // APPROX_CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+class PromptBudget:
+    """
+    Fits variable prompt sections into a token budget.
+
+    The budget is the total prompt window minus the fixed instructions and the
+    tokens reserved for the response. What remains is split across sections by
+    share; sections that need less than their share give the rest to the
+    others. Each section's items must be ordered most important first (e.g.
+    retrieved epics by similarity), so trimming drops the least relevant ones.
+    """
+
+    def __init__(
+        self,
+        total_tokens: Optional[int] = None,
+        reserved_output_tokens: Optional[int] = None,
+        model: Optional[str] = None
+    ):
+        """
+        Initialize the budget.
+
+        Args:
+            total_tokens: Prompt + response budget (defaults to settings.prompt_budget_tokens)
+            reserved_output_tokens: Tokens kept free for the response
+                (defaults to settings.generate_max_tokens)
+            model: Model whose tokenizer is used for counting
+        """
+        self.total_tokens = total_tokens or settings.prompt_budget_tokens
+        self.reserved_output_tokens = (
+            settings.generate_max_tokens if reserved_output_tokens is None else reserved_output_tokens
+        )
+        self.model = model
+
+    def fit(
+        self,
+        instructions: str,
+        sections: Dict[str, List[str]],
+        shares: Dict[str, float]
+    ) -> Tuple[Dict[str, List[str]], Dict[str, Dict[str, int]]]:
+        """
+        Trim section items to fit the budget.
+
+        Args:
+            instructions: Fixed prompt text that is always sent in full
+            sections: Section name -> rendered items, most important first
+            shares: Section name -> relative share of the remaining budget
+
+        Returns:
+            (kept items per section, per-section budget breakdown)
+        """
+        instruction_tokens = count_tokens(instructions, self.model)
+        available = max(self.total_tokens - self.reserved_output_tokens - instruction_tokens, 0)
+
+        item_tokens = {
+            name: [count_tokens(item, self.model) + 1 for item in items]  # +1 for the separator
+            for name, items in sections.items()
+        }
+        needed = {name: sum(tokens) for name, tokens in item_tokens.items()}
+
+        # Sections that fit in their share are granted in full and their
+        # leftover is redistributed, until every remaining section overflows
+        allocation: Dict[str, int] = {}
+        pending = [name for name in sections if needed[name] > 0]
+        remaining = available
+        while pending:
+            total_share = sum(shares.get(name, 1.0) for name in pending)
+            fitting = [
+                name for name in pending
+                if needed[name] <= remaining * shares.get(name, 1.0) / total_share
+            ]
+            if not fitting:
+                for name in pending:
+                    allocation[name] = int(remaining * shares.get(name, 1.0) / total_share)
+                break
+            for name in fitting:
+                allocation[name] = needed[name]
+                remaining -= needed[name]
+                pending.remove(name)
+
+        kept: Dict[str, List[str]] = {}
+        breakdown: Dict[str, Dict[str, int]] = {
+            "instructions": {"tokens": instruction_tokens},
+            "reserved_output": {"tokens": self.reserved_output_tokens},
+        }
+        for name, items in sections.items():
+            budget = allocation.get(name, 0)
+            used = 0
+            kept[name] = []
+            for item, tokens in zip(items, item_tokens[name]):
+                if used + tokens > budget:
+                    break
+                kept[name].append(item)
+                used += tokens
+            breakdown[name] = {
+                "budget": budget,
+                "tokens": used,
+                "items": len(kept[name]),
+                "dropped": len(items) - len(kept[name]),
+            }
+
+        total_used = instruction_tokens + sum(b.get("tokens", 0) for n, b in breakdown.items() if n in sections)
+        logger.info(
+            f"Prompt budget {self.total_tokens} tokens: {total_used} prompt + "
+            f"{self.reserved_output_tokens} reserved output"
+        )
+        for name, stats in breakdown.items():
+            if name in sections:
+                logger.info(
+                    f"  {name}: {stats['tokens']}/{stats['budget']} tokens, "
+                    f"{stats['items']} items ({stats['dropped']} trimmed)"
+                )
+            else:
+                logger.info(f"  {name}: {stats['tokens']} tokens")
+
+        return kept, breakdown
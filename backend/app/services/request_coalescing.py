@@ -0,0 +1,142 @@
+"""Single-flight coalescing of identical estimation requests and Idempotency-Key replay."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from ..core.config import settings
+from ..models.schemas import ProjectRequirement
+
+logger = logging.getLogger(__name__)
+
+
+def requirement_fingerprint(requirement: ProjectRequirement, previous_estimation_id: Optional[str] = None) -> str:
+    """
+    Key of an estimation request: its canonical requirement JSON (mode included) and incremental base.
+
+    Returns:
+        sha256 hex digest
+    """
+    payload = {
+        "requirement": requirement.model_dump(mode="json"),
+        "previous_estimation_id": previous_estimation_id,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time.
+
+    Callers arriving while a call with their key is running await that
+    call's outcome (result or exception) instead of starting their own. The
+    call runs as its own task, so a caller disconnecting does not cancel it
+    for the others. Used from the event loop only, so no locking is needed.
+    """
+
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run call, or attach to the running call with the same key.
+
+        Args:
+            key: Coalescing key
+            call: Starts the work (only invoked when no call with this key is running)
+
+        Returns:
+            (result, whether it was shared from an already running call)
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if not shared:
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            logger.info(f"✓ Attached to the running estimation {key[:12]}")
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: str, task: asyncio.Task) -> None:
+        """Forget a completed call (and mark its exception retrieved, its waiters may all be gone)."""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()
+
+
+class IdempotencyKeyReused(ValueError):
+    """An Idempotency-Key was sent again with a different request."""
+
+
+class IdempotencyStore:
+    """
+    Successful responses by Idempotency-Key, replayed to retries of the same request.
+
+    Records expire after settings.idempotency_ttl_seconds; beyond
+    settings.idempotency_max_entries the least recently stored are dropped.
+    Failed requests are not recorded, so retrying them runs them again.
+    """
+
+    def __init__(self):
+        """Initialize an empty store."""
+        self._lock = threading.Lock()
+        self._records: "OrderedDict[str, Tuple[str, float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """
+        Recorded response of a key.
+
+        Raises:
+            IdempotencyKeyReused if the key was recorded for a different request
+        """
+        with self._lock:
+            record = self._records.get(key)
+            if record is None:
+                return None
+            recorded_fingerprint, expires_at, response = record
+            if expires_at < time.monotonic():
+                del self._records[key]
+                return None
+        if recorded_fingerprint != fingerprint:
+            raise IdempotencyKeyReused(f"Idempotency-Key {key} was already used for a different request")
+        return response
+
+    def put(self, key: str, fingerprint: str, response: Dict[str, Any]) -> None:
+        """Record the response of a key."""
+        with self._lock:
+            self._records[key] = (fingerprint, time.monotonic() + settings.idempotency_ttl_seconds, response)
+            self._records.move_to_end(key)
+            while len(self._records) > settings.idempotency_max_entries:
+                self._records.popitem(last=False)
+
+
+# Singleton instances
+_single_flight: Optional[SingleFlight] = None
+_idempotency_store: Optional[IdempotencyStore] = None
+_singletons_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Get or create the single-flight singleton."""
+    global _single_flight
+    with _singletons_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """Get or create the idempotency store singleton."""
+    global _idempotency_store
+    with _singletons_lock:
+        if _idempotency_store is None:
+            _idempotency_store = IdempotencyStore()
+        return _idempotency_store
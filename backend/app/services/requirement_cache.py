@@ -0,0 +1,232 @@
+"""Semantic cache of estimation runs, reused by near-duplicate requirement briefs."""
+
+import hashlib
+import json
+import logging
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.schemas import AnalyzedRequirement, Epic, ProjectEstimation, ProjectRequirement
+
+logger = logging.getLogger(__name__)
+
+
+def requirement_text(requirement: ProjectRequirement) -> str:
+    """Text embedded to compare briefs: the description and any additional context."""
+    return "\n\n".join(part.strip() for part in (requirement.description, requirement.additional_context) if part)
+
+
+class RequirementCache:
+    """
+    File-based store of past runs keyed by requirement embedding.
+
+    Each entry (one JSON file) holds a run's analysis, retrieval results and
+    final estimation. All entry embeddings are kept in memory as one matrix,
+    so a lookup is a single matrix product. Entries only match requests with
+    the same mode and KB version, since both change the retrieval results.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        """
+        Initialize the cache, loading the embeddings of all stored entries.
+
+        Args:
+            cache_dir: Directory holding entry files (defaults to settings.requirement_cache_dir)
+        """
+        self.cache_dir = Path(cache_dir or settings.requirement_cache_dir)
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []  # id, mode, kb_version, stored_at
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+
+        for path in sorted(self.cache_dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                self._add(entry)
+            except (OSError, json.JSONDecodeError, KeyError) as e:
+                logger.warning(f"Skipping unreadable requirement cache entry {path.name}: {e}")
+        if self._entries:
+            logger.info(f"Loaded {len(self._entries)} requirement cache entries from {self.cache_dir}")
+
+    def _add(self, entry: Dict[str, Any]) -> None:
+        """Index an entry's embedding (replacing an entry with the same id)."""
+        self._remove(entry["id"])
+        vector = np.asarray(entry["embedding"], dtype=np.float32)
+        vector /= np.linalg.norm(vector)
+        self._matrix = np.vstack([self._matrix, vector]) if len(self._matrix) else vector[None, :]
+        self._entries.append({key: entry[key] for key in ("id", "mode", "kb_version", "stored_at")})
+
+    def _remove(self, entry_id: str) -> None:
+        """Drop an entry from the index."""
+        rows = [i for i, entry in enumerate(self._entries) if entry["id"] == entry_id]
+        if rows:
+            self._matrix = np.delete(self._matrix, rows, axis=0)
+            self._entries = [entry for i, entry in enumerate(self._entries) if i not in rows]
+
+    def lookup(self, embedding: List[float], mode: str, kb_version: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the most similar stored run above settings.requirement_cache_similarity.
+
+        Args:
+            embedding: Embedding of the new request's requirement_text
+            mode: Estimation mode of the new request
+            kb_version: Current KB version
+
+        Returns:
+            Entry with analyzed_requirement, retrieved_epics (Epic objects),
+            uncovered_categories, category_embeddings, estimation and the
+            match's similarity, or None
+        """
+        with self._lock:
+            if not self._entries:
+                return None
+            query = np.asarray(embedding, dtype=np.float32)
+            similarities = self._matrix @ (query / np.linalg.norm(query))
+            eligible = np.array([e["mode"] == mode and e["kb_version"] == kb_version for e in self._entries])
+            similarities[~eligible] = -1
+            best = int(np.argmax(similarities))
+            if similarities[best] < settings.requirement_cache_similarity:
+                return None
+            entry_id = self._entries[best]["id"]
+
+        entry = self.get(entry_id)
+        if entry:
+            entry["similarity"] = round(float(similarities[best]), 4)
+        return entry
+
+    def get(self, entry_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a stored run by id (see EstimationStore's cache_entry_id).
+
+        Returns:
+            Entry as returned by lookup (without similarity), or None if unknown
+        """
+        path = self.cache_dir / f"{entry_id}.json"
+        if not entry_id.isalnum() or not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Requirement cache entry {entry_id} unreadable: {e}")
+            return None
+
+        return {
+            "id": entry_id,
+            "project_name": entry["project_name"],
+            "stored_at": entry["stored_at"],
+            "kb_version": entry["kb_version"],
+            "mode": entry["mode"],
+            "analyzed_requirement": AnalyzedRequirement(**entry["analyzed_requirement"]),
+            # kb_epic_id / similarity are excluded from Epic dumps, so they are stored alongside
+            "retrieved_epics": [
+                Epic(**item["epic"]).model_copy(update={"kb_epic_id": item["kb_epic_id"], "similarity": item["similarity"]})
+                for item in entry["retrieved_epics"]
+            ],
+            "uncovered_categories": entry["uncovered_categories"],
+            "category_embeddings": entry["category_embeddings"],
+            "estimation": ProjectEstimation(**entry["estimation"]),
+        }
+
+    def store(
+        self,
+        requirement: ProjectRequirement,
+        embedding: List[float],
+        kb_version: str,
+        analyzed_requirement: AnalyzedRequirement,
+        retrieved_epics: List[Epic],
+        uncovered_categories: Optional[Dict[str, List[str]]],
+        category_embeddings: Optional[Dict[str, List[float]]],
+        estimation: ProjectEstimation
+    ) -> str:
+        """
+        Store a completed run (an identical brief in the same mode replaces its earlier entry).
+
+        Returns:
+            Entry id
+        """
+        entry_id = hashlib.sha256(
+            f"{requirement.mode.value}\n{requirement_text(requirement)}".encode("utf-8")
+        ).hexdigest()[:24]
+        entry = {
+            "id": entry_id,
+            "mode": requirement.mode.value,
+            "kb_version": kb_version,
+            "stored_at": datetime.now().isoformat(),
+            "project_name": requirement.project_name,
+            "embedding": list(embedding),
+            "analyzed_requirement": analyzed_requirement.model_dump(mode="json"),
+            "retrieved_epics": [
+                {"epic": epic.model_dump(mode="json"), "kb_epic_id": epic.kb_epic_id, "similarity": epic.similarity}
+                for epic in retrieved_epics
+            ],
+            "uncovered_categories": uncovered_categories or {},
+            "category_embeddings": category_embeddings or {},
+            "estimation": estimation.model_dump(mode="json"),
+        }
+
+        with self._lock:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_dir / f"{entry_id}.json", "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            self._add(entry)
+
+            # Evict the oldest entries beyond the configured size
+            while len(self._entries) > settings.requirement_cache_max_entries:
+                oldest = min(self._entries, key=lambda e: e["stored_at"])
+                self._remove(oldest["id"])
+                (self.cache_dir / f"{oldest['id']}.json").unlink(missing_ok=True)
+
+        logger.info(f"✓ Stored requirement cache entry {entry_id} for {requirement.project_name}")
+        return entry_id
+
+
+def find_cached_run(
+    requirement: ProjectRequirement
+) -> Tuple[Optional[Dict[str, Any]], Optional[List[float]], Optional[str]]:
+    """
+    Look up a stored run for a near-duplicate brief.
+
+    Returns:
+        (matching entry or None, requirement embedding, KB version); the
+        embedding and version are reused to store the new run. All None when
+        the cache is disabled or unavailable.
+    """
+    if not settings.requirement_cache_enabled:
+        return None, None, None
+    try:
+        from .mysql_knowledge_base import get_knowledge_base
+
+        kb = get_knowledge_base()
+        embedding = kb.embed_query(requirement_text(requirement))
+        kb_version = kb.get_kb_version()
+        entry = get_requirement_cache().lookup(embedding, requirement.mode.value, kb_version)
+    except Exception as e:
+        logger.warning(f"Requirement cache unavailable: {e}")
+        return None, None, None
+
+    if entry:
+        logger.info(
+            f"✓ Requirement cache hit: '{entry['project_name']}' ({entry['stored_at']}), "
+            f"similarity {entry['similarity']}"
+        )
+    return entry, embedding, kb_version
+
+
+# Singleton instance
+_requirement_cache: Optional[RequirementCache] = None
+_requirement_cache_lock = threading.Lock()
+
+
+def get_requirement_cache() -> RequirementCache:
+    """Get or create the requirement cache singleton."""
+    global _requirement_cache
+    with _requirement_cache_lock:
+        if _requirement_cache is None:
+            _requirement_cache = RequirementCache()
+        return _requirement_cache
@@ -0,0 +1,215 @@
+"""Per-call and per-node LLM telemetry for estimation jobs."""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from ..core.config import settings
+from ..core.constants import MODEL_PRICING
+
+logger = logging.getLogger(__name__)
+
+# Active recorder and workflow node for the current estimation job.
+# Set by run_estimation_workflow / instrument_node and read by the OpenAI call sites.
+_current_recorder: ContextVar[Optional["TelemetryRecorder"]] = ContextVar("telemetry_recorder", default=None)
+_current_node: ContextVar[Optional[str]] = ContextVar("telemetry_node", default=None)
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    """
+    Estimate the USD cost of a call from MODEL_PRICING.
+
+    Args:
+        model: Model name (dated snapshots match their family prefix)
+        prompt_tokens: Total prompt tokens (including cached)
+        cached_tokens: Prompt tokens served from the prefix cache
+        completion_tokens: Output tokens
+
+    Returns:
+        Cost in USD (0.0 for unknown models)
+    """
+    matches = [name for name in MODEL_PRICING if model.startswith(name)]
+    if not matches:
+        return 0.0
+
+    input_price, cached_price, output_price = MODEL_PRICING[max(matches, key=len)]
+    uncached_tokens = max(prompt_tokens - cached_tokens, 0)
+    cost = (
+        uncached_tokens * input_price
+        + cached_tokens * cached_price
+        + completion_tokens * output_price
+    ) / 1_000_000
+    return round(cost, 6)
+
+
+class TelemetryRecorder:
+    """Collects LLM/embedding call records and node timings for one estimation job."""
+
+    def __init__(self, job_id: Optional[str] = None):
+        """
+        Initialize the recorder.
+
+        Args:
+            job_id: Estimation job identifier (generated if omitted)
+        """
+        self.job_id = job_id or uuid.uuid4().hex
+        self.started_at = datetime.now()
+        self.calls: List[Dict[str, Any]] = []
+        self.node_wall_ms: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def record_call(self, record: Dict[str, Any]) -> None:
+        """Add a single LLM/embedding call record."""
+        with self._lock:
+            self.calls.append(record)
+
+    def record_node(self, node: str, wall_ms: float) -> None:
+        """Accumulate wall time spent in a workflow node (summed across retries)."""
+        with self._lock:
+            self.node_wall_ms[node] = self.node_wall_ms.get(node, 0.0) + wall_ms
+
+    def summary(self, include_calls: bool = True) -> Dict[str, Any]:
+        """
+        Aggregate the recorded calls.
+
+        Args:
+            include_calls: Whether to include the individual call records
+
+        Returns:
+            Dict with totals, per-node and per-model aggregates
+        """
+        with self._lock:
+            calls = list(self.calls)
+            node_wall_ms = dict(self.node_wall_ms)
+
+        def aggregate(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+            return {
+                "calls": len(records),
+                "prompt_tokens": sum(r["prompt_tokens"] for r in records),
+                "completion_tokens": sum(r["completion_tokens"] for r in records),
+                "cached_tokens": sum(r["cached_tokens"] for r in records),
+                "latency_ms": round(sum(r["latency_ms"] for r in records), 1),
+                "retries": sum(r["retries"] for r in records),
+                "errors": sum(1 for r in records if r.get("error")),
+                "cost_usd": round(sum(r["cost_usd"] for r in records), 6),
+            }
+
+        by_node: Dict[str, Any] = {}
+        for node in dict.fromkeys([r["node"] or "unknown" for r in calls] + list(node_wall_ms)):
+            node_stats = aggregate([r for r in calls if (r["node"] or "unknown") == node])
+            node_stats["wall_ms"] = round(node_wall_ms.get(node, 0.0), 1)
+            by_node[node] = node_stats
+
+        by_model = {
+            model: aggregate([r for r in calls if r["model"] == model])
+            for model in dict.fromkeys(r["model"] for r in calls)
+        }
+
+        result = {
+            "job_id": self.job_id,
+            "started_at": self.started_at.isoformat(),
+            "total": aggregate(calls),
+            "by_node": by_node,
+            "by_model": by_model,
+        }
+        if include_calls:
+            result["calls"] = calls
+        return result
+
+    def persist(self, path: Optional[str] = None) -> None:
+        """Append the job summary as one JSON line to the telemetry log."""
+        log_path = Path(path or settings.telemetry_log_path)
+        try:
+            log_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(self.summary(), ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"Failed to persist telemetry for job {self.job_id}: {e}")
+
+
+@contextmanager
+def telemetry_scope(recorder: TelemetryRecorder):
+    """Make a recorder the active one for all calls made inside the block."""
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+def get_current_recorder() -> Optional[TelemetryRecorder]:
+    """Return the active recorder, if any."""
+    return _current_recorder.get()
+
+
+def get_current_node() -> Optional[str]:
+    """Return the workflow node currently executing, if any."""
+    return _current_node.get()
+
+
+def instrument_node(name: str, node_fn: Callable[[Dict[str, Any]], Dict[str, Any]]):
+    """
+    Wrap a LangGraph node so calls made inside it are tagged with the node name
+    and its wall time is recorded.
+    """
+    @wraps(node_fn)
+    def wrapper(state: Dict[str, Any]) -> Dict[str, Any]:
+        token = _current_node.set(name)
+        start = time.perf_counter()
+        try:
+            return node_fn(state)
+        finally:
+            wall_ms = (time.perf_counter() - start) * 1000
+            _current_node.reset(token)
+            recorder = _current_recorder.get()
+            if recorder is not None:
+                recorder.record_node(name, wall_ms)
+            logger.info(f"Node '{name}' finished in {wall_ms:.0f}ms")
+
+    return wrapper
+
+
+def record_llm_call(
+    kind: str,
+    model: str,
+    latency_ms: float,
+    prompt_tokens: int = 0,
+    completion_tokens: int = 0,
+    cached_tokens: int = 0,
+    retries: int = 0,
+    finish_reason: Optional[str] = None,
+    error: Optional[str] = None
+) -> None:
+    """
+    Record one LLM or embedding call against the active recorder.
+
+    Failed calls are recorded too, with the exception type as error.
+    No-op when no estimation job is active (e.g. CLI ingestion).
+    """
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return
+
+    recorder.record_call({
+        "job_id": recorder.job_id,
+        "node": _current_node.get(),
+        "kind": kind,
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "latency_ms": round(latency_ms, 1),
+        "retries": retries,
+        "finish_reason": finish_reason,
+        "error": error,
+        "cost_usd": estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens),
+        "timestamp": datetime.now().isoformat(),
+    })
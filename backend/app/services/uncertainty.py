@@ -0,0 +1,100 @@
+"""Bootstrap confidence intervals for estimation totals."""
+
+import logging
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..core.config import settings
+from ..models.schemas import ProjectEstimation
+from .hour_statistics import PLATFORM_ORDER, HourStatistics, get_hour_statistics
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (50, 80, 95)
+
+
+def _percentile_dict(values: np.ndarray) -> Dict[str, int]:
+    """{"p50": .., "p80": .., "p95": ..} of a (replicates,) array, rounded to whole hours."""
+    return {
+        f"p{q}": int(round(float(value)))
+        for q, value in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+    }
+
+
+def bootstrap_intervals(
+    estimation: ProjectEstimation,
+    statistics: Optional[HourStatistics] = None,
+    replicates: Optional[int] = None,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """
+    Percentile ranges of the total hours, per platform and per epic.
+
+    Each replicate multiplies every task's hours by a ratio drawn from the
+    historical spread of KB task hours around their task name's median (see
+    HourStatistics.hour_ratios), so a task estimated at 10h may come out at 7h
+    or 16h as often as comparable past tasks did. All replicates are drawn
+    as one (replicates, tasks) array per platform and summed per epic with a
+    matrix product, which keeps a recompute after a manual edit in the
+    millisecond range. Platforms without historical ratios keep their point
+    hours.
+
+    Args:
+        estimation: Estimation to compute ranges for (edited hours included)
+        statistics: Hour statistics (defaults to the saved KB statistics)
+        replicates: Bootstrap replicates (defaults to settings.bootstrap_replicates)
+        seed: Random seed, fixed so unchanged hours give unchanged ranges
+
+    Returns:
+        Dict with replicates, total, by_platform ({platform: percentiles}) and
+        epics (percentiles per epic, in estimation.epics order)
+    """
+    statistics = statistics or get_hour_statistics()
+    replicates = replicates or settings.bootstrap_replicates
+    rng = np.random.default_rng(seed)
+
+    epics = estimation.epics
+    total = np.zeros(replicates)
+    epic_totals = np.zeros((replicates, len(epics)))
+    by_platform: Dict[str, Dict[str, int]] = {}
+
+    for platform in PLATFORM_ORDER:
+        hours: List[float] = []
+        epic_of_task: List[int] = []
+        for e, epic in enumerate(epics):
+            for task in epic.tasks:
+                if platform in task.efforts:
+                    hours.append(task.efforts[platform])
+                    epic_of_task.append(e)
+        if not hours:
+            continue
+
+        pool = statistics.hour_ratios(platform)
+        if len(pool):
+            ratios = pool[rng.integers(0, len(pool), size=(replicates, len(hours)))]
+        else:
+            ratios = np.ones((replicates, len(hours)), dtype=np.float32)
+        samples = ratios * np.asarray(hours, dtype=np.float32)
+
+        membership = np.zeros((len(hours), len(epics)), dtype=np.float32)
+        membership[np.arange(len(hours)), epic_of_task] = 1
+        epic_totals += samples @ membership
+
+        platform_total = samples.sum(axis=1)
+        total += platform_total
+        by_platform[platform.value] = _percentile_dict(platform_total)
+
+    epic_percentiles = np.percentile(epic_totals, PERCENTILES, axis=0) if len(epics) else np.zeros((len(PERCENTILES), 0))
+    return {
+        "replicates": replicates,
+        "total": _percentile_dict(total),
+        "by_platform": by_platform,
+        "epics": [
+            {
+                "name": epic.name,
+                **{f"p{q}": int(round(float(value))) for q, value in zip(PERCENTILES, epic_percentiles[:, e])}
+            }
+            for e, epic in enumerate(epics)
+        ]
+    }
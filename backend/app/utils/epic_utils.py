@@ -1,5 +1,10 @@
 """Utility functions for epic processing."""
 
+from ..core.constants import PLATFORM_CODES
+from ..models.schemas import Epic, Platform
+
+_PLATFORM_ORDER = {platform: index for index, platform in enumerate(Platform)}
+
 
 def is_similar_epic_name(name1: str, name2: str) -> bool:
     """
@@ -54,3 +59,30 @@ def is_similar_epic_name(name1: str, name2: str) -> bool:
     overlap_ratio = len(intersection) / smaller_set if smaller_set > 0 else 0
     
     return overlap_ratio >= 0.8
+
+
+def format_epic_summary(epic: Epic) -> str:
+    """
+    Render an epic as a compact, canonical prompt summary.
+    
+    Example:
+    
+        Chat (2 tasks)
+        - Send message: F8 A10
+        - Typing indicator: F2 A4
+    
+    Platforms use PLATFORM_CODES in Platform enum order, so the same epic always
+    renders to the same text (summaries are precomputed at KB ingestion).
+    
+    Args:
+        epic: Epic to summarize
+        
+    Returns:
+        Summary text
+    """
+    lines = [f"{epic.name} ({len(epic.tasks)} tasks)"]
+    for task in epic.tasks:
+        efforts = sorted(task.efforts.items(), key=lambda item: _PLATFORM_ORDER[item[0]])
+        hours = " ".join(f"{PLATFORM_CODES.get(p.value, p.value)}{h}" for p, h in efforts)
+        lines.append(f"- {task.description}: {hours}")
+    return "\n".join(lines)
@@ -1,31 +1,57 @@
 """LangGraph workflow orchestration for estimation system."""
 
 import logging
-from typing import Dict, Any
-from langgraph.graph import StateGraph, END
+import operator
+from typing import Annotated, Dict, Any, Optional
+from langgraph.graph import StateGraph, START, END
 from typing_extensions import TypedDict
 
 from .agents import (
     analyze_requirement_node,
+    prefetch_similar_epics_node,
     retrieve_similar_epic_node,
     generate_custom_epic_node,
+    estimate_from_history_node,
+    check_task_hours_node,
+    diff_requirements_node,
 )
 from .models.schemas import ProjectRequirement, ProjectEstimation
+from .core.config import settings
+from .services.deadline import Deadline
+from .services.estimation_store import get_estimation_store
 from .services.mandatory_epics_service import get_mandatory_epics_service
+from .services.pipeline_profiles import get_pipeline_profile
+from .services.requirement_cache import find_cached_run, get_requirement_cache
+from .services.telemetry import TelemetryRecorder, instrument_node, telemetry_scope
+from .services.uncertainty import bootstrap_intervals
 
 logger = logging.getLogger(__name__)
 
 
+class UnknownEstimationError(LookupError):
+    """The earlier estimation of an incremental re-estimation is not stored."""
+
+
 class EstimationGraphState(TypedDict):
     """State for the estimation workflow graph."""
     raw_requirements: Any  # ProjectRequirement
     analyzed_requirement: Any  # AnalyzedRequirement
+    prefetched_epics: Any  # Speculative KB index + candidate epics (or None)
+    category_embeddings: Any  # Category query text -> embedding, computed while analysis streams
     retrieved_epics: Any  # List[Epic]
+    uncovered_categories: Any  # Epic categories without a KB match (category -> features)
     generated_epics: Any  # List[Epic] - now includes tasks and efforts
+    hour_adjustments: Any  # Generated task hours corrected by check_task_hours
+    previous_run: Any  # Incremental re-estimation: stored run being updated (see load_previous_run)
+    full_analyzed_requirement: Any  # Incremental re-estimation: analysis of the whole edited brief
+    carried_epics: Any  # Incremental re-estimation: previous epics of unchanged categories (List[Epic])
+    requirement_diff: Any  # Incremental re-estimation: re-estimated / carried over / removed categories
     final_estimation: Any  # ProjectEstimation
     validation_errors: list
     current_step: str
     retry_count: int
+    deadline: Any  # Deadline for this request
+    degradations: Annotated[list, operator.add]  # Degradation steps, appended by any node
 
 
 def create_final_estimation_node(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -55,15 +81,21 @@ def create_final_estimation_node(state: Dict[str, Any]) -> Dict[str, Any]:
                 "validation_errors": ["No epics available for estimation"]
             }
         
-        # All epics already have complete tasks with effort estimates from Agent 3
-        all_epics = generated_epics
+        # All epics already have complete tasks with effort estimates from Agent 3;
+        # an incremental re-estimation adds the epics carried over verbatim
+        generated_names = {epic.name.strip().lower() for epic in generated_epics}
+        all_epics = generated_epics + [
+            epic for epic in state.get("carried_epics") or []
+            if epic.name.strip().lower() not in generated_names
+        ]
         
         # Create final estimation
         final_estimation = ProjectEstimation(
             project_name=raw_requirements.project_name,
             description=raw_requirements.description,
             epics=all_epics,
-            target_platforms=analyzed_req.platforms if analyzed_req else []
+            target_platforms=analyzed_req.platforms if analyzed_req else [],
+            mode=raw_requirements.mode
         )
         
         # Log summary
@@ -147,10 +179,15 @@ def validate_output_node(state: Dict[str, Any]) -> Dict[str, Any]:
     
     if errors:
         logger.error(f"Validation failed: {errors}")
-        return {
+        result = {
             "validation_errors": errors + warnings,
             "current_step": "validation_failed"
         }
+        # Not enough time left for a repair pass: keep the current estimation
+        deadline = state.get("deadline")
+        if deadline and deadline.remaining() < settings.deadline_fast_model_seconds:
+            result["degradations"] = [deadline.degrade("skipped_repair")]
+        return result
     
     if warnings:
         logger.warning(f"Validation warnings: {warnings}")
@@ -164,11 +201,16 @@ def validate_output_node(state: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def should_retry(state: Dict[str, Any]) -> str:
-    """Decide whether to retry or end based on validation."""
+    """Decide whether to retry or end based on validation (retry budget set by the mode's profile)."""
     current_step = state.get("current_step", "")
     retry_count = state.get("retry_count", 0)
+    max_retries = get_pipeline_profile(state["raw_requirements"].mode)["max_repair_retries"]
     
-    if current_step == "validation_failed" and retry_count < 2:
+    if (
+        current_step == "validation_failed"
+        and retry_count < max_retries
+        and "skipped_repair" not in (state.get("degradations") or [])
+    ):
         logger.warning(f"Validation failed, retry {retry_count + 1}")
         return "retry"
     
@@ -179,38 +221,101 @@ def should_retry(state: Dict[str, Any]) -> str:
     return "end"
 
 
-def build_estimation_graph() -> StateGraph:
+def route_after_retrieval(state: Dict[str, Any]) -> str:
+    """Generate custom epics, or complete from historical hours for profiles without generation."""
+    if state.get("current_step") == "error":
+        return "end"
+    if not get_pipeline_profile(state["raw_requirements"].mode)["generation"]:
+        return "history"
+    return "generate"
+
+
+def route_after_diff(state: Dict[str, Any]) -> str:
+    """Retrieve and generate the changed categories, or finish when none changed."""
+    if state.get("generated_epics") is not None:
+        return "final"
+    return "retrieve"
+
+
+def build_estimation_graph(incremental: bool = False) -> StateGraph:
     """
     Build the LangGraph workflow for estimation.
     
     Workflow (Optimized 3-Agent):
-    1. Analyze Requirement
-    2. Retrieve Similar Epics (mandatory + MySQL retrieval)
-    3. Generate Custom Epics (with tasks and effort estimates)
+    1. Analyze Requirement, in parallel with a speculative KB prefetch
+       from the raw requirement
+    2. Retrieve Similar Epics (mandatory + MySQL retrieval, reusing the prefetch)
+    3. Generate Custom Epics (with tasks and effort estimates), or for quick
+       modes estimate uncovered categories from historical hours (no LLM)
+    3b. Check Task Hours (generated hours vs nearest historical tasks)
     4. Create Final Estimation (aggregate all epics)
     5. Validate Output
     6. End
     
+    The incremental graph (re-estimation of an edited brief) runs Analyze
+    Requirement, then Diff Requirements, which restricts steps 2-3 to the
+    added or changed epic categories (or skips them when none changed); epics
+    of unchanged categories are carried over into step 4. It also serves
+    near-duplicate briefs, diffed against a cached run of the other brief.
+    
+    Args:
+        incremental: Build the incremental re-estimation graph
+    
     Returns:
         Compiled StateGraph
     """
     # Create graph
     workflow = StateGraph(EstimationGraphState)
     
-    # Add nodes
-    workflow.add_node("analyze_requirement", analyze_requirement_node)
-    workflow.add_node("retrieve_similar_epics", retrieve_similar_epic_node)
-    workflow.add_node("generate_custom_epics", generate_custom_epic_node)
-    workflow.add_node("create_final_estimation", create_final_estimation_node)
-    workflow.add_node("validate_output", validate_output_node)
-    
-    # Set entry point
-    workflow.set_entry_point("analyze_requirement")
+    # Add nodes (instrumented so LLM calls are tagged with the node name in telemetry)
+    nodes = {
+        "analyze_requirement": analyze_requirement_node,
+        "prefetch_similar_epics": prefetch_similar_epics_node,
+        "retrieve_similar_epics": retrieve_similar_epic_node,
+        "generate_custom_epics": generate_custom_epic_node,
+        "estimate_from_history": estimate_from_history_node,
+        "check_task_hours": check_task_hours_node,
+        "create_final_estimation": create_final_estimation_node,
+        "validate_output": validate_output_node,
+    }
+    if incremental:
+        nodes["diff_requirements"] = diff_requirements_node
+        del nodes["prefetch_similar_epics"]
+    for name, node_fn in nodes.items():
+        workflow.add_node(name, instrument_node(name, node_fn))
+    
+    if incremental:
+        # Entry: re-analysis, then only changed categories continue to retrieval
+        workflow.add_edge(START, "analyze_requirement")
+        workflow.add_edge("analyze_requirement", "diff_requirements")
+        workflow.add_conditional_edges(
+            "diff_requirements",
+            route_after_diff,
+            {
+                "retrieve": "retrieve_similar_epics",
+                "final": "create_final_estimation"
+            }
+        )
+    else:
+        # Entry: analysis and the speculative prefetch run concurrently,
+        # retrieval waits for both
+        workflow.add_edge(START, "analyze_requirement")
+        workflow.add_edge(START, "prefetch_similar_epics")
+        workflow.add_edge(["analyze_requirement", "prefetch_similar_epics"], "retrieve_similar_epics")
     
     # Add edges
-    workflow.add_edge("analyze_requirement", "retrieve_similar_epics")
-    workflow.add_edge("retrieve_similar_epics", "generate_custom_epics")
-    workflow.add_edge("generate_custom_epics", "create_final_estimation")
+    workflow.add_conditional_edges(
+        "retrieve_similar_epics",
+        route_after_retrieval,
+        {
+            "generate": "generate_custom_epics",
+            "history": "estimate_from_history",
+            "end": END
+        }
+    )
+    workflow.add_edge("generate_custom_epics", "check_task_hours")
+    workflow.add_edge("check_task_hours", "create_final_estimation")
+    workflow.add_edge("estimate_from_history", "create_final_estimation")
     workflow.add_edge("create_final_estimation", "validate_output")
     
     # Conditional edge from validation
@@ -231,54 +336,222 @@ def build_estimation_graph() -> StateGraph:
     return app
 
 
-def run_estimation_workflow(project_requirement: ProjectRequirement):
+def load_previous_run(estimation_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Load a stored estimation for an incremental re-estimation.
+    
+    The estimation (latest version, so manual edits of carried over epics
+    are kept) and its analysis come from the estimation store; retrieval
+    results and category embeddings from the run's requirement cache entry,
+    when that is still cached.
+    
+    Returns:
+        Run dict as used by diff_requirements_node, or None if the
+        estimation is unknown or stored without its analysis
+    """
+    record = get_estimation_store().get(estimation_id)
+    if record is None or record["analyzed_requirement"] is None:
+        return None
+    
+    cached = get_requirement_cache().get(record["cache_entry_id"]) if record["cache_entry_id"] else None
+    return {
+        "id": record["id"],
+        "project_name": record["project_name"],
+        "analyzed_requirement": record["analyzed_requirement"],
+        "estimation": record["estimation"],
+        "retrieved_epics": cached["retrieved_epics"] if cached else [],
+        "uncovered_categories": cached["uncovered_categories"] if cached else {},
+        "category_embeddings": cached["category_embeddings"] if cached else {},
+    }
+
+
+def previous_run_from_cache(cached: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Use a near-duplicate brief's cached run as the previous run of an incremental re-estimation.
+    
+    Returns:
+        Run dict as returned by load_previous_run (without an estimation id)
+    """
+    return {
+        "id": None,
+        "project_name": cached["project_name"],
+        "analyzed_requirement": cached["analyzed_requirement"],
+        "estimation": cached["estimation"],
+        "retrieved_epics": cached["retrieved_epics"],
+        "uncovered_categories": cached["uncovered_categories"],
+        "category_embeddings": cached["category_embeddings"],
+    }
+
+
+def save_estimation(
+    estimation: ProjectEstimation,
+    analyzed_requirement: Any,
+    cache_entry_id: Optional[str] = None
+) -> None:
+    """Persist an estimation in the estimation store and set its estimation_id."""
+    try:
+        estimation.estimation_id = get_estimation_store().save(estimation, analyzed_requirement, cache_entry_id)
+    except Exception as e:
+        logger.warning(f"Could not store the estimation: {e}")
+
+
+def run_estimation_workflow(
+    project_requirement: ProjectRequirement,
+    telemetry: Optional[TelemetryRecorder] = None,
+    previous_estimation_id: Optional[str] = None
+):
     """
     Run the complete estimation workflow.
     
+    A brief that is a near-duplicate of a cached run (see requirement_cache)
+    is re-estimated incrementally against that run: the brief is re-analyzed
+    and only epic categories it added or changed are regenerated.
+    
     Args:
-        project_requirement: User's project requirement
+        project_requirement: User's project requirement (its deadline_seconds sets
+            the time budget, nodes degrade gracefully as it runs out)
+        telemetry: Recorder collecting per-call LLM telemetry for this job
+            (a new one is created if omitted); its summary is persisted on completion
+        previous_estimation_id: Re-estimate incrementally from this earlier
+            stored estimation (ProjectEstimation.estimation_id): only epic categories
+            added or changed by the edited requirements are regenerated
         
     Returns:
         Tuple of (ProjectEstimation, AnalyzedRequirement)
         
     Raises:
+        UnknownEstimationError if previous_estimation_id is unknown
         Exception if workflow fails
     """
     logger.info(f"\n{'='*60}")
-    logger.info(f"Starting estimation workflow for: {project_requirement.project_name}")
+    logger.info(f"Starting estimation workflow for: {project_requirement.project_name} ({project_requirement.mode.value} mode)")
     logger.info(f"{'='*60}\n")
     
-    # Build graph
-    app = build_estimation_graph()
+    previous_run = None
+    if previous_estimation_id:
+        previous_run = load_previous_run(previous_estimation_id)
+        if previous_run is None:
+            raise UnknownEstimationError(f"Unknown estimation id: {previous_estimation_id}")
+        logger.info(f"Incremental re-estimation of '{previous_run['project_name']}' ({previous_estimation_id})")
+    
+    telemetry = telemetry or TelemetryRecorder()
     
     # Initialize state
     initial_state = {
         "raw_requirements": project_requirement,
         "analyzed_requirement": None,
+        "prefetched_epics": None,
+        "category_embeddings": None,
         "retrieved_epics": None,
+        "uncovered_categories": None,
         "generated_epics": None,  # Now includes complete epics with tasks and efforts
+        "hour_adjustments": [],
+        "previous_run": previous_run,
+        "full_analyzed_requirement": None,
+        "carried_epics": None,
+        "requirement_diff": None,
         "final_estimation": None,
         "validation_errors": [],
         "current_step": "initialized",
-        "retry_count": 0
+        "retry_count": 0,
+        "deadline": Deadline(project_requirement.deadline_seconds),
+        "degradations": []
     }
     
     try:
-        # Run workflow
-        final_state = app.invoke(initial_state)
+        # Run workflow (all LLM/embedding calls are recorded against this job)
+        with telemetry_scope(telemetry):
+            cached, requirement_embedding, kb_version = find_cached_run(project_requirement)
+            if previous_run:
+                cached = None  # The incremental graph re-analyzes the edited brief instead
+            if cached:
+                cache_hit = {
+                    "project_name": cached["project_name"],
+                    "similarity": cached["similarity"],
+                    "stored_at": cached["stored_at"],
+                    "reused": "estimate" if project_requirement.use_cached_estimate else "unchanged_categories"
+                }
+                if project_requirement.use_cached_estimate:
+                    estimation = cached["estimation"].model_copy(update={
+                        "project_name": project_requirement.project_name,
+                        "description": project_requirement.description,
+                        "cache_hit": cache_hit
+                    })
+                    save_estimation(estimation, cached["analyzed_requirement"], cached["id"])
+                    logger.info(f"✓ Returned the cached estimate of '{cached['project_name']}'")
+                    return estimation, cached["analyzed_requirement"]
+                
+                # The reworded brief is re-analyzed and diffed against the cached run:
+                # epics of unchanged categories are carried over, only changed ones regenerated
+                previous_run = previous_run_from_cache(cached)
+                initial_state["previous_run"] = previous_run
+            
+            app = build_estimation_graph(incremental=previous_run is not None)
+            final_state = app.invoke(initial_state)
         
         # Extract final estimation and analyzed requirement
         final_estimation = final_state.get("final_estimation")
-        analyzed_requirement = final_state.get("analyzed_requirement")
+        # Incremental runs narrow analyzed_requirement to the changed categories
+        analyzed_requirement = final_state.get("full_analyzed_requirement") or final_state.get("analyzed_requirement")
         
         if not final_estimation:
             errors = final_state.get("validation_errors", ["Unknown error"])
             raise Exception(f"Workflow failed: {errors}")
         
+        # Report applied degradations (in order, once each) with the estimation
+        final_estimation.degradations = list(dict.fromkeys(final_state.get("degradations") or []))
+        if final_estimation.degradations:
+            logger.warning(f"Estimation degraded to meet the deadline: {final_estimation.degradations}")
+        
+        final_estimation.hour_adjustments = final_state.get("hour_adjustments") or []
+        
+        try:
+            final_estimation.confidence_intervals = bootstrap_intervals(final_estimation)
+        except Exception as e:
+            logger.warning(f"Confidence intervals unavailable: {e}")
+        
         validation_errors = final_state.get("validation_errors", [])
         if validation_errors:
             logger.warning(f"Estimation completed with warnings: {validation_errors}")
         
+        if cached:
+            final_estimation.cache_hit = cache_hit
+        
+        retrieved_epics = final_state.get("retrieved_epics") or []
+        uncovered_categories = final_state.get("uncovered_categories") or {}
+        requirement_diff = final_state.get("requirement_diff")
+        if requirement_diff:
+            final_estimation.requirement_diff = requirement_diff
+            # The stored run covers the whole brief: keep the previous results of carried over epics and categories
+            carried_names = {epic.name for epic in final_state.get("carried_epics") or []}
+            retrieved_epics = retrieved_epics + [
+                epic for epic in previous_run["retrieved_epics"] if not epic.is_mandatory and epic.name in carried_names
+            ]
+            uncovered_categories = {
+                **{name: features for name, features in previous_run["uncovered_categories"].items()
+                   if name in requirement_diff["carried_over"]},
+                **uncovered_categories
+            }
+        
+        # Degraded runs are not cached, a later near-duplicate brief gets a full run
+        cache_entry_id = None
+        if requirement_embedding is not None and not final_estimation.degradations:
+            try:
+                cache_entry_id = get_requirement_cache().store(
+                    project_requirement,
+                    requirement_embedding,
+                    kb_version,
+                    analyzed_requirement,
+                    retrieved_epics,
+                    uncovered_categories,
+                    final_state.get("category_embeddings"),
+                    final_estimation
+                )
+            except Exception as e:
+                logger.warning(f"Could not store the run in the requirement cache: {e}")
+        
+        save_estimation(final_estimation, analyzed_requirement, cache_entry_id)
+        
         logger.info(f"\n{'='*60}")
         logger.info(f"✓ Estimation workflow completed successfully")
         logger.info(f"{'='*60}\n")
@@ -288,6 +561,15 @@ def run_estimation_workflow(project_requirement: ProjectRequirement):
     except Exception as e:
         logger.error(f"Workflow execution failed: {e}")
         raise
+    
+    finally:
+        totals = telemetry.summary(include_calls=False)["total"]
+        logger.info(
+            f"Telemetry [{telemetry.job_id}]: {totals['calls']} calls, "
+            f"{totals['prompt_tokens']} prompt / {totals['completion_tokens']} completion tokens "
+            f"({totals['cached_tokens']} cached), ${totals['cost_usd']:.4f}"
+        )
+        telemetry.persist()
 
 
 # Export
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Estimation Mode Benchmark CLI Tool
+
+Runs the estimation workflow in each mode (fast / standard / thorough) over a
+set of project briefs and records per-mode latency, token usage, cost, total
+hours and epic counts. Results are written to app/data/profile_benchmarks.json
+and served with the profiles by GET /api/v1/profiles.
+
+Briefs are estimation JSON files (only "project_name" and "description" are
+used), e.g. the files in the comparison folder.
+
+Usage:
+     python backend/scripts/benchmark_profiles.py --briefs "Wed Map_estimation.json" "dating app_estimation.json" --repeats 3
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from statistics import mean, median
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+from backend.app.models.schemas import EstimationMode, ProjectRequirement
+from backend.app.services.pipeline_profiles import BENCHMARKS_PATH
+from backend.app.services.telemetry import TelemetryRecorder
+from backend.app.workflow import run_estimation_workflow
+
+from compare_estimates import load_json_file
+
+
+def run_mode(mode: EstimationMode, briefs: List[Dict[str, Any]], repeats: int) -> Dict[str, Any]:
+    """
+    Benchmark one mode over all briefs.
+
+    Args:
+        mode: Estimation mode to run
+        briefs: Estimation JSON dicts with project_name and description
+        repeats: Runs per brief
+
+    Returns:
+        Aggregated benchmark results for the mode
+    """
+    runs = []
+    for brief in briefs:
+        for attempt in range(1, repeats + 1):
+            requirement = ProjectRequirement(
+                project_name=brief["project_name"],
+                description=brief["description"],
+                mode=mode
+            )
+            telemetry = TelemetryRecorder()
+            start = time.perf_counter()
+            try:
+                estimation, _ = run_estimation_workflow(requirement, telemetry=telemetry)
+            except Exception as e:
+                print(f"  ✗ {mode.value} / {brief['project_name']} #{attempt}: {e}")
+                continue
+            latency = time.perf_counter() - start
+            totals = telemetry.summary(include_calls=False)["total"]
+
+            runs.append({
+                "latency_s": latency,
+                "llm_calls": totals["calls"],
+                "tokens": totals["prompt_tokens"] + totals["completion_tokens"],
+                "cost_usd": totals["cost_usd"],
+                "total_hours": estimation.total_hours,
+                "epics": len(estimation.epics),
+                "custom_epics": estimation.custom_epics_count,
+            })
+            print(
+                f"  ✓ {mode.value} / {brief['project_name']} #{attempt}: {latency:.1f}s, "
+                f"{estimation.total_hours}h, {len(estimation.epics)} epics, ${totals['cost_usd']:.4f}"
+            )
+
+    if not runs:
+        return {"runs": 0}
+
+    latencies = np.array([r["latency_s"] for r in runs])
+    return {
+        "runs": len(runs),
+        "latency_p50_s": round(float(np.percentile(latencies, 50)), 2),
+        "latency_p95_s": round(float(np.percentile(latencies, 95)), 2),
+        "mean_llm_calls": round(mean(r["llm_calls"] for r in runs), 1),
+        "mean_tokens": round(mean(r["tokens"] for r in runs)),
+        "mean_cost_usd": round(mean(r["cost_usd"] for r in runs), 4),
+        "median_total_hours": median(r["total_hours"] for r in runs),
+        "median_epics": median(r["epics"] for r in runs),
+        "median_custom_epics": median(r["custom_epics"] for r in runs),
+    }
+
+
+def main():
+    """Main CLI entry point."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the fast / standard / thorough estimation modes",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python backend/scripts/benchmark_profiles.py --briefs "Wed Map_estimation.json"
+  python backend/scripts/benchmark_profiles.py --briefs a.json b.json --modes fast standard --repeats 5
+        """
+    )
+
+    parser.add_argument(
+        '--briefs',
+        nargs='+',
+        required=True,
+        help='Estimation JSON files providing project_name and description (looked up in comparison/ too)'
+    )
+    parser.add_argument(
+        '--modes',
+        nargs='+',
+        choices=[m.value for m in EstimationMode],
+        default=[m.value for m in EstimationMode],
+        help='Modes to benchmark (default: all)'
+    )
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=3,
+        help='Runs per brief and mode (default: 3)'
+    )
+    parser.add_argument(
+        '--output',
+        default=str(BENCHMARKS_PATH),
+        help=f'Output JSON path (default: {BENCHMARKS_PATH})'
+    )
+
+    args = parser.parse_args()
+
+    try:
+        briefs = [load_json_file(path) for path in args.briefs]
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        print(f" Error loading briefs: {e}")
+        sys.exit(1)
+
+    results = {}
+    for mode_value in args.modes:
+        print(f"\n Benchmarking '{mode_value}' mode ({len(briefs)} briefs x {args.repeats} runs)...")
+        results[mode_value] = run_mode(EstimationMode(mode_value), briefs, args.repeats)
+
+    output = {
+        "benchmarked_at": datetime.now().isoformat(),
+        "briefs": [brief["project_name"] for brief in briefs],
+        "repeats": args.repeats,
+        "modes": results,
+    }
+    output_path = Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2)
+
+    print(f"\n✓ Wrote benchmarks to {output_path}")
+    print(f"\n{'Mode':<10} {'Runs':>5} {'p50 s':>8} {'p95 s':>8} {'Tokens':>9} {'Cost $':>8} {'Hours':>8} {'Epics':>6}")
+    for mode_value, stats in results.items():
+        if not stats["runs"]:
+            print(f"{mode_value:<10} {0:>5}  (all runs failed)")
+            continue
+        print(
+            f"{mode_value:<10} {stats['runs']:>5} {stats['latency_p50_s']:>8} {stats['latency_p95_s']:>8} "
+            f"{stats['mean_tokens']:>9} {stats['mean_cost_usd']:>8} {stats['median_total_hours']:>8} "
+            f"{stats['median_epics']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,11 +9,15 @@ st.set_page_config(
 
 import requests
 import json
+import uuid
 from datetime import datetime
 import pandas as pd
 
 # Configuration
 API_URL = "http://localhost:8000/api/v1"
+# The backend degrades gracefully to meet its estimation deadline (180s by default),
+# which starts once the request leaves the admission queue (at most 60s by default)
+REQUEST_TIMEOUT_SECONDS = 240
 
 
 
@@ -51,12 +55,15 @@ def main():
     st.markdown("---")
     
     # Main content
-    tab1, tab2 = st.tabs([" New Estimation", "ℹ About"])
+    tab1, tab2, tab3 = st.tabs([" New Estimation", " Past Estimations", "ℹ About"])
     
     with tab1:
         show_estimation_form()
     
     with tab2:
+        show_past_estimations()
+    
+    with tab3:
         show_about()
 
 
@@ -82,6 +89,25 @@ def show_estimation_form():
             height=100
         )
         
+        mode = st.radio(
+            "Estimation Mode",
+            options=["instant", "quick", "fast", "standard", "thorough"],
+            index=3,
+            horizontal=True,
+            help="instant / quick: ballpark from historical data (no generation) · fast: rough · standard: default · thorough: detailed, slower"
+        )
+        
+        use_cached_estimate = st.checkbox(
+            "Reuse the previous estimate of a near-identical brief",
+            help="Otherwise a near-identical brief reuses only the earlier analysis and regenerates the epics"
+        )
+        
+        previous_estimation_id = st.session_state.get('estimation', {}).get('estimation_id')
+        incremental = bool(previous_estimation_id) and st.checkbox(
+            "Only re-estimate what changed since the last estimation",
+            help="Epics of unchanged requirement areas are kept, only added or changed areas are regenerated"
+        )
+        
         submitted = st.form_submit_button("🚀 Generate Estimation", use_container_width=True)
     
     # Handle form submission outside the form context
@@ -89,10 +115,20 @@ def show_estimation_form():
         if not project_name or not description:
             st.error(" Please fill in all required fields")
         else:
-            generate_estimation(project_name, description, additional_context)
+            generate_estimation(
+                project_name, description, additional_context, mode, use_cached_estimate,
+                previous_estimation_id if incremental else None
+            )
 
 
-def generate_estimation(project_name: str, description: str, additional_context: str):
+def generate_estimation(
+    project_name: str,
+    description: str,
+    additional_context: str,
+    mode: str = "standard",
+    use_cached_estimate: bool = False,
+    previous_estimation_id: str = None
+):
     """Call API to generate estimation."""
     # Create progress indicators
     progress_placeholder = st.empty()
@@ -107,12 +143,19 @@ def generate_estimation(project_name: str, description: str, additional_context:
             payload = {
                 "project_name": project_name,
                 "description": description,
-                "additional_context": additional_context
+                "additional_context": additional_context,
+                "mode": mode,
+                "use_cached_estimate": use_cached_estimate
             }
             
-            # Call API with no timeout (backend will handle long-running requests)
+            # The backend returns within its deadline (degrading if needed), so the wait is bounded
             status_placeholder.info(" Step 2/5: Processing with AI agents (this may take several minutes)...")
-            response = requests.post(f"{API_URL}/estimate", json=payload, timeout=None)
+            endpoint = f"{API_URL}/estimate/{previous_estimation_id}/incremental" if previous_estimation_id else f"{API_URL}/estimate"
+            # All sessions reach the API from this server: identify the session for per-client limits
+            client_id = st.session_state.setdefault('client_id', uuid.uuid4().hex)
+            response = requests.post(
+                endpoint, json=payload, headers={"X-Client-Id": client_id}, timeout=REQUEST_TIMEOUT_SECONDS
+            )
             
             status_placeholder.info("Step 5/5: Finalizing estimation...")
             
@@ -121,9 +164,21 @@ def generate_estimation(project_name: str, description: str, additional_context:
                 if result.get("success"):
                     progress_placeholder.empty()
                     status_placeholder.empty()
+                    admission = result.get("admission") or {}
+                    if admission.get("queue_position"):
+                        st.caption(
+                            f"Queued at position {admission['queue_position']}, "
+                            f"waited {admission['waited_seconds']:.0f}s before starting"
+                        )
+                    # Show the new result, not an earlier estimation kept in the session
+                    st.session_state.reload_estimation = True
                     display_estimation(result["estimation"])
                 else:
                     status_placeholder.error(f" Estimation failed: {result.get('message', 'Unknown error')}")
+            elif response.status_code == 429:
+                status_placeholder.warning(
+                    f" The estimation service is busy. Please try again in {response.headers.get('Retry-After', '60')} seconds."
+                )
             else:
                 status_placeholder.error(f" API Error: {response.status_code} - {response.text}")
                 
@@ -135,6 +190,27 @@ def generate_estimation(project_name: str, description: str, additional_context:
             status_placeholder.error(f" Error: {str(e)}")
 
 
+def fetch_confidence_intervals(estimation: dict):
+    """Get the hour ranges of the current (possibly edited) hours, recomputing them only after edits."""
+    signature = json.dumps(
+        [[task.get('efforts', {}) for task in epic.get('tasks', [])] for epic in estimation.get('epics', [])],
+        sort_keys=True
+    )
+    if estimation.get('confidence_intervals') and st.session_state.get('intervals_signature') in (None, signature):
+        st.session_state.intervals_signature = signature
+        return estimation['confidence_intervals']
+    
+    try:
+        response = requests.post(f"{API_URL}/estimate/intervals", json=estimation, timeout=30)
+        if response.status_code == 200:
+            estimation['confidence_intervals'] = response.json()["confidence_intervals"]
+            st.session_state.intervals_signature = signature
+            return estimation['confidence_intervals']
+    except requests.exceptions.RequestException:
+        pass
+    return None
+
+
 def display_estimation(estimation: dict):
     """Display the generated estimation with editing capabilities."""
     st.success(" Estimation generated successfully!")
@@ -143,6 +219,7 @@ def display_estimation(estimation: dict):
     if 'estimation' not in st.session_state or st.session_state.get('reload_estimation'):
         st.session_state.estimation = estimation.copy()
         st.session_state.reload_estimation = False
+        st.session_state.intervals_signature = None
     
     estimation = st.session_state.estimation
     
@@ -152,6 +229,34 @@ def display_estimation(estimation: dict):
     
     # Project info
     st.subheader(f" {estimation.get('project_name', 'Project')}")
+    if estimation.get('cache_hit'):
+        cache_hit = estimation['cache_hit']
+        reused = "Returned the estimate" if cache_hit['reused'] == "estimate" else "Reused the unchanged epics"
+        st.info(
+            f"{reused} of the near-identical brief '{cache_hit['project_name']}' "
+            f"({cache_hit['similarity']:.0%} similar, {cache_hit['stored_at'][:16].replace('T', ' ')})"
+        )
+    if estimation.get('requirement_diff'):
+        diff = estimation['requirement_diff']
+        st.info(
+            f"Re-estimated {len(diff['re_estimated'])} changed areas"
+            + (f" ({', '.join(diff['re_estimated'])})" if diff['re_estimated'] else "")
+            + f", kept {len(diff['carried_over'])} unchanged"
+            + (f", removed {', '.join(diff['removed'])}" if diff['removed'] else "")
+        )
+    if estimation.get('degradations'):
+        st.warning(
+            "Estimation was simplified to respond in time: "
+            + ", ".join(step.replace("_", " ") for step in estimation['degradations'])
+        )
+    if estimation.get('hour_adjustments'):
+        with st.expander(f"{len(estimation['hour_adjustments'])} generated task hours adjusted to historical precedent"):
+            for adj in estimation['hour_adjustments']:
+                st.markdown(
+                    f"- **{adj['epic']}** / {adj['task']} ({adj['platform']}): "
+                    f"{adj['original_hours']}h → {adj['adjusted_hours']}h "
+                    f"(median of {adj['neighbors']} similar past tasks)"
+                )
     if estimation.get('description'):
         st.markdown(f"**Description:** {estimation['description']}")
     
@@ -199,10 +304,24 @@ def display_estimation(estimation: dict):
         custom_count = sum(1 for e in estimation.get("epics", []) if not e.get("is_mandatory"))
         st.metric("Custom Epics", custom_count)
     
+    intervals = fetch_confidence_intervals(estimation)
+    if intervals:
+        total_range = intervals['total']
+        st.markdown(
+            f"**Hour range:** {total_range['p50']}h (p50) · {total_range['p80']}h (p80) · {total_range['p95']}h (p95), "
+            f"from {intervals['replicates']} resamples of historical hour spread"
+        )
+    
     # Platform breakdown
     st.markdown("---")
     st.subheader("Platform Breakdown")
     
+    if intervals and intervals.get('by_platform'):
+        platform_ranges = pd.DataFrame([
+            {"Platform": platform, "p50 Hours": values['p50'], "p80 Hours": values['p80'], "p95 Hours": values['p95']}
+            for platform, values in intervals['by_platform'].items()
+        ])
+        st.dataframe(platform_ranges, hide_index=True, use_container_width=True)
  
     
     
@@ -245,6 +364,10 @@ def display_estimation(estimation: dict):
                 
                 st.markdown(f"**Type:** {'Mandatory' if is_mandatory else 'Custom'}")
                 
+                if intervals and epic_idx < len(intervals.get('epics', [])):
+                    epic_range = intervals['epics'][epic_idx]
+                    st.markdown(f"**Hour range:** p50 {epic_range['p50']}h · p80 {epic_range['p80']}h · p95 {epic_range['p95']}h")
+                
                 # Tasks
                 st.markdown("**Tasks:**")
                 
@@ -314,6 +437,120 @@ def display_estimation(estimation: dict):
             st.rerun()
 
 
+def api_get(path: str, **params):
+    """GET an API path, returning the JSON body or None (after showing the error)."""
+    try:
+        response = requests.get(f"{API_URL}{path}", params=params, timeout=30)
+    except requests.exceptions.RequestException:
+        st.error(" Connection error. Make sure the backend is running at http://localhost:8000")
+        return None
+    if response.status_code != 200:
+        st.error(f" API Error: {response.status_code} - {response.text}")
+        return None
+    return response.json()
+
+
+def show_past_estimations():
+    """Browse, reopen and compare stored estimations (database reads, nothing is regenerated)."""
+    st.header("Past Estimations")
+    
+    # Keyset pages: the cursor of each page opened so far
+    cursors = st.session_state.setdefault('past_estimation_cursors', [None])
+    page = api_get("/estimations", limit=20, before=cursors[-1])
+    if not page:
+        return
+    if not page['estimations']:
+        st.info("No stored estimations yet")
+        return
+    
+    col_newer, col_older = st.columns(2)
+    with col_newer:
+        if len(cursors) > 1 and st.button("← Newer", use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col_older:
+        if page['next_cursor'] and st.button("Older →", use_container_width=True):
+            cursors.append(page['next_cursor'])
+            st.rerun()
+    
+    items = {item['id']: item for item in page['estimations']}
+    def label(estimation_id):
+        item = items[estimation_id]
+        return (
+            f"#{estimation_id} {item['project_name']} · {item['total_hours']}h · "
+            f"{item['created_at'][:16].replace('T', ' ')} (v{item['latest_version']})"
+        )
+    
+    estimation_id = st.selectbox("Estimation", options=list(items), format_func=label)
+    versions = list(range(items[estimation_id]['latest_version'], 0, -1))
+    version = st.selectbox("Version", options=versions, format_func=lambda v: f"v{v}")
+    
+    record = api_get(f"/estimations/{estimation_id}", version=version)
+    if not record:
+        return
+    estimation = record['estimation']
+    
+    epic_hours = pd.DataFrame([
+        {
+            "Epic": epic['name'],
+            "Type": "Mandatory" if epic.get('is_mandatory') else "Custom",
+            "Hours": sum(sum(t.get('efforts', {}).values()) for t in epic.get('tasks', []))
+        }
+        for epic in estimation.get('epics', [])
+    ])
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Total Hours", int(epic_hours['Hours'].sum()) if len(epic_hours) else 0)
+    with col2:
+        st.metric("Total Epics", len(epic_hours))
+    st.dataframe(epic_hours, hide_index=True, use_container_width=True)
+    
+    if st.button(" Open in New Estimation", use_container_width=True, help="Makes it the current estimation, e.g. to re-estimate only what changed"):
+        st.session_state.estimation = estimation
+        st.session_state.intervals_signature = None
+        st.success(f"Estimation #{estimation_id} v{version} is now the current estimation")
+    
+    # Compare with an earlier version or another estimation
+    st.markdown("---")
+    st.subheader("Compare")
+    targets = ([("version", v) for v in versions if v != version]
+               + [("estimation", other) for other in items if other != estimation_id])
+    if not targets:
+        st.info("Nothing to compare with yet")
+        return
+    kind, other = st.selectbox(
+        "Compare with",
+        options=targets,
+        format_func=lambda t: f"v{t[1]}" if t[0] == "version" else label(t[1])
+    )
+    params = {"from_version": version}
+    if kind == "version":
+        params["to_version"] = other
+    else:
+        params["to_estimation_id"] = other
+    diff = api_get(f"/estimations/{estimation_id}/diff", **params)
+    if not diff:
+        return
+    
+    summary = diff['summary']
+    st.metric(
+        "Total Hours",
+        summary['total_hours']['to'],
+        delta=summary['total_hours']['to'] - summary['total_hours']['from']
+    )
+    if summary['epics_added']:
+        st.markdown(f"**Added:** {', '.join(summary['epics_added'])}")
+    if summary['epics_removed']:
+        st.markdown(f"**Removed:** {', '.join(summary['epics_removed'])}")
+    if summary['epics_changed']:
+        st.dataframe(pd.DataFrame([
+            {"Epic": change['name'], "From Hours": change['from_hours'], "To Hours": change['to_hours']}
+            for change in summary['epics_changed']
+        ]), hide_index=True, use_container_width=True)
+    if not diff['changes']:
+        st.info("No differences")
+
+
 def create_csv_export(estimation: dict) -> str:
     """Create CSV export of estimation."""
     rows = []
@@ -314,6 +314,24 @@ def main():
             print(f"✓ Total records processed: {total_stats['total_records']}")
             print(f"✓ Records inserted: {total_stats['total_inserted']}")
             
+            # Precompute compact prompt summaries for the new KB version
+            try:
+                from backend.app.services.mysql_knowledge_base import get_knowledge_base
+                summary_count = get_knowledge_base().build_epic_summaries()
+                print(f"✓ Epic summaries stored: {summary_count}")
+            except Exception as e:
+                print(f"⚠️  Could not build epic summaries: {e}")
+                print("   Run: python -m backend.app.services.mysql_knowledge_base summaries")
+            
+            # Refresh the historical hour statistics for the new KB version
+            try:
+                from backend.app.services.hour_statistics import build_hour_statistics
+                statistics = build_hour_statistics()
+                print(f"✓ Hour statistics rebuilt for KB {statistics.kb_version}")
+            except Exception as e:
+                print(f"⚠️  Could not build hour statistics: {e}")
+                print("   Run: python -m backend.app.services.mysql_knowledge_base stats")
+            
             # Get final count
             cursor.execute("SELECT COUNT(*) FROM json_embeddings")
             final_count = cursor.fetchone()[0]